@@ -1,18 +1,147 @@
 from __future__ import annotations
 
 import argparse
+import email
 import json
+import os
+import sys
+import time
+from email import policy
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
 
+from smart_mail_agent.core import daemon
+from smart_mail_agent.spam import rules
 from smart_mail_agent.spam.spam_filter_orchestrator import SpamFilterOrchestrator
 
+# 串流模式：--stdin-ndjson（每行一封 JSON）或 --input-dir（*.json / *.eml）
+# 多行程共享已編譯的規則；輸出依輸入順序逐行寫出 NDJSON，結束時在 stderr 印出吞吐量摘要
+# 單封模式：sma-daemon 在跑時交給它判定（模型已常駐），否則行程內判定
+
+_REF = "_ref"
+_ERR = "_error"
+
+
+def _check_chunk(chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    orch = SpamFilterOrchestrator()
+    out: List[Dict[str, Any]] = []
+    for e in chunk:
+        rec: Dict[str, Any] = dict(e.get(_REF) or {})
+        if _ERR in e:
+            rec["error"] = e[_ERR]
+        else:
+            sender, subject, content, attachments = rules._email_fields(e)
+            try:
+                rec.update(orch.is_legit(subject, content, sender, attachments))
+            except Exception as ex:
+                rec["error"] = f"{type(ex).__name__}: {ex}"
+        out.append(rec)
+    return out
+
+
+def _with_ref(obj: Any, ref: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(obj, dict):
+        return {_REF: ref, _ERR: "not a JSON object"}
+    if "id" in obj:
+        ref = dict(ref, id=obj["id"])
+    return dict(obj, **{_REF: ref})
+
+
+def iter_ndjson(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """逐行讀取；空行略過，壞行以錯誤紀錄保留位置。"""
+    for n, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as ex:
+            yield {_REF: {"line": n}, _ERR: f"invalid JSON: {ex}"}
+            continue
+        yield _with_ref(obj, {"line": n})
+
+
+def _read_eml(path: Path) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        msg = email.message_from_binary_file(f, policy=policy.default)
+    body = msg.get_body(preferencelist=("plain", "html"))  # type: ignore[attr-defined]
+    return {
+        "sender": str(msg.get("From") or ""),
+        "subject": str(msg.get("Subject") or ""),
+        "content": body.get_content() if body is not None else "",
+        "attachments": [a.get_filename() or "" for a in msg.iter_attachments()],  # type: ignore[attr-defined]
+    }
+
+
+def iter_input_dir(root: Path) -> Iterator[Dict[str, Any]]:
+    """依檔名排序讀取目錄下的 *.json（單封信物件）與 *.eml。"""
+    for path in sorted(p for p in root.iterdir() if p.suffix.lower() in (".json", ".eml") and p.is_file()):
+        ref = {"file": path.name}
+        try:
+            if path.suffix.lower() == ".eml":
+                yield dict(_read_eml(path), **{_REF: ref})
+            else:
+                yield _with_ref(json.loads(path.read_text(encoding="utf-8")), ref)
+        except Exception as ex:
+            yield {_REF: ref, _ERR: f"{type(ex).__name__}: {ex}"}
+
+
+def run_stream(
+    emails: Iterable[Dict[str, Any]],
+    out: TextIO,
+    *,
+    workers: Optional[int] = None,
+    chunksize: int = 64,
+) -> Dict[str, Any]:
+    """逐 chunk 判定並依輸入順序寫出 NDJSON；回傳吞吐量摘要。"""
+    t0 = time.perf_counter()
+    total = errors = 0
+    labels: Dict[str, int] = {}
+    for part in rules.map_email_chunks(_check_chunk, emails, workers=workers, chunksize=chunksize):
+        for rec in part:
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            total += 1
+            if "error" in rec:
+                errors += 1
+            else:
+                labels[rec["label"]] = labels.get(rec["label"], 0) + 1
+        out.flush()
+    elapsed = time.perf_counter() - t0
+    return {
+        "processed": total,
+        "errors": errors,
+        "labels": labels,
+        "seconds": round(elapsed, 3),
+        "per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
 
 def main(argv: list[str] | None = None) -> int:
     p = argparse.ArgumentParser(prog="sma-spamcheck", description="Spam quick check")
-    p.add_argument("--subject", required=True)
-    p.add_argument("--body", required=True)
-    p.add_argument("--from", dest="sender", required=True)
+    p.add_argument("--subject")
+    p.add_argument("--body")
+    p.add_argument("--from", dest="sender")
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--stdin-ndjson", action="store_true", help="read one JSON email per line from stdin")
+    src.add_argument("--input-dir", type=Path, help="check every *.json / *.eml file in a directory")
+    p.add_argument("--workers", type=int, default=None, help="worker processes for streaming modes (default: CPU count)")
+    p.add_argument("--chunksize", type=int, default=64, help="emails per worker task")
     ns = p.parse_args(argv)
-    info = SpamFilterOrchestrator().is_legit(ns.subject, ns.body, ns.sender, [])
+
+    if ns.stdin_ndjson or ns.input_dir is not None:
+        if ns.input_dir is not None and not ns.input_dir.is_dir():
+            p.error(f"--input-dir: not a directory: {ns.input_dir}")
+        emails = iter_ndjson(sys.stdin) if ns.stdin_ndjson else iter_input_dir(ns.input_dir)
+        summary = run_stream(emails, sys.stdout, workers=ns.workers, chunksize=ns.chunksize)
+        summary["workers"] = ns.workers or os.cpu_count() or 1
+        print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+        return 0
+
+    if ns.subject is None or ns.body is None or ns.sender is None:
+        p.error("--subject, --body and --from are required (or use --stdin-ndjson / --input-dir)")
+    info = daemon.try_request("spam", subject=ns.subject, content=ns.body, sender=ns.sender, attachments=[])
+    if info is None:
+        info = SpamFilterOrchestrator().is_legit(ns.subject, ns.body, ns.sender, [])
     print(json.dumps(info, ensure_ascii=False, indent=2))
     return 0
 
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/batching.py
+# 模組用途：意圖模型前的線上動態微批次（micro-batching）
+# 1. 多個執行緒各自 submit() 一封信 → 取得 Future；單一模型執行緒把同時到達的請求湊成一批
+# 2. 湊批策略：收到第一筆後最多再等 max_wait_ms，或湊滿 max_batch_size 就送出（先到者先觸發）
+# 3. 佇列有上限（max_queue）：滿了 submit() 會阻塞到 timeout，再滿就丟 RuntimeError（背壓）
+# 4. 分類器有 classify_many() 時整批前向；沒有時逐筆 classify()
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_QUEUE = 1024
+
+_STOP = object()
+
+
+@dataclass
+class _Job:
+    subject: str
+    content: str
+    future: Future = field(default_factory=Future)
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """
+    把並行的 classify() 呼叫合併成批次推論；所有批次由同一條模型執行緒執行。
+    classifier 與 provider 擇一：provider 每批呼叫一次取得分類器（如 model_registry.get_intent_classifier），
+    註冊表換模型 / unload 後自動跟上。
+    """
+
+    def __init__(
+        self,
+        classifier: Any = None,
+        *,
+        provider: Callable[[], Any] | None = None,
+        max_batch_size: int | None = None,
+        max_wait_ms: float | None = None,
+        max_queue: int | None = None,
+    ) -> None:
+        if (classifier is None) == (provider is None):
+            raise ValueError("[MicroBatcher] classifier 與 provider 需指定其中一個")
+        self._provider: Callable[[], Any] = provider or (lambda: classifier)
+        self.max_batch_size = max(1, int(max_batch_size or os.getenv("SMA_BATCH_MAX_SIZE") or DEFAULT_MAX_BATCH))
+        wait = os.getenv("SMA_BATCH_MAX_WAIT_MS") if max_wait_ms is None else max_wait_ms
+        self.max_wait = max(0.0, float(DEFAULT_MAX_WAIT_MS if wait is None else wait)) / 1000.0
+        self.max_queue = max(1, int(max_queue or os.getenv("SMA_BATCH_MAX_QUEUE") or DEFAULT_MAX_QUEUE))
+        self._queue: queue.Queue[Any] = queue.Queue(self.max_queue)
+        self._lock = threading.Lock()
+        # submit() 的「檢查 _closed + 入列」與 close() 互斥：close() 等在途的入列完成後才放 _STOP
+        self._cond = threading.Condition()
+        self._putting = 0
+        self._thread: threading.Thread | None = None
+        self._pid = os.getpid()
+        self._closed = False
+        self._batches = 0
+        self._items = 0
+        self._wait_total = 0.0
+        self._max_seen = 0
+
+    # ===== 呼叫端 =====
+    def _ensure_worker(self) -> None:
+        # fork 後執行緒不會跟過去：子行程換新的佇列並重新起模型執行緒
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._cond = threading.Condition()
+            self._putting = 0
+            self._queue = queue.Queue(self.max_queue)
+            self._thread = None
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._closed:
+                return  # 與 close() 競爭：不再起新的模型執行緒，submit() 會在入列前丟錯
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sma-microbatch", daemon=True)
+                self._thread.start()
+
+    def submit(self, subject: str, content: str, *, timeout: float | None = None) -> Future:
+        """排入佇列並回傳 Future（結果欄位與 classifier.classify() 相同）。"""
+        if self._closed:
+            raise RuntimeError("[MicroBatcher] 已關閉")
+        self._ensure_worker()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("[MicroBatcher] 已關閉")
+            self._putting += 1
+        job = _Job(subject or "", content or "")
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            raise RuntimeError(f"[MicroBatcher] 佇列已滿（{self.max_queue}）") from None
+        finally:
+            with self._cond:
+                self._putting -= 1
+                self._cond.notify_all()
+        return job.future
+
+    def classify(self, subject: str, content: str, *, timeout: float | None = None) -> dict[str, Any]:
+        """同步版：submit() 後等待結果；可直接取代 classifier.classify()。"""
+        return self.submit(subject, content, timeout=timeout).result(timeout)
+
+    def classify_many(self, pairs: Sequence[tuple[str, str]], batch_size: int = DEFAULT_MAX_BATCH) -> list[Any]:
+        futures = [self.submit(s, c) for s, c in pairs]
+        return [f.result() for f in futures]
+
+    # ===== 模型執行緒 =====
+    def _collect(self, first: _Job) -> tuple[list[_Job], bool]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run_batch(self, batch: list[_Job]) -> None:
+        batch = [j for j in batch if j.future.set_running_or_notify_cancel()]  # 略過已取消的
+        if not batch:
+            return
+        started = time.perf_counter()
+        pairs = [(j.subject, j.content) for j in batch]
+        try:
+            clf = self._provider()
+            if hasattr(clf, "classify_many"):
+                results = clf.classify_many(pairs, batch_size=len(pairs))
+            else:
+                results = [clf.classify(s, c) for s, c in pairs]
+        except Exception as ex:
+            logger.error(f"[MicroBatcher] 批次推論失敗：{ex}")
+            for j in batch:
+                j.future.set_exception(ex)
+            return
+        results = list(results)
+        if len(results) != len(batch):
+            # 少回的無法對應：多出的那幾筆以例外結束，不讓呼叫端永遠等下去
+            logger.error(f"[MicroBatcher] 分類器回傳 {len(results)} 筆結果，預期 {len(batch)} 筆")
+            for j in batch[len(results) :]:
+                j.future.set_exception(RuntimeError(f"[MicroBatcher] 分類器只回傳 {len(results)}/{len(batch)} 筆結果"))
+        for j, r in zip(batch, results):
+            j.future.set_result(r)
+        self._batches += 1
+        self._items += len(batch)
+        self._max_seen = max(self._max_seen, len(batch))
+        self._wait_total += sum(started - j.enqueued for j in batch)
+
+    def _fail_leftovers(self) -> None:
+        # _STOP 之後不應再有工作；萬一有（例如 close() 前模型執行緒已換新），一律以例外結束
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP and item.future.set_running_or_notify_cancel():
+                item.future.set_exception(RuntimeError("[MicroBatcher] 已關閉"))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._fail_leftovers()
+                return
+            batch, stop = self._collect(item)
+            self._run_batch(batch)
+            if stop:
+                self._fail_leftovers()
+                return
+
+    # ===== 管理 =====
+    def stats(self) -> dict[str, Any]:
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "max_batch": self._max_seen,
+            "avg_queue_wait_ms": round(self._wait_total / self._items * 1000.0, 3) if self._items else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self, timeout: float | None = 5.0) -> None:
+        """不再收新請求；已排入的處理完後停止模型執行緒。"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            while self._putting:
+                self._cond.wait()
+        t = self._thread
+        if t is not None and t.is_alive() and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            t.join(timeout)
+
+    def __enter__(self) -> MicroBatcher:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+__all__ = ["MicroBatcher", "DEFAULT_MAX_BATCH", "DEFAULT_MAX_WAIT_MS", "DEFAULT_MAX_QUEUE"]
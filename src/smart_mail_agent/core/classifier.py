@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
-from collections.abc import Callable
+import threading
+from collections.abc import Callable, Sequence
 from pathlib import Path
 from typing import Any
 
@@ -17,7 +19,14 @@ except Exception:  # noqa: F401
     AutoTokenizer = None
     pipeline = None
 
+try:
+    import torch
+except Exception:  # noqa: F401
+    torch = None
 
+
+from smart_mail_agent.core.result_cache import ResultCache, artifact_version, cache_key, default_cache
+from smart_mail_agent.core.weights import has_safetensors, load_model
 from smart_mail_agent.utils.logger import logger  # 統一日誌
 
 # !/usr/bin/env python3
@@ -48,6 +57,19 @@ NEG_WORDS = [
 NEG_RE = re.compile("|".join(map(re.escape, NEG_WORDS)))
 GENERIC_WORDS = ["hi", "hello", "test", "how are you", "你好", "您好", "請問"]
 
+# 規則先行：命中決定性規則時不跑模型；標籤與「模型 + 規則覆寫」相同，但沒有模型信心值可回報
+# → confidence 固定為 RULE_CONFIDENCE（規則是決定性的），path 為 "rules"。
+# 舊行為（模型先跑）回報的是模型對自己標籤的信心；需要這個值（例如以 confidence 設門檻）的部署
+# 請用 rules_first=False 或 SMA_INTENT_RULES_FIRST=0
+RULE_CONFIDENCE = 1.0
+PATH_RULES = "rules"  # 模型前規則直接回答
+PATH_MODEL = "model"  # 模型推論（可能再經低信心 fallback 調整）
+PATH_ERROR = "error"  # 推論失敗，回傳 unknown
+PATH_CACHE = "cache"  # 同一模型版本已分類過的同一封信（core.result_cache）
+
+# 批次推論：模型輸入上限（tokenizer 的 model_max_length 可能是極大的哨兵值）
+MAX_INPUT_TOKENS = 512
+
 
 def smart_truncate(text: str, max_chars: int = 1000) -> str:
     """智慧截斷輸入文字，保留前中後資訊片段。"""
@@ -61,6 +83,44 @@ def smart_truncate(text: str, max_chars: int = 1000) -> str:
     return f"{head}\n...\n{middle}\n...\n{tail}"
 
 
+# 前 / 中 / 後 片段的比例（與 smart_truncate 相同）
+_HEAD_RATIO = 0.4
+_TAIL_RATIO = 0.3
+# 斷詞前的字元粗切上限（budget × 4 字元）：只為避免整份超大內文送進 tokenizer 的便宜估計，
+# 不保證剛好填滿 token 預算；長度正確性由之後的 truncate_token_ids 在 token ID 上精確截斷負責
+_CHARS_PER_TOKEN_CAP = 4
+
+
+def truncate_token_ids(ids: Sequence[int], budget: int) -> list[int]:
+    """
+    token ID 版的前中後截斷：超過 budget 時保留前 40%、正中間、後 30%。
+    直接在 ID 上切，模型看到的長度就是 budget，不會再被 truncation=True 靜默截掉。
+    """
+    ids = list(ids)
+    if budget <= 0:
+        return []
+    if len(ids) <= budget:
+        return ids
+    head = int(budget * _HEAD_RATIO)
+    tail = int(budget * _TAIL_RATIO)
+    mid = budget - head - tail
+    start = max(head, len(ids) // 2 - mid // 2)
+    start = min(start, len(ids) - tail - mid)
+    return ids[:head] + ids[start : start + mid] + (ids[-tail:] if tail else [])
+
+
+def _presegment(text: str, max_tokens: int) -> str:
+    # 超大內文不整份斷詞：前 / 中 / 後依比例粗取字元，之後再以 token ID 精確截斷
+    cap = max_tokens * _CHARS_PER_TOKEN_CAP
+    if len(text) <= cap:
+        return text
+    head = text[: int(cap * _HEAD_RATIO)]
+    half = int(cap * (1 - _HEAD_RATIO - _TAIL_RATIO)) // 2
+    middle = text[len(text) // 2 - half : len(text) // 2 + half]
+    tail = text[-int(cap * _TAIL_RATIO) :]
+    return f"{head}\n{middle}\n{tail}"
+
+
 class IntentClassifier:
     """意圖分類器：可用 HF pipeline 或外部注入的 pipeline（測試/離線）。"""
 
@@ -71,30 +131,77 @@ class IntentClassifier:
         *,
         local_files_only: bool = True,
         low_conf_threshold: float = 0.4,
+        backend: str = "torch",
+        rules_first: bool | None = None,
+        cache: ResultCache | bool | None = None,
+        model_version: str | None = None,
     ) -> None:
         """
         參數：
-            model_path: 模型路徑或名稱（離線時需為本地路徑）
+            model_path: 模型路徑或名稱（離線時需為本地路徑）；backend="onnx" 時為 export_onnx 的輸出目錄
             pipeline_override: 測試或自定義時注入的函式，簽名為 (text, truncation=True) -> [ {label, score} ]
             local_files_only: 是否禁止網路抓取模型（預設 True，避免 CI/無網路掛掉）
             low_conf_threshold: 低信心 fallback 門檻
+            backend: "torch"（transformers pipeline）或 "onnx"（onnxruntime，CPU 上可用 int8 量化模型）
+            rules_first: 報價 / 負面情緒規則命中時直接回答，不呼叫模型，confidence 為 RULE_CONFIDENCE
+                （False = 模型一律先跑，confidence 為模型信心值）；None 時讀 SMA_INTENT_RULES_FIRST（預設開啟）
+            cache: 結果快取；None / True = 共用的 default_cache()，False = 停用，或傳入 ResultCache
+            model_version: 快取用的模型版本；未指定時由模型目錄的檔案算出（注入 pipeline 時不快取）
         """
         self.model_path = model_path
         self.low_conf_threshold = low_conf_threshold
+        self.backend = backend
+        if rules_first is None:
+            rules_first = os.getenv("SMA_INTENT_RULES_FIRST", "1") != "0"
+        self.rules_first = rules_first
+        self._counts = {PATH_RULES: 0, PATH_CACHE: 0, PATH_MODEL: 0, PATH_ERROR: 0}
+        self._counts_lock = threading.Lock()
+        if model_version is None and pipeline_override is None:
+            model_version = artifact_version(model_path, backend)
+        self.model_version = model_version
+        self._cache: ResultCache | None = None
+        if cache is not False and os.getenv("SMA_INTENT_CACHE") != "0":
+            if model_version is not None:
+                self._cache = cache if isinstance(cache, ResultCache) else default_cache()
+                self._cache.bind(str(model_path), model_version)
+            elif pipeline_override is not None:
+                logger.info("[IntentClassifier] 注入 pipeline 且未指定 model_version：結果快取停用")
+            else:
+                logger.info(f"[IntentClassifier] {model_path} 不是本地模型目錄，無法算出版本：結果快取停用")
+        # 已斷詞的一批 input_ids → [(label, score)]；None 表示只能走 pipeline(text)
+        self._ids_runner: Callable[[list[list[int]]], list[tuple[str, float] | None]] | None = None
 
         if pipeline_override is not None:
             # 測試/離線：直接用外部 pipeline，避免載入 HF 權重
             self.pipeline = pipeline_override
-            self.tokenizer = None
+            self.tokenizer = getattr(pipeline_override, "tokenizer", None)
             self.model = None
+            self._ids_runner = getattr(pipeline_override, "predict_ids", None)
             logger.info("[IntentClassifier] 使用外部注入的 pipeline（不載入模型）")
+        elif backend == "onnx":
+            from smart_mail_agent.core.onnx_backend import OnnxIntentModel
+
+            runner = OnnxIntentModel(model_path)
+            self.pipeline = runner
+            self.tokenizer = runner.tokenizer
+            self.model = None
+            self._ids_runner = runner.predict_ids
+            logger.info(f"[IntentClassifier] ONNX 後端：{runner.onnx_path}")
+        elif backend != "torch":
+            raise ValueError(f"[IntentClassifier] 不支援的 backend：{backend}")
         else:
             logger.info(f"[IntentClassifier] 載入模型：{model_path}")
             self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-            self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+            if has_safetensors(model_path):
+                # safetensors：權重以 mmap 載入（冷啟動快、多行程共用 page cache）
+                self.model = load_model(model_path)
+            else:
+                self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
             self.pipeline = pipeline(
                 "text-classification", model=self.model, tokenizer=self.tokenizer
             )
+            if torch is not None:
+                self._ids_runner = self._predict_ids
 
     @staticmethod
     def _is_negative(text: str) -> bool:
@@ -104,48 +211,258 @@ class IntentClassifier:
     def _is_generic(text: str) -> bool:
         return any(g in text.lower() for g in GENERIC_WORDS)
 
+    @staticmethod
+    def _raw_text(subject: str, content: str) -> str:
+        return f"{(subject or '').strip()}\n{(content or '').strip()}"
+
+    @classmethod
+    def _input_text(cls, subject: str, content: str) -> str:
+        # fallback 規則與沒有 tokenizer 的 pipeline 仍用字元版截斷
+        return smart_truncate(cls._raw_text(subject, content))
+
+    def _max_tokens(self) -> int:
+        return min(int(getattr(self.tokenizer, "model_max_length", MAX_INPUT_TOKENS)), MAX_INPUT_TOKENS)
+
+    def _encode(self, raw_texts: list[str]) -> list[list[int]]:
+        """
+        整批只斷詞一次（不加特殊 token、不截斷），在 ID 上做前中後截斷後再補特殊 token；
+        結果直接餵給模型，不再經過 pipeline 的二次斷詞。
+        """
+        tok = self.tokenizer
+        max_len = self._max_tokens()
+        add = getattr(tok, "num_special_tokens_to_add", None)
+        build = getattr(tok, "build_inputs_with_special_tokens", None)
+        if add is None or build is None:
+            ids = tok(raw_texts, truncation=True, max_length=max_len)["input_ids"]
+            return [list(x) for x in ids]
+        budget = max_len - int(add(pair=False))
+        pieces = [_presegment(t, budget) for t in raw_texts]
+        ids = tok(pieces, add_special_tokens=False, truncation=False)["input_ids"]
+        return [build(truncate_token_ids(x, budget)) for x in ids]
+
+    def _rule_label(self, text: str) -> str | None:
+        """決定性規則（與模型輸出無關）：報價 > 負面情緒；未命中回 None。"""
+        if RE_QUOTE.search(text):
+            return "業務接洽或報價"
+        if self._is_negative(text):
+            return "投訴與抱怨"
+        return None
+
+    def _fallback_label(self, text: str, model_label: str, confidence: float) -> str:
+        """Fallback 決策：規則 > 情緒 > 低信心泛用。"""
+        ruled = self._rule_label(text)
+        if ruled is not None:
+            return ruled
+        if confidence < self.low_conf_threshold and self._is_generic(text):
+            # 只有在「低信心」且文字屬於泛用招呼/測試語句時，才降為「其他」
+            return "其他"
+        return model_label
+
+    def _count(self, path: str, n: int = 1) -> None:
+        with self._counts_lock:
+            self._counts[path] += n
+
+    def stats(self) -> dict[str, Any]:
+        """各路徑回答的筆數、規則先行 + 快取省下的模型呼叫比例（skip_rate）與快取命中率。"""
+        with self._counts_lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        skipped = counts[PATH_RULES] + counts[PATH_CACHE]
+        out = dict(counts, total=total, skip_rate=round(skipped / total, 4) if total else 0.0)
+        if self._cache is not None:
+            out["cache"] = self._cache.stats()
+        return out
+
+    def reset_stats(self) -> None:
+        with self._counts_lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+
+    def _early_label(self, text: str) -> str | None:
+        return self._rule_label(text) if self.rules_first else None
+
+    def _cache_key(self, subject: str, content: str) -> str | None:
+        return cache_key(self.model_version, subject, content) if self._cache is not None else None  # type: ignore[arg-type]
+
+    def _cached(self, key: str | None) -> tuple[str, float] | None:
+        """快取的模型原始輸出 (model_label, confidence)；fallback 由呼叫端依目前設定再套用。"""
+        hit = self._cache.get(key) if self._cache is not None and key is not None else None
+        if hit is None or "model_label" not in hit:
+            return None  # 舊格式（存 fallback 後標籤）視為未命中
+        return str(hit["model_label"]), float(hit["confidence"])
+
+    def _store(self, key: str | None, model_label: str, confidence: float) -> None:
+        # 只存模型原始輸出：fallback 結果取決於 low_conf_threshold / 規則，不能跨設定共用
+        if self._cache is not None and key is not None:
+            self._cache.put(
+                key,
+                {"model_label": model_label, "confidence": confidence},
+                model_id=str(self.model_path),
+                version=str(self.model_version),
+            )
+
+    @staticmethod
+    def _result(label: str, confidence: float, subject: str, content: str, path: str) -> dict[str, Any]:
+        return {"predicted_label": label, "confidence": confidence, "subject": subject, "body": content, "path": path}
+
     def classify(self, subject: str, content: str) -> dict[str, Any]:
-        """執行分類與 fallback 修正。"""
-        raw_text = f"{subject.strip()}\n{content.strip()}"
-        text = smart_truncate(raw_text)
+        """
+        執行分類與 fallback 修正；path 欄位記錄由哪一段回答（rules / cache / model / error）。
+        path 為 rules 時 confidence 是 RULE_CONFIDENCE，不是模型信心值。
+        """
+        text = self._input_text(subject, content)
+
+        ruled = self._early_label(text)
+        if ruled is not None:
+            # 模型跑完也會被這條規則覆寫，不必付推論成本
+            self._count(PATH_RULES)
+            return self._result(ruled, RULE_CONFIDENCE, subject, content, PATH_RULES)
+
+        key = self._cache_key(subject, content)
+        hit = self._cached(key)
+        if hit is not None:
+            self._count(PATH_CACHE)
+            return self._result(self._fallback_label(text, *hit), hit[1], subject, content, PATH_CACHE)
 
         try:
-            # 支援：transformers pipeline 或外部函式 (text, truncation=True) -> [ {label, score} ]
-            result_list = self.pipeline(text, truncation=True)
-            result = result_list[0] if isinstance(result_list, list) else result_list
-            model_label = str(result.get("label", "unknown"))
-            confidence = float(result.get("score", 0.0))
+            if self.tokenizer is not None and self._ids_runner is not None:
+                # 有 tokenizer：token 預算截斷後直接送 ID（只斷詞一次）
+                pred = self._ids_runner(self._encode([self._raw_text(subject, content)]))[0]
+                if pred is None:
+                    raise RuntimeError("empty prediction")
+                model_label, confidence = pred
+            else:
+                # 支援：transformers pipeline 或外部函式 (text, truncation=True) -> [ {label, score} ]
+                result_list = self.pipeline(text, truncation=True)
+                result = result_list[0] if isinstance(result_list, list) else result_list
+                model_label = str(result.get("label", "unknown"))
+                confidence = float(result.get("score", 0.0))
         except Exception as e:
             # 不得因單一錯誤中斷流程
             logger.error(f"[IntentClassifier] 推論失敗：{e}")
-            return {
-                "predicted_label": "unknown",
-                "confidence": 0.0,
-                "subject": subject,
-                "body": content,
-            }
-
-        # ===== Fallback 決策：規則 > 情緒 > 低信心泛用 =====
-        fallback_label = model_label
-        if RE_QUOTE.search(text):
-            fallback_label = "業務接洽或報價"
-        elif self._is_negative(text):
-            fallback_label = "投訴與抱怨"
-        elif confidence < self.low_conf_threshold and self._is_generic(text):
-            # 只有在「低信心」且文字屬於泛用招呼/測試語句時，才降為「其他」
-            fallback_label = "其他"
+            self._count(PATH_ERROR)
+            return self._result("unknown", 0.0, subject, content, PATH_ERROR)
 
+        fallback_label = self._fallback_label(text, model_label, confidence)
         if fallback_label != model_label:
             logger.info(
                 f"[Fallback] 類別調整：{model_label} → {fallback_label}（信心值：{confidence:.4f}）"
             )
 
-        return {
-            "predicted_label": fallback_label,
-            "confidence": confidence,
-            "subject": subject,
-            "body": content,
-        }
+        self._store(key, model_label, confidence)
+        self._count(PATH_MODEL)
+        return self._result(fallback_label, confidence, subject, content, PATH_MODEL)
+
+    # ===== 批次推論 =====
+    def _token_lengths(
+        self, texts: list[str], raw_texts: list[str]
+    ) -> tuple[list[int], list[list[int]] | None]:
+        """
+        回傳 (長度, input_ids)。有 tokenizer 時整批斷詞一次（之後直接 pad 成 tensor，不再重斷）；
+        外部注入的 pipeline 沒有 tokenizer，以字元數近似長度。
+        """
+        if self.tokenizer is None:
+            return [len(t) for t in texts], None
+        ids = self._encode(raw_texts)
+        return [len(x) for x in ids], ids
+
+    def _predict_ids(self, ids: list[list[int]]) -> list[tuple[str, float] | None]:
+        # 已依長度排序的一批：pad 到批內最長即可，padding 浪費最小
+        enc = self.tokenizer.pad({"input_ids": ids}, padding=True, return_tensors="pt")
+        with torch.inference_mode():
+            probs = self.model(**enc).logits.softmax(dim=-1)
+        conf, idx = probs.max(dim=-1)
+        id2label = self.model.config.id2label
+        return [(str(id2label[int(i)]), float(c)) for i, c in zip(idx.tolist(), conf.tolist())]
+
+    @staticmethod
+    def _as_pred(r: Any) -> tuple[str, float]:
+        r = r[0] if isinstance(r, list) else r
+        return str(r.get("label", "unknown")), float(r.get("score", 0.0))
+
+    def _predict_one(self, text: str) -> tuple[str, float] | None:
+        try:
+            return self._as_pred(self.pipeline(text, truncation=True))
+        except Exception as e:
+            logger.error(f"[IntentClassifier] 推論失敗：{e}")
+            return None
+
+    def _predict_texts(self, texts: list[str]) -> list[tuple[str, float] | None]:
+        # pipeline（或注入函式）吃整批；不支援 list 輸入時退回逐筆
+        try:
+            out = self.pipeline(texts, truncation=True, batch_size=len(texts))
+        except Exception:
+            out = None
+        if not isinstance(out, list) or len(out) != len(texts):
+            return [self._predict_one(t) for t in texts]
+        return [self._as_pred(r) for r in out]
+
+    def classify_many(
+        self,
+        pairs: Sequence[tuple[str, str]],
+        batch_size: int = 32,
+    ) -> list[dict[str, Any]]:
+        """
+        批次分類 (subject, content)；結果依輸入順序，欄位與 classify() 相同。
+        規則先行或結果快取命中的信件不送模型，同一批內重複的信只推論一次；其餘依 token 長度排序後分批送進模型（同批長度相近，padding 少），
+        fallback 規則逐筆套用。某一批推論失敗時該批改為逐筆，單筆失敗回傳 unknown（與 classify() 相同）。
+        """
+        pairs = list(pairs)
+        texts = [self._input_text(s, c) for s, c in pairs]
+        ruled = [self._early_label(t) for t in texts]
+        keys = [self._cache_key(s, c) if r is None else None for (s, c), r in zip(pairs, ruled)]
+        hits = [self._cached(k) for k in keys]
+        todo: list[int] = []
+        dup: dict[int, int] = {}  # 重複信件 → 第一次出現的位置
+        first: dict[str, int] = {}
+        for i, (r, h, k) in enumerate(zip(ruled, hits, keys)):
+            if r is not None or h is not None:
+                continue
+            if k is not None and k in first:
+                dup[i] = first[k]
+                continue
+            if k is not None:
+                first[k] = i
+            todo.append(i)
+        sub_texts = [texts[i] for i in todo]
+        raw = [self._raw_text(*pairs[i]) for i in todo] if self.tokenizer is not None else sub_texts
+        lengths, sub_ids = self._token_lengths(sub_texts, raw) if todo else ([], None)
+        ids: dict[int, list[int]] | None = dict(zip(todo, sub_ids)) if sub_ids is not None else None
+        order = sorted(todo, key=dict(zip(todo, lengths)).__getitem__)
+        direct = ids is not None and self._ids_runner is not None
+        size = max(1, int(batch_size))
+
+        preds: list[tuple[str, float] | None] = [None] * len(texts)
+        for start in range(0, len(order), size):
+            idx = order[start : start + size]
+            try:
+                if direct:
+                    got = self._ids_runner([ids[i] for i in idx])  # type: ignore[index,misc]
+                else:
+                    got = self._predict_texts([texts[i] for i in idx])
+            except Exception as e:
+                logger.warning(f"[IntentClassifier] 批次推論失敗，改為逐筆：{e}")
+                got = [self._predict_one(texts[i]) for i in idx]
+            for i, p in zip(idx, got):
+                preds[i] = p
+        for i, j in dup.items():
+            preds[i] = preds[j]
+
+        results: list[dict[str, Any]] = []
+        for (subject, content), text, r, h, k, p in zip(pairs, texts, ruled, hits, keys, preds):
+            if r is not None:
+                results.append(self._result(r, RULE_CONFIDENCE, subject, content, PATH_RULES))
+            elif h is not None:
+                results.append(self._result(self._fallback_label(text, *h), h[1], subject, content, PATH_CACHE))
+            elif p is None:
+                results.append(self._result("unknown", 0.0, subject, content, PATH_ERROR))
+            else:
+                label = self._fallback_label(text, p[0], p[1])
+                self._store(k, p[0], p[1])
+                results.append(self._result(label, p[1], subject, content, PATH_MODEL))
+        with self._counts_lock:
+            for res in results:
+                self._counts[res["path"]] += 1
+        return results
 
 
 def _cli() -> None:
@@ -166,12 +483,17 @@ def _cli() -> None:
     )
     args = parser.parse_args()
 
-    clf = IntentClassifier(
-        model_path=args.model,
-        pipeline_override=None,
-        local_files_only=not args.allow_online,
-    )
-    result = clf.classify(subject=args.subject, content=args.content)
+    # sma-daemon 已常駐同一個模型時直接問它，省下每次載入模型的成本
+    from smart_mail_agent.core.daemon import try_request
+
+    result = try_request("classify", subject=args.subject, content=args.content, model=args.model)
+    if result is None:
+        clf = IntentClassifier(
+            model_path=args.model,
+            pipeline_override=None,
+            local_files_only=not args.allow_online,
+        )
+        result = clf.classify(subject=args.subject, content=args.content)
 
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/daemon.py
+# 模組用途：常駐推論服務（Unix domain socket）
+# 1. sma-daemon 啟動後把意圖分類器（model_registry）與垃圾信 cascade 常駐在記憶體
+# 2. 協定：每個訊框 = 4 bytes big-endian 長度 + UTF-8 JSON；請求 {"op": ..., ...}，回應 {"ok": bool, "result" | "error"}
+# 3. 同一連線可連續送多個請求；每個連線一條執行緒
+# 4. 用戶端 try_request()：daemon 沒在跑 / 逾時 / 回錯誤時回 None，呼叫端改走行程內推論
+#    （本模組頂層只用標準函式庫，用戶端不會因為 import 而載入 transformers）
+
+ENV_SOCKET = "SMA_DAEMON_SOCKET"
+ENV_DISABLE = "SMA_DAEMON"  # "0" = 用戶端一律不連 daemon
+DEFAULT_TIMEOUT = 5.0
+MAX_FRAME = 16 * 1024 * 1024
+_HEADER = struct.Struct(">I")
+
+
+class DaemonUnavailable(RuntimeError):
+    """daemon 沒在跑或連線中斷（呼叫端應退回行程內推論）。"""
+
+
+class DaemonError(RuntimeError):
+    """daemon 有回應，但該請求處理失敗。"""
+
+
+def default_socket_path() -> str:
+    env = os.getenv(ENV_SOCKET)
+    if env:
+        return env
+    base = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return str(Path(base) / f"sma-{os.getuid()}.sock")
+
+
+# ===== 訊框 =====
+def _recv_exact(sock: socket.socket, n: int) -> bytes | None:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            if buf:
+                raise ConnectionError("訊框不完整：連線提前關閉")
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def send_frame(sock: socket.socket, obj: Any) -> None:
+    data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) > MAX_FRAME:
+        raise ValueError(f"訊框過大：{len(data)} bytes")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_frame(sock: socket.socket) -> Any:
+    """讀一個訊框；對方正常關閉連線時回 None。"""
+    head = _recv_exact(sock, _HEADER.size)
+    if head is None:
+        return None
+    (size,) = _HEADER.unpack(head)
+    if size > MAX_FRAME:
+        raise ValueError(f"訊框過大：{size} bytes")
+    body = _recv_exact(sock, size) if size else b""
+    if body is None:
+        raise ConnectionError("訊框不完整：連線提前關閉")
+    return json.loads(body.decode("utf-8"))
+
+
+# ===== 服務端 =====
+def _same_model(requested: str | None) -> bool:
+    # 用戶端指定了模型（core.classifier CLI 的 --model）時，只有與 daemon 載入的是同一個才代答
+    if not requested:
+        return True
+    loaded = os.getenv("SMA_INTENT_MODEL_PATH")
+    if not loaded:
+        return False
+    return Path(requested).expanduser().resolve() == Path(loaded).expanduser().resolve()
+
+
+def _op_ping(req: dict[str, Any]) -> Any:
+    return {"pid": os.getpid()}
+
+
+def _op_status(req: dict[str, Any]) -> Any:
+    from smart_mail_agent.core.model_registry import INTENT, INTENT_BATCHER, registry
+
+    out = {"pid": os.getpid(), "models": registry.status(), "intent_model": os.getenv("SMA_INTENT_MODEL_PATH")}
+    if registry.is_ready(INTENT) and hasattr(registry.get(INTENT), "stats"):
+        out["intent_stats"] = registry.get(INTENT).stats()  # 規則先行的 skip rate
+    if registry.is_ready(INTENT_BATCHER):
+        out["batching"] = registry.get(INTENT_BATCHER).stats()
+    return out
+
+
+def _op_classify(req: dict[str, Any]) -> Any:
+    from smart_mail_agent.core.model_registry import get_intent_batcher
+
+    if not _same_model(req.get("model")):
+        raise DaemonError(f"model mismatch: {req.get('model')}")
+    # 各連線執行緒同時送來的單封請求經 MicroBatcher 合併成批次前向
+    return get_intent_batcher().classify(str(req.get("subject") or ""), str(req.get("content") or ""))
+
+
+def _op_classify_many(req: dict[str, Any]) -> Any:
+    from smart_mail_agent.core.model_registry import get_intent_classifier
+
+    if not _same_model(req.get("model")):
+        raise DaemonError(f"model mismatch: {req.get('model')}")
+    clf = get_intent_classifier()
+    pairs = [(str(s or ""), str(c or "")) for s, c in req.get("pairs") or []]
+    if hasattr(clf, "classify_many"):
+        return clf.classify_many(pairs, batch_size=int(req.get("batch_size") or 32))
+    return [clf.classify(s, c) for s, c in pairs]
+
+
+def _op_spam(req: dict[str, Any]) -> Any:
+    from smart_mail_agent.spam.spam_filter_orchestrator import SpamFilterOrchestrator
+
+    return SpamFilterOrchestrator().is_legit(
+        str(req.get("subject") or ""),
+        str(req.get("content") or ""),
+        str(req.get("sender") or ""),
+        list(req.get("attachments") or []),
+    )
+
+
+OPS: dict[str, Callable[[dict[str, Any]], Any]] = {
+    "ping": _op_ping,
+    "status": _op_status,
+    "classify": _op_classify,
+    "classify_many": _op_classify_many,
+    "spam": _op_spam,
+}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        sock: socket.socket = self.request
+        while True:
+            try:
+                req = recv_frame(sock)
+            except (OSError, ValueError) as ex:
+                logger.warning(f"[daemon] 讀取請求失敗：{ex}")
+                return
+            if req is None:
+                return
+            op = req.get("op") if isinstance(req, dict) else None
+            if op == "shutdown":
+                send_frame(sock, {"ok": True, "result": None})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            fn = OPS.get(str(op))
+            try:
+                if fn is None:
+                    raise DaemonError(f"unknown op: {op}")
+                resp = {"ok": True, "result": fn(req)}
+            except Exception as ex:
+                resp = {"ok": False, "error": f"{type(ex).__name__}: {ex}"}
+            try:
+                send_frame(sock, resp)
+            except OSError:
+                return
+
+
+class InferenceDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """每個連線一條執行緒；模型實例由 model_registry 在行程內共用。"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or default_socket_path()
+        _clear_stale(self.path)
+        old = os.umask(0o177)  # socket 只給同一使用者（0600）
+        try:
+            super().__init__(self.path, _Handler)
+        finally:
+            os.umask(old)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def _clear_stale(path: str) -> None:
+    if not os.path.exists(path):
+        return
+    try:
+        with DaemonClient(path, timeout=0.5) as c:
+            c.request("ping")
+    except DaemonUnavailable:
+        os.unlink(path)  # 上次沒清乾淨的 socket 檔
+        return
+    raise RuntimeError(f"[daemon] 已有 daemon 在 {path} 執行中")
+
+
+def preload() -> None:
+    """啟動時先載入並 warmup 意圖模型與垃圾信 cascade，第一個請求不付載入成本。"""
+    from smart_mail_agent.core.model_registry import registry
+
+    registry.preload()
+    _op_spam({"subject": "warmup", "content": "hello, this is a warmup message", "sender": "warmup@localhost"})
+
+
+def serve(path: str | None = None, *, warm: bool = True) -> None:
+    if warm:
+        preload()
+    server = InferenceDaemon(path)
+
+    def _stop(signum: int, frame: Any) -> None:
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _stop)
+    logger.info(f"[daemon] 監聽 {server.path}（pid {os.getpid()}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("[daemon] 已停止")
+
+
+# ===== 用戶端 =====
+class DaemonClient:
+    """同步用戶端；一個實例維持一條連線，可重複 request()。"""
+
+    def __init__(self, path: str | None = None, *, timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+        self._sock: socket.socket | None = None
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(self.timeout)
+            try:
+                s.connect(self.path)
+            except OSError as ex:
+                s.close()
+                raise DaemonUnavailable(f"{self.path}: {ex}") from ex
+            self._sock = s
+        return self._sock
+
+    def request(self, op: str, **payload: Any) -> Any:
+        sock = self._connect()
+        try:
+            send_frame(sock, dict(payload, op=op))
+            resp = recv_frame(sock)
+        except (OSError, ValueError) as ex:
+            self.close()
+            raise DaemonUnavailable(f"{self.path}: {ex}") from ex
+        if resp is None:
+            self.close()
+            raise DaemonUnavailable(f"{self.path}: 連線已關閉")
+        if not resp.get("ok"):
+            raise DaemonError(str(resp.get("error")))
+        return resp.get("result")
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def __enter__(self) -> DaemonClient:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def try_request(op: str, *, path: str | None = None, timeout: float = DEFAULT_TIMEOUT, **payload: Any) -> Any:
+    """有 daemon 就交給它；沒在跑、被停用（SMA_DAEMON=0）或失敗時回 None。"""
+    if os.getenv(ENV_DISABLE) == "0":
+        return None
+    target = path or default_socket_path()
+    if not os.path.exists(target):
+        return None
+    try:
+        with DaemonClient(target, timeout=timeout) as c:
+            return c.request(op, **payload)
+    except (DaemonUnavailable, DaemonError) as ex:
+        logger.debug(f"[daemon] {op} 改走行程內：{ex}")
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="sma-daemon", description="常駐推論服務（Unix socket）")
+    p.add_argument("--socket", default=None, help=f"socket 路徑（預設 ${ENV_SOCKET} 或 {default_socket_path()}）")
+    p.add_argument("--no-warmup", action="store_true", help="不預先載入模型（第一個請求才載入）")
+    act = p.add_mutually_exclusive_group()
+    act.add_argument("--status", action="store_true", help="查詢執行中 daemon 的狀態")
+    act.add_argument("--stop", action="store_true", help="停止執行中的 daemon")
+    ns = p.parse_args(argv)
+
+    if ns.status or ns.stop:
+        try:
+            with DaemonClient(ns.socket) as c:
+                t0 = time.perf_counter()
+                result = c.request("shutdown" if ns.stop else "status")
+                rtt = round((time.perf_counter() - t0) * 1000.0, 3)
+        except DaemonUnavailable as ex:
+            print(json.dumps({"running": False, "error": str(ex)}, ensure_ascii=False))
+            return 1
+        print(json.dumps({"running": not ns.stop, "rtt_ms": rtt, "status": result}, ensure_ascii=False, indent=2))
+        return 0
+    serve(ns.socket, warm=not ns.no_warmup)
+    return 0
+
+
+__all__ = [
+    "InferenceDaemon",
+    "DaemonClient",
+    "DaemonUnavailable",
+    "DaemonError",
+    "default_socket_path",
+    "send_frame",
+    "recv_frame",
+    "serve",
+    "preload",
+    "try_request",
+    "main",
+]
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/model_registry.py
+# 模組用途：行程內共用的模型註冊表
+# 1. register(name, factory, warmup)：只登記建構方式，第一次 get() 才載入（每個行程只載入一次）
+# 2. 載入後立刻跑一次 warmup 推論，把第一次呼叫的延遲（lazy init、JIT、配置記憶體）吃掉
+# 3. is_ready() / status() 提供就緒旗標；preload() 可在啟動時背景預載
+# 4. 所有呼叫者拿到同一個實例（分類器本身需可被多執行緒共用）
+
+STATE_UNLOADED = "unloaded"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+
+@dataclass
+class _Entry:
+    factory: Callable[[], Any]
+    warmup: Callable[[Any], Any] | None = None
+    instance: Any = None
+    state: str = STATE_UNLOADED
+    error: str | None = None
+    load_ms: float = 0.0
+    warmup_ms: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ModelRegistry:
+    """名稱 → 模型實例。載入失敗不快取，下次 get() 會重試。"""
+
+    def __init__(self) -> None:
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self) -> None:
+        # fork 後子行程沿用父行程已載入的實例（copy-on-write），但鎖可能停在被持有的狀態
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            for e in self._entries.values():
+                e.lock = threading.Lock()
+                if e.state == STATE_LOADING:
+                    e.state = STATE_UNLOADED
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        *,
+        warmup: Callable[[Any], Any] | None = None,
+        replace: bool = False,
+    ) -> None:
+        """登記模型；同名已登記時除非 replace=True 否則忽略（已載入的實例不受影響）。"""
+        self._check_fork()
+        with self._lock:
+            if name in self._entries and not replace:
+                return
+            self._entries[name] = _Entry(factory, warmup)
+
+    def _entry(self, name: str) -> _Entry:
+        self._check_fork()
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"[ModelRegistry] 未登記的模型：{name}") from None
+
+    def get(self, name: str) -> Any:
+        """取得（必要時載入並 warmup）模型實例。"""
+        e = self._entry(name)
+        if e.state == STATE_READY:
+            return e.instance
+        with e.lock:
+            if e.state == STATE_READY:
+                return e.instance
+            e.state, e.error = STATE_LOADING, None
+            t0 = time.perf_counter()
+            try:
+                inst = e.factory()
+            except Exception as ex:
+                e.state, e.error = STATE_FAILED, f"{type(ex).__name__}: {ex}"
+                logger.error(f"[ModelRegistry] {name} 載入失敗：{ex}")
+                raise
+            t1 = time.perf_counter()
+            if e.warmup is not None:
+                try:
+                    e.warmup(inst)
+                except Exception as ex:
+                    # warmup 只是預熱；失敗不影響使用
+                    logger.warning(f"[ModelRegistry] {name} warmup 失敗：{ex}")
+            e.load_ms = (t1 - t0) * 1000.0
+            e.warmup_ms = (time.perf_counter() - t1) * 1000.0
+            e.instance = inst
+            e.state = STATE_READY
+            logger.info(f"[ModelRegistry] {name} 就緒（載入 {e.load_ms:.1f}ms，warmup {e.warmup_ms:.1f}ms）")
+            return inst
+
+    def is_ready(self, name: str | None = None) -> bool:
+        """指定名稱：該模型是否已就緒；未指定：所有已登記模型皆就緒。"""
+        self._check_fork()
+        if name is not None:
+            e = self._entries.get(name)
+            return e is not None and e.state == STATE_READY
+        return all(e.state == STATE_READY for e in self._entries.values())
+
+    def preload(self, names: Iterable[str] | None = None, *, background: bool = False) -> threading.Thread | None:
+        """預先載入（預設全部）；background=True 時在背景執行緒載入並回傳該執行緒。"""
+        targets = list(names) if names is not None else list(self._entries)
+
+        def _run() -> None:
+            for n in targets:
+                try:
+                    self.get(n)
+                except Exception:
+                    pass  # 已記錄於 status()
+
+        if not background:
+            _run()
+            return None
+        t = threading.Thread(target=_run, name="sma-model-preload", daemon=True)
+        t.start()
+        return t
+
+    def status(self) -> dict[str, dict[str, Any]]:
+        self._check_fork()
+        return {
+            n: {
+                "state": e.state,
+                "load_ms": round(e.load_ms, 3),
+                "warmup_ms": round(e.warmup_ms, 3),
+                "error": e.error,
+            }
+            for n, e in self._entries.items()
+        }
+
+    def unload(self, name: str | None = None) -> None:
+        """釋放實例（測試或換模型用）；登記保留，下次 get() 重新載入。實例有 close() 時一併呼叫。"""
+        self._check_fork()
+        for n, e in list(self._entries.items()):
+            if name is None or n == name:
+                with e.lock:
+                    close = getattr(e.instance, "close", None)
+                    if callable(close):
+                        try:
+                            close()
+                        except Exception as ex:
+                            logger.warning(f"[ModelRegistry] {n} close 失敗：{ex}")
+                    e.instance, e.state, e.error = None, STATE_UNLOADED, None
+
+
+# ===== 預設註冊表與內建模型 =====
+registry = ModelRegistry()
+
+INTENT = "intent"
+INTENT_BATCHER = "intent_batcher"
+
+
+def _intent_factory() -> Any:
+    # 有指定本地 HF 模型時用 core 版（transformers）；否則沿用規則版（離線 / 測試）
+    model_path = os.getenv("SMA_INTENT_MODEL_PATH")
+    if model_path:
+        from smart_mail_agent.core.classifier import IntentClassifier as HFIntentClassifier
+
+        return HFIntentClassifier(model_path)
+    from smart_mail_agent.utils.inference_classifier import IntentClassifier
+
+    return IntentClassifier()
+
+
+def _intent_warmup(clf: Any) -> None:
+    clf.classify("warmup", "hello, this is a warmup message")
+
+
+def _intent_batcher_factory() -> Any:
+    # 並行呼叫端（daemon 的連線執行緒）共用一條模型執行緒，同時到達的請求合併成一批
+    from smart_mail_agent.core.batching import MicroBatcher
+
+    return MicroBatcher(provider=lambda: registry.get(INTENT))
+
+
+registry.register(INTENT, _intent_factory, warmup=_intent_warmup)
+registry.register(INTENT_BATCHER, _intent_batcher_factory)
+
+
+def get_model(name: str) -> Any:
+    return registry.get(name)
+
+
+def get_intent_classifier() -> Any:
+    """行程內共用的意圖分類器（第一次呼叫才載入並 warmup）。"""
+    return registry.get(INTENT)
+
+
+def get_intent_batcher() -> Any:
+    """意圖分類的微批次執行器（MicroBatcher）；classify() 介面與分類器相同。"""
+    return registry.get(INTENT_BATCHER)
+
+
+def is_ready(name: str | None = None) -> bool:
+    return registry.is_ready(name)
+
+
+__all__ = [
+    "ModelRegistry",
+    "registry",
+    "get_model",
+    "get_intent_classifier",
+    "get_intent_batcher",
+    "is_ready",
+    "INTENT",
+    "INTENT_BATCHER",
+    "STATE_UNLOADED",
+    "STATE_LOADING",
+    "STATE_READY",
+    "STATE_FAILED",
+]
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+try:
+    import numpy as np
+except Exception:  # noqa: F401
+    np = None
+
+try:
+    import onnxruntime as ort
+except Exception:  # noqa: F401
+    ort = None
+
+try:
+    from transformers import AutoTokenizer
+except Exception:  # noqa: F401
+    AutoTokenizer = None
+
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/onnx_backend.py
+# 模組用途：IntentClassifier 的 ONNX Runtime（CPU）後端
+# 1. 讀取 trainers/export_onnx 匯出的目錄：model.int8.onnx（優先）或 model.onnx + tokenizer + config.json
+# 2. predict_ids()：已斷詞的一批 input_ids → (label, score)；呼叫端依長度排序後 padding 最少
+# 3. __call__() 與 transformers pipeline 相容：(text | [text], truncation=True) -> [{label, score}]
+
+ONNX_FP32 = "model.onnx"
+ONNX_INT8 = "model.int8.onnx"
+DEFAULT_MAX_LENGTH = 512
+
+
+def _require_onnx() -> None:
+    if ort is None or np is None:
+        raise RuntimeError(
+            "'onnxruntime' 未安裝或載入失敗：請執行\n"
+            "  pip install -e .[onnx]\n"
+        )
+
+
+def _read_id2label(model_dir: Path) -> dict[int, str]:
+    cfg = json.loads((model_dir / "config.json").read_text(encoding="utf-8"))
+    return {int(k): str(v) for k, v in (cfg.get("id2label") or {}).items()}
+
+
+class OnnxIntentModel:
+    """
+    ONNX Runtime 推論包裝。session / tokenizer / id2label 可外部注入（測試用）。
+    intra_op_threads 未指定時讀 SMA_ONNX_THREADS（0 = 交給 onnxruntime 決定）。
+    """
+
+    def __init__(
+        self,
+        model_dir: str | Path | None = None,
+        *,
+        onnx_file: str | None = None,
+        prefer_int8: bool = True,
+        intra_op_threads: int | None = None,
+        max_length: int = DEFAULT_MAX_LENGTH,
+        session: Any = None,
+        tokenizer: Any = None,
+        id2label: dict[int, str] | None = None,
+    ) -> None:
+        base = Path(model_dir) if model_dir is not None else None
+        if session is None:
+            _require_onnx()
+            if base is None:
+                raise ValueError("[OnnxIntentModel] 需要 model_dir 或 session")
+            if onnx_file:
+                path = base / onnx_file
+            else:
+                path = base / ONNX_INT8 if prefer_int8 and (base / ONNX_INT8).exists() else base / ONNX_FP32
+            so = ort.SessionOptions()
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            threads = int(os.getenv("SMA_ONNX_THREADS", "0")) if intra_op_threads is None else int(intra_op_threads)
+            if threads > 0:
+                so.intra_op_num_threads = threads
+            session = ort.InferenceSession(str(path), sess_options=so, providers=["CPUExecutionProvider"])
+            logger.info(f"[OnnxIntentModel] 載入 {path}")
+            self.onnx_path: str | None = str(path)
+        else:
+            self.onnx_path = None
+        if tokenizer is None:
+            if AutoTokenizer is None:
+                raise RuntimeError("'transformers' 未安裝：ONNX 後端仍需要 tokenizer")
+            tokenizer = AutoTokenizer.from_pretrained(str(base))
+        if id2label is None:
+            id2label = _read_id2label(base) if base is not None else {}
+
+        self.session = session
+        self.tokenizer = tokenizer
+        self.id2label = dict(id2label)
+        self.max_length = int(max_length)
+        self.input_names = {i.name for i in session.get_inputs()}
+        self.pad_id = int(getattr(tokenizer, "pad_token_id", None) or 0)
+
+    def encode(self, texts: Sequence[str]) -> list[list[int]]:
+        return self.tokenizer(list(texts), truncation=True, max_length=self.max_length)["input_ids"]
+
+    def predict_ids(self, ids: Sequence[Sequence[int]]) -> list[tuple[str, float] | None]:
+        """一批 input_ids → [(label, score)]；批內 pad 到最長一筆。"""
+        if not ids:
+            return []
+        width = max(len(x) for x in ids)
+        input_ids = np.full((len(ids), width), self.pad_id, dtype=np.int64)
+        mask = np.zeros((len(ids), width), dtype=np.int64)
+        for i, row in enumerate(ids):
+            input_ids[i, : len(row)] = row
+            mask[i, : len(row)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": mask, "token_type_ids": np.zeros_like(input_ids)}
+        logits = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=-1, keepdims=True)
+        best = probs.argmax(axis=-1)
+        return [
+            (self.id2label.get(int(k), str(int(k))), float(probs[i, k]))
+            for i, k in enumerate(best)
+        ]
+
+    def __call__(self, texts: str | Sequence[str], truncation: bool = True, **_: Any) -> list[dict[str, Any]]:
+        batch = [texts] if isinstance(texts, str) else list(texts)
+        preds = self.predict_ids(self.encode(batch))
+        return [{"label": p[0], "score": p[1]} for p in preds if p is not None]
+
+
+__all__ = ["OnnxIntentModel", "ONNX_FP32", "ONNX_INT8"]
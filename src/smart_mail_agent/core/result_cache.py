@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/result_cache.py
+# 模組用途：意圖分類結果的兩層快取（行程內 LRU + SQLite）
+# 1. 鍵 = sha256(模型版本 + 正規化後的主旨/內文)；重跑、重試、回放的同一封信不再推論
+# 2. 模型版本由模型目錄內的權重 / 設定檔算出（小檔案如 config / tokenizer / 標籤表看內容，大權重檔看大小與 mtime）：
+#    換模型後舊結果自然失效，bind() 時順便刪掉同一模型舊版本的資料列
+# 3. 只存模型原始輸出（model_label, confidence）；fallback 規則由分類器在讀出後依目前設定套用
+# 4. SQLite 以 WAL 模式開啟，每個行程各自連線（fork 出的 worker 不共用 fork 前的連線）
+
+_WS = re.compile(r"\s+")
+_ARTIFACT_SUFFIXES = (".safetensors", ".bin", ".onnx", ".json", ".txt", ".model")
+_HASH_CONTENT_MAX = 4 * 1024 * 1024  # 不超過此大小的檔案以內容雜湊（改 id2label 不一定改變大小）
+
+
+def normalize_text(subject: str, content: str) -> str:
+    """NFKC + 去頭尾空白 + 連續空白合一；不改大小寫（模型可能區分）。"""
+    parts = (unicodedata.normalize("NFKC", x or "") for x in (subject, content))
+    return "\n".join(_WS.sub(" ", p).strip() for p in parts)
+
+
+def artifact_version(model_dir: str | Path, backend: str = "torch") -> str | None:
+    """
+    模型目錄的版本指紋；不是本地目錄（例如 hub 名稱）時回 None（不快取）。
+    小檔案（設定、tokenizer、標籤表）以內容計算，大權重檔以檔名 + 大小 + mtime 計算（避免每次啟動讀整份權重）。
+    """
+    base = Path(model_dir)
+    if not base.is_dir():
+        return None
+    h = hashlib.sha256(backend.encode())
+    for p in sorted(base.iterdir()):
+        if p.is_file() and p.suffix in _ARTIFACT_SUFFIXES:
+            st = p.stat()
+            if st.st_size <= _HASH_CONTENT_MAX:
+                h.update(f"{p.name}:{hashlib.sha256(p.read_bytes()).hexdigest()}\n".encode())
+            else:
+                h.update(f"{p.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def cache_key(version: str, subject: str, content: str) -> str:
+    return hashlib.sha256(f"{version}\0{normalize_text(subject, content)}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    兩層快取：命中 LRU 直接回傳；沒命中再查 SQLite（命中後回填 LRU）。
+    path 為 None 時只有 LRU；maxsize <= 0 時不用 LRU（只走 SQLite）。
+    """
+
+    def __init__(self, path: str | Path | None = None, *, maxsize: int = 4096) -> None:
+        self.path = str(path) if path else None
+        self.maxsize = int(maxsize)
+        self._lru: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid = os.getpid()
+        self._bound: dict[str, str] = {}
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    # ---------- 持久化 ----------
+    def _db(self) -> sqlite3.Connection | None:
+        if not self.path:
+            return None
+        if self._pid != os.getpid():
+            # fork 後不能沿用父行程的連線
+            self._pid, self._conn, self._lock = os.getpid(), None, threading.Lock()
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS intent_cache(
+                key TEXT PRIMARY KEY,
+                model_id TEXT,
+                version TEXT,
+                result TEXT,
+                ts REAL
+            )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_intent_cache_model ON intent_cache(model_id, version)")
+            self._conn = conn
+        return self._conn
+
+    def bind(self, model_id: str, version: str) -> int:
+        """登記模型目前版本；刪除同一模型舊版本的資料列，回傳刪除筆數。"""
+        if self._bound.get(model_id) == version:
+            return 0
+        self._bound[model_id] = version
+        db = self._db()
+        if db is None:
+            return 0
+        try:
+            with self._lock, db:
+                n = db.execute(
+                    "DELETE FROM intent_cache WHERE model_id = ? AND version != ?", (model_id, version)
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"[ResultCache] 清除舊版本失敗：{e}")
+            return 0
+        if n:
+            logger.info(f"[ResultCache] {model_id} 模型已更新，清除 {n} 筆舊結果")
+        return n
+
+    # ---------- 讀寫 ----------
+    def _remember(self, key: str, value: dict[str, Any]) -> None:
+        if self.maxsize <= 0:
+            return
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+                self.hits_memory += 1
+                return dict(value)
+        db = self._db()
+        row = None
+        if db is not None:
+            try:
+                with self._lock:
+                    row = db.execute("SELECT result FROM intent_cache WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"[ResultCache] 讀取失敗：{e}")
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value)
+            self.hits_disk += 1
+            return dict(value)
+
+    def put(self, key: str, value: dict[str, Any], *, model_id: str = "", version: str = "") -> None:
+        value = dict(value)
+        with self._lock:
+            self._remember(key, value)
+        db = self._db()
+        if db is None:
+            return
+        try:
+            with self._lock, db:
+                db.execute(
+                    "INSERT OR REPLACE INTO intent_cache(key, model_id, version, result, ts) VALUES(?,?,?,?,?)",
+                    (key, model_id, version, json.dumps(value, ensure_ascii=False), time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"[ResultCache] 寫入失敗：{e}")
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        hits = self.hits_memory + self.hits_disk
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._lru),
+            "path": self.path,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self.hits_memory = self.hits_disk = self.misses = 0
+        db = self._db()
+        if db is not None:
+            with self._lock, db:
+                db.execute("DELETE FROM intent_cache")
+
+    def close(self) -> None:
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+_DEFAULT: dict[str, ResultCache | None] = {"cache": None}
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_cache() -> ResultCache:
+    """行程內共用快取；SMA_INTENT_CACHE_DB 指定 SQLite 路徑時啟用磁碟層，SMA_INTENT_CACHE_SIZE 為 LRU 容量。"""
+    with _DEFAULT_LOCK:
+        if _DEFAULT["cache"] is None:
+            cache = ResultCache(
+                os.getenv("SMA_INTENT_CACHE_DB") or None,
+                maxsize=int(os.getenv("SMA_INTENT_CACHE_SIZE", "4096")),
+            )
+            if cache.path:
+                atexit.register(cache.close)
+            _DEFAULT["cache"] = cache
+        return _DEFAULT["cache"]  # type: ignore[return-value]
+
+
+__all__ = [
+    "ResultCache",
+    "default_cache",
+    "artifact_version",
+    "cache_key",
+    "normalize_text",
+]
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import mmap
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+try:
+    import torch
+except Exception:  # noqa: F401
+    torch = None
+
+try:
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+except Exception:  # noqa: F401
+    AutoConfig = AutoModelForSequenceClassification = None
+
+try:
+    from transformers.modeling_utils import no_init_weights
+except Exception:  # noqa: F401
+    no_init_weights = None
+
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/weights.py
+# 模組用途：safetensors 權重以 mmap 載入（分類器冷啟動）
+# 1. mmap_state_dict()：解析 safetensors 標頭，每個張量都是檔案 mmap（MAP_PRIVATE）上的零複製視圖
+#    → 載入時間與檔案大小幾乎無關；頁面走 page cache，多個行程共用；用不到的張量（例如多餘的 head）永遠不會被讀進來
+# 2. load_mmap_model()：依 config 建立模型（跳過隨機初始化）後以 assign=True 直接換上 mmap 張量
+# 3. convert_to_safetensors()：舊的 pytorch_model.bin 轉成 model.safetensors
+# 4. benchmark_load()：每次在新行程量測 from_pretrained 與 mmap 的冷 / 熱載入時間與 RSS
+
+SAFETENSORS_FILE = "model.safetensors"
+MMAP_ATTR = "_sma_weights_mmap"  # 模型上保留 mmap 物件（張量存活期間檔案映射不可關閉）
+
+_DTYPES: dict[str, str] = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def _require_torch() -> None:
+    if torch is None or AutoModelForSequenceClassification is None:
+        raise RuntimeError(
+            "'torch' / 'transformers' 未安裝或載入失敗：請執行\n"
+            "  pip install -e .[llm]\n"
+        )
+
+
+def has_safetensors(model_dir: str | Path) -> bool:
+    return (Path(model_dir) / SAFETENSORS_FILE).is_file()
+
+
+def read_header(path: str | Path) -> tuple[dict[str, Any], int]:
+    """回傳 (張量描述, 資料區起點 byte offset)；格式：8 bytes LE 長度 + JSON 標頭 + 資料區。"""
+    with open(path, "rb") as f:
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n).decode("utf-8"))
+    header.pop("__metadata__", None)
+    return header, 8 + n
+
+
+def mmap_state_dict(path: str | Path) -> tuple[dict[str, Any], mmap.mmap]:
+    """safetensors → {name: tensor}，張量共用檔案 mmap（寫入時才各自複製，不會改到檔案）。"""
+    _require_torch()
+    header, base = read_header(path)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    state: dict[str, Any] = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        shape = list(info["shape"])
+        if end == begin:
+            state[name] = torch.empty(shape, dtype=dtype)
+            continue
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        state[name] = torch.frombuffer(mm, dtype=dtype, count=count, offset=base + begin).view(shape)
+    return state, mm
+
+
+def _skip_init() -> Any:
+    # 權重馬上會被換掉：不做隨機初始化（非持久 buffer 如 position_ids 仍正常建立）
+    return no_init_weights() if no_init_weights is not None else contextlib.nullcontext()
+
+
+def load_mmap_model(model_dir: str | Path, *, local_files_only: bool = True) -> Any:
+    """以 mmap 權重建立 AutoModelForSequenceClassification；缺少必要權重時丟 RuntimeError。"""
+    _require_torch()
+    model_dir = Path(model_dir)
+    config = AutoConfig.from_pretrained(str(model_dir), local_files_only=local_files_only)
+    with _skip_init():
+        model = AutoModelForSequenceClassification.from_config(config)
+    state, mm = mmap_state_dict(model_dir / SAFETENSORS_FILE)
+    expected = set(model.state_dict())
+    prefix = f"{model.base_model_prefix}."
+    # 只有 backbone 沒有前綴的 checkpoint（例如直接存 base model）補上前綴
+    state = {k if k in expected or f"{prefix}{k}" not in expected else f"{prefix}{k}": v for k, v in state.items()}
+    result = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    tied = set(getattr(model, "_tied_weights_keys", None) or [])
+    missing = [k for k in result.missing_keys if k not in tied]
+    if missing:
+        raise RuntimeError(f"[weights] {model_dir} 缺少權重：{missing[:5]}")
+    setattr(model, MMAP_ATTR, mm)
+    return model.eval()
+
+
+def load_model(model_dir: str | Path, *, local_files_only: bool = True) -> Any:
+    """分類器用：有 model.safetensors 且未關閉（SMA_MMAP_WEIGHTS=0）時走 mmap，否則 from_pretrained。"""
+    _require_torch()
+    if os.getenv("SMA_MMAP_WEIGHTS", "1") != "0" and has_safetensors(model_dir):
+        try:
+            return load_mmap_model(model_dir, local_files_only=local_files_only)
+        except Exception as ex:
+            logger.warning(f"[weights] mmap 載入失敗，改用 from_pretrained：{ex}")
+    return AutoModelForSequenceClassification.from_pretrained(str(model_dir), local_files_only=local_files_only)
+
+
+def convert_to_safetensors(model_dir: str | Path, output_dir: str | Path | None = None) -> str:
+    """舊格式 checkpoint（pytorch_model.bin）另存為 safetensors；output_dir 預設原地。"""
+    _require_torch()
+    out = Path(output_dir or model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(str(model_dir), local_files_only=True)
+    model.save_pretrained(str(out), safe_serialization=True)
+    return str(out / SAFETENSORS_FILE)
+
+
+# ===== 載入基準 =====
+def _evict(model_dir: Path) -> None:
+    # 冷啟動：請核心丟掉權重檔的 page cache（不需 root；只影響未被其他行程映射的乾淨頁）
+    for p in model_dir.iterdir():
+        if p.suffix in (".safetensors", ".bin") and hasattr(os, "posix_fadvise"):
+            fd = os.open(p, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def _child(method: str, model_dir: str) -> None:
+    from smart_mail_agent.core.worker_pool import process_memory
+
+    t0 = time.perf_counter()
+    if method == "mmap":
+        load_mmap_model(model_dir)
+    else:
+        AutoModelForSequenceClassification.from_pretrained(model_dir, local_files_only=True).eval()
+    ms = (time.perf_counter() - t0) * 1000.0
+    print(json.dumps({"load_ms": round(ms, 1), **process_memory()}))
+
+
+def benchmark_load(model_dir: str, *, repeats: int = 3) -> dict[str, Any]:
+    """每種方法在新行程量測 repeats 次冷（先清 page cache）與熱載入：中位數 load_ms 與 RSS。"""
+    model_dir_p = Path(model_dir)
+    methods = ["from_pretrained"] + (["mmap"] if has_safetensors(model_dir_p) else [])
+    report: dict[str, Any] = {"model_dir": str(model_dir_p), "repeats": repeats}
+    for method in methods:
+        for mode in ("cold", "warm"):
+            runs = []
+            for _ in range(max(1, repeats)):
+                if mode == "cold":
+                    _evict(model_dir_p)
+                out = subprocess.run(
+                    [sys.executable, "-m", "smart_mail_agent.core.weights", "--child", method, str(model_dir_p)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+            report[f"{method}_{mode}"] = {
+                "load_ms": statistics.median(r["load_ms"] for r in runs),
+                "rss_mb": statistics.median(r.get("rss_mb", 0.0) for r in runs),
+                "private_mb": statistics.median(r.get("private_mb", 0.0) for r in runs),
+            }
+    if "mmap_warm" in report:
+        for mode in ("cold", "warm"):
+            base, mm = report[f"from_pretrained_{mode}"]["load_ms"], report[f"mmap_{mode}"]["load_ms"]
+            report[f"speedup_{mode}"] = round(base / mm, 2) if mm else None
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="safetensors mmap 權重：格式轉換與冷 / 熱載入基準")
+    p.add_argument("model_dir", nargs="?", default="outputs/roberta-zh-checkpoint")
+    p.add_argument("--convert", action="store_true", help="先把 pytorch_model.bin 轉成 model.safetensors")
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ns = p.parse_args(argv)
+    if ns.child:
+        _child(ns.child, ns.model_dir)
+        return 0
+    if ns.convert:
+        print(json.dumps({"converted": convert_to_safetensors(ns.model_dir)}, ensure_ascii=False))
+    print(json.dumps(benchmark_load(ns.model_dir, repeats=ns.repeats), ensure_ascii=False, indent=2))
+    return 0
+
+
+__all__ = [
+    "SAFETENSORS_FILE",
+    "MMAP_ATTR",
+    "has_safetensors",
+    "read_header",
+    "mmap_state_dict",
+    "load_mmap_model",
+    "load_model",
+    "convert_to_safetensors",
+    "benchmark_load",
+    "main",
+]
+
+if __name__ == "__main__":
+    raise SystemExit(main())
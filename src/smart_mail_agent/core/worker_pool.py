@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import multiprocessing as mp
+import os
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+try:
+    import torch
+except Exception:  # noqa: F401
+    torch = None
+
+from smart_mail_agent.core.weights import MMAP_ATTR
+from smart_mail_agent.utils.logger import logger
+
+# 檔案位置：src/smart_mail_agent/core/worker_pool.py
+# 模組用途：多核心意圖分類 worker pool（權重只載入一次）
+# 1. 父行程載入分類器並 warmup，torch 權重移到共享記憶體（share_memory），gc.freeze() 後才 fork
+#    → 子行程透過 copy-on-write 共用同一份權重，不會各自再載入一份
+# 2. 核心預算：cores / workers 分給每個 worker 的 intra-op 執行緒數（torch.set_num_threads），避免超額訂閱
+#    ONNX 後端的執行緒數在建立 session 時就固定：由本模組載入時先設 SMA_ONNX_THREADS
+# 3. report()：每個 worker 的 RSS / PSS / 共享與私有記憶體（/proc/<pid>/smaps_rollup）與最近一次的總吞吐量
+
+_POOL_CLF: Any = None  # fork 前設定，子行程繼承
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def plan_threads(cores: int, workers: int | None = None, threads_per_worker: int | None = None) -> tuple[int, int]:
+    """
+    依核心預算決定 (workers, threads_per_worker)；兩者相乘不超過 cores（至少 1×1）。
+    明確指定的 workers / threads_per_worker 超出預算時會被調降並記 warning。
+    """
+    cores = max(1, int(cores))
+    if workers is None and threads_per_worker is None:
+        threads_per_worker = 1
+    if workers is None:
+        workers = max(1, cores // max(1, int(threads_per_worker or 1)))
+    workers = max(1, int(workers))
+    if workers > cores:
+        logger.warning(f"[ClassifierPool] workers={workers} 超過 {cores} cores，調降為 {cores}")
+        workers = cores
+    if threads_per_worker is None:
+        threads_per_worker = max(1, cores // workers)
+    threads_per_worker = max(1, int(threads_per_worker))
+    if workers * threads_per_worker > cores:
+        fit = max(1, cores // workers)
+        logger.warning(
+            f"[ClassifierPool] {workers} workers × {threads_per_worker} threads 超過 {cores} cores，"
+            f"每個 worker 調降為 {fit} threads"
+        )
+        threads_per_worker = fit
+    return workers, threads_per_worker
+
+
+def process_memory(pid: int | None = None) -> dict[str, float]:
+    """行程記憶體（MB）。smaps_rollup 有 PSS（共享頁依共用行程數分攤），沒有時退回 VmRSS。"""
+    pid = os.getpid() if pid is None else pid
+    keys = {
+        "Rss": "rss_mb",
+        "Pss": "pss_mb",
+        "Shared_Clean": "shared_mb",
+        "Shared_Dirty": "shared_mb",
+        "Private_Clean": "private_mb",
+        "Private_Dirty": "private_mb",
+    }
+    out: dict[str, float] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in keys:
+                    out[keys[name]] = out.get(keys[name], 0.0) + int(rest.split()[0]) / 1024.0
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        out["rss_mb"] = int(line.split()[1]) / 1024.0
+        except OSError:
+            pass
+    return {k: round(v, 1) for k, v in out.items()}
+
+
+def _worker_init(threads: int) -> None:
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # 已初始化過 inter-op pool（父行程跑過推論）時不能再改
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _classify_chunk(pairs: list[tuple[str, str]], batch_size: int) -> tuple[int, list[dict[str, Any]]]:
+    clf = _POOL_CLF
+    if hasattr(clf, "classify_many"):
+        res = clf.classify_many(pairs, batch_size=batch_size)
+    else:
+        res = [clf.classify(s, c) for s, c in pairs]
+    return os.getpid(), res
+
+
+class ClassifierPool:
+    """
+    fork 出的多行程分類器；classify_many() 依輸入順序回傳，欄位與 IntentClassifier.classify() 相同。
+    classifier 未指定時取 model_registry 的意圖分類器。workers <= 1 時不開行程，直接在本行程跑。
+    """
+
+    def __init__(
+        self,
+        classifier: Any = None,
+        *,
+        workers: int | None = None,
+        threads_per_worker: int | None = None,
+        cores: int | None = None,
+    ) -> None:
+        self.cores = int(cores or available_cores())
+        self.workers, self.threads_per_worker = plan_threads(self.cores, workers, threads_per_worker)
+        if classifier is None:
+            os.environ.setdefault("SMA_ONNX_THREADS", str(self.threads_per_worker))
+            from smart_mail_agent.core.model_registry import get_intent_classifier
+
+            classifier = get_intent_classifier()
+        self.classifier = classifier
+        self._executor: ProcessPoolExecutor | None = None
+        self._pids: set[int] = set()
+        self.last_run: dict[str, Any] = {}
+
+    def start(self) -> ClassifierPool:
+        global _POOL_CLF
+        if self._executor is not None or self.workers <= 1:
+            return self
+        if "fork" not in mp.get_all_start_methods():
+            raise RuntimeError("[ClassifierPool] 需要 fork（copy-on-write 共用權重），此平台不支援")
+        model = getattr(self.classifier, "model", None)
+        if model is not None and hasattr(model, "share_memory") and getattr(model, MMAP_ATTR, None) is None:
+            model.share_memory()  # 權重放進共享記憶體，子行程就算觸碰也不會複製（mmap 權重本來就共用）
+        _POOL_CLF = self.classifier
+        gc.collect()
+        gc.freeze()  # fork 前凍結：子行程的 GC 不再寫入這些物件，頁面維持共享
+        try:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=mp.get_context("fork"),
+                initializer=_worker_init,
+                initargs=(self.threads_per_worker,),
+            )
+            for f in [self._executor.submit(_ping) for _ in range(self.workers)]:
+                self._pids.add(f.result())
+        finally:
+            gc.unfreeze()
+        logger.info(
+            f"[ClassifierPool] {self.workers} workers × {self.threads_per_worker} threads（{self.cores} cores）"
+        )
+        return self
+
+    def classify_many(
+        self,
+        pairs: Sequence[tuple[str, str]],
+        *,
+        batch_size: int = 32,
+        chunksize: int | None = None,
+    ) -> list[dict[str, Any]]:
+        pairs = list(pairs)
+        t0 = time.perf_counter()
+        if self.workers <= 1:
+            if hasattr(self.classifier, "classify_many"):
+                results = self.classifier.classify_many(pairs, batch_size=batch_size)
+            else:
+                results = [self.classifier.classify(s, c) for s, c in pairs]
+        else:
+            self.start()
+            assert self._executor is not None
+            size = max(1, int(chunksize or -(-len(pairs) // (self.workers * 4)) or 1))
+            futures = [
+                self._executor.submit(_classify_chunk, pairs[i : i + size], batch_size)
+                for i in range(0, len(pairs), size)
+            ]
+            results = []
+            for f in futures:
+                pid, part = f.result()
+                self._pids.add(pid)
+                results.extend(part)
+        elapsed = time.perf_counter() - t0
+        self.last_run = {
+            "items": len(pairs),
+            "seconds": round(elapsed, 3),
+            "emails_per_s": round(len(pairs) / elapsed, 1) if elapsed > 0 else None,
+        }
+        return results
+
+    def report(self) -> dict[str, Any]:
+        """每個 worker 的記憶體與最近一次 classify_many() 的總吞吐量。"""
+        per_worker = {str(pid): process_memory(pid) for pid in sorted(self._pids)}
+        pss = [m["pss_mb"] for m in per_worker.values() if "pss_mb" in m]
+        return {
+            "cores": self.cores,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "parent": process_memory(),
+            "per_worker": per_worker,
+            "workers_pss_total_mb": round(sum(pss), 1) if pss else None,
+            "throughput": dict(self.last_run),
+        }
+
+    def close(self) -> None:
+        global _POOL_CLF
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._pids.clear()
+        _POOL_CLF = None
+
+    def __enter__(self) -> ClassifierPool:
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="多核心意圖分類 worker pool：吞吐量與每個 worker 的記憶體")
+    p.add_argument("--data", required=True, help="JSON/JSONL 信件（subject + content/body）")
+    p.add_argument("--model", default=None, help="模型目錄（未指定則用 SMA_INTENT_MODEL_PATH / 規則版）")
+    p.add_argument("--backend", default="torch", choices=("torch", "onnx"))
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--threads", type=int, default=None, help="每個 worker 的 intra-op 執行緒數")
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--limit", type=int, default=None)
+    ns = p.parse_args(argv)
+
+    from smart_mail_agent.trainers.export_onnx import load_eval_data
+
+    pairs, _ = load_eval_data(ns.data, ns.limit)
+    clf = None
+    if ns.model:
+        from smart_mail_agent.core.classifier import IntentClassifier
+
+        _, threads = plan_threads(available_cores(), ns.workers, ns.threads)
+        os.environ.setdefault("SMA_ONNX_THREADS", str(threads))
+        clf = IntentClassifier(ns.model, backend=ns.backend)
+    with ClassifierPool(clf, workers=ns.workers, threads_per_worker=ns.threads) as pool:
+        pool.classify_many(pairs, batch_size=ns.batch_size)
+        print(json.dumps(pool.report(), ensure_ascii=False, indent=2))
+    return 0
+
+
+__all__ = ["ClassifierPool", "available_cores", "plan_threads", "process_memory", "main"]
+
+if __name__ == "__main__":
+    raise SystemExit(main())
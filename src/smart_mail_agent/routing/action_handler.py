@@ -9,9 +9,10 @@ from pathlib import Path
 from pathlib import Path as _Path
 from typing import Any, Dict, List
 
+from smart_mail_agent.core.daemon import try_request
+from smart_mail_agent.core.model_registry import get_intent_classifier
 from smart_mail_agent.features.quotation import _safe_stem as _sma_safe_stem
 from smart_mail_agent.features.quotation import choose_package, generate_pdf_quote
-from smart_mail_agent.utils.inference_classifier import IntentClassifier
 
 
 # --- 風險判斷 ---
@@ -109,8 +110,10 @@ def handle(
 ) -> Dict[str, Any]:
     label = payload.get("predicted_label") or ""
     if not label:
-        clf = IntentClassifier()
-        c = clf.classify(payload.get("subject", ""), payload.get("body", ""))
+        # 先問 sma-daemon（模型常駐）；沒在跑時用行程內共用實例（第一次才載入並 warmup）
+        c = try_request("classify", subject=payload.get("subject", ""), content=payload.get("body", ""))
+        if not isinstance(c, dict):
+            c = get_intent_classifier().classify(payload.get("subject", ""), payload.get("body", ""))
         label = c.get("predicted_label") or c.get("label") or "其他"
     label = _normalize_label(label)
     action_fn = (
@@ -8,6 +8,8 @@ import sys
 from pathlib import Path
 from typing import Any, Dict, List
 
+from smart_mail_agent.spam.rules import compiled_rules
+
 
 def _ext(fname: str) -> str:
     return Path(fname).suffix.lower().lstrip(".")
@@ -91,9 +93,9 @@ def _apply_policy(
         "warnings": [],
     }
 
-    # 白名單
+    # 白名單（網域名單與 spam 規則共用：whitelist_domains + domain_lists.allow）
     dom = _domain(sender)
-    if whitelist or os.getenv("SMA_FORCE_WHITELIST") == "1" or dom.endswith("trusted.example"):
+    if whitelist or os.getenv("SMA_FORCE_WHITELIST") == "1" or compiled_rules().domains.is_allowed(dom):
         out["meta"]["whitelisted"] = True
 
     # 模擬失敗 → 強制人工審查，並標記原因
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    from openai import AsyncOpenAI  # type: ignore
+except Exception:  # pragma: no cover - 未安裝 llm extra
+    AsyncOpenAI = None  # type: ignore
+
+from smart_mail_agent.utils.logger import logger
+
+from .llm_cache import DEFAULT_TTL_S, LLMVerdictCache, llm_cache_key
+from .llm_prompt import (
+    DEFAULT_ITEM_TOKENS,
+    SYSTEM_PROMPT,
+    batch_prompt,
+    estimate_tokens,
+    item_ids,
+    minimize_message,
+    parse_batch_answer,
+)
+
+# 檔案位置：src/smart_mail_agent/spam/async_llm_filter.py
+# 模組用途：非同步、微批次的 LLM 詐騙判定（SpamLLMFilter 的 asyncio 版）
+#   - 在 window_ms 內排隊的信件合併成一個多封提示詞（上限 max_batch 封 / batch_tokens）
+#   - 同時最多 max_concurrency 個上游請求；額度用滿時佇列繼續累積，下一批自然變大
+#   - 每封信先縮成可見文字並套用 item_tokens 預算；與同步版共用判定快取
+#   - 批次內每封以隨機編號界定，回覆只接受本批編號；SQLite 快取讀寫在 worker thread 執行，不卡事件迴圈
+
+
+@dataclass
+class _Pending:
+    key: str
+    text: str
+    tokens: int
+    future: "asyncio.Future[bool]"
+
+
+class AsyncSpamLLMFilter:
+    """
+    用法：
+        flt = AsyncSpamLLMFilter()
+        verdict = await flt.is_suspicious(subject, content)
+        ...
+        await flt.aclose()
+    上游錯誤或回覆缺漏時該封回傳 False（與同步版相同的保守預設），且不寫入快取。
+    """
+
+    def __init__(
+        self,
+        model: str = "gpt-3.5-turbo",
+        *,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        client: Any = None,
+        max_batch: int = 16,
+        window_ms: float = 25.0,
+        max_concurrency: int = 4,
+        item_tokens: int = DEFAULT_ITEM_TOKENS,
+        batch_tokens: int = 6000,
+        cache: Union[LLMVerdictCache, str, bool, None] = None,
+        cache_ttl: float = DEFAULT_TTL_S,
+    ) -> None:
+        base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        if client is None:
+            if AsyncOpenAI is None:
+                raise ImportError("[AsyncSpamLLMFilter] 需要安裝 openai（pip install smart-mail-agent[llm]）")
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+            if not api_key and not base_url:
+                raise ValueError("[AsyncSpamLLMFilter] 缺少必要環境變數 OPENAI_API_KEY")
+            client = AsyncOpenAI(api_key=api_key or "local", base_url=base_url)
+        self.client = client
+        self.model = model
+        self.max_batch = max(1, int(max_batch))
+        self.window_s = max(0.0, float(window_ms)) / 1000.0
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.item_tokens = int(item_tokens)
+        self.batch_tokens = max(self.item_tokens, int(batch_tokens))
+
+        if cache is False:
+            self.cache: Optional[LLMVerdictCache] = None
+        elif isinstance(cache, LLMVerdictCache):
+            self.cache = cache
+        else:
+            try:
+                self.cache = LLMVerdictCache(cache or None, ttl=cache_ttl)
+            except Exception as e:
+                logger.warning(f"[AsyncSpamLLMFilter] 無法開啟判定快取，改為不快取：{e}")
+                self.cache = None
+
+        # 以下狀態綁定第一次使用時的事件迴圈
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional["asyncio.Queue[_Pending]"] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._batcher: Optional["asyncio.Task[None]"] = None
+        self._inflight: Dict[str, "asyncio.Future[bool]"] = {}
+        self._sends: "set[asyncio.Task[None]]" = set()
+        self.stats: Dict[str, int] = {"requests": 0, "items": 0, "cache_hits": 0, "coalesced": 0, "errors": 0}
+
+    # ---------- 公開 API ----------
+    async def is_suspicious(self, subject: str, content: str) -> bool:
+        """排入下一個批次並等待結果（先查快取；同內容已在途則共用結果）。"""
+        key = llm_cache_key(subject, content, self.model, item_tokens=self.item_tokens)
+        if self.cache is not None:
+            hit = await asyncio.to_thread(self.cache.get, key)
+            if hit is not None:
+                self.stats["cache_hits"] += 1
+                return hit
+        self._ensure_started()
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+        text = minimize_message(subject, content, self.item_tokens)
+        fut = self._loop.create_future()  # type: ignore[union-attr]
+        self._inflight[key] = fut
+        await self._queue.put(_Pending(key, text, estimate_tokens(text), fut))  # type: ignore[union-attr]
+        return await asyncio.shield(fut)
+
+    async def is_suspicious_many(self, items: Iterable[Tuple[str, str]]) -> List[bool]:
+        """多封 (subject, content) 一次送進佇列；結果依輸入順序。"""
+        return list(await asyncio.gather(*(self.is_suspicious(s, c) for s, c in items)))
+
+    async def aclose(self) -> None:
+        """停止批次器並等待已送出的請求完成。"""
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+        for fut in self._inflight.values():
+            if not fut.done():
+                fut.set_result(False)
+        self._inflight.clear()
+
+    # ---------- 內部 ----------
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 換了事件迴圈（例如多次 asyncio.run）：舊迴圈的物件不可再用
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+            self._sends = set()
+            self._batcher = None
+        if self._batcher is None or self._batcher.done():
+            self._batcher = loop.create_task(self._run_batcher())
+
+    async def _run_batcher(self) -> None:
+        q, sem = self._queue, self._sem
+        assert q is not None and sem is not None
+        carry: Optional[_Pending] = None
+        while True:
+            first = carry or await q.get()
+            carry = None
+            batch, tokens = [first], first.tokens
+            deadline = self._loop.time() + self.window_s  # type: ignore[union-attr]
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()  # type: ignore[union-attr]
+                try:
+                    item = q.get_nowait() if timeout <= 0 else await asyncio.wait_for(q.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if tokens + item.tokens > self.batch_tokens:
+                    carry = item
+                    break
+                batch.append(item)
+                tokens += item.tokens
+            # 額度用滿時在此等待；期間新進的信留在佇列，成為下一批
+            await sem.acquire()
+            task = self._loop.create_task(self._send(batch))  # type: ignore[union-attr]
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    def _store(self, verdicts: List[Tuple[str, bool]]) -> None:
+        for key, verdict in verdicts:
+            self.cache.put(key, verdict, self.model)  # type: ignore[union-attr]
+
+    async def _send(self, batch: List[_Pending]) -> None:
+        try:
+            results: List[Optional[bool]] = [None] * len(batch)
+            ids = item_ids(len(batch))
+            try:
+                self.stats["requests"] += 1
+                self.stats["items"] += len(batch)
+                resp = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": batch_prompt([p.text for p in batch], ids)},
+                    ],
+                    max_tokens=12 * len(batch) + 16,
+                    temperature=0.0,
+                )
+                answer = resp.choices[0].message.content or ""
+                results = parse_batch_answer(answer, ids)
+                logger.debug(f"[AsyncSpamLLMFilter] {len(batch)} 封判斷結果：{answer!r}")
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"[AsyncSpamLLMFilter] LLM 批次判斷失敗：{e}")
+            if self.cache is not None:
+                # 先寫快取再交付結果：交付後同內容的新呼叫就會查到快取，不會再送一次上游
+                done = [(p.key, v) for p, v in zip(batch, results) if v is not None]
+                if done:
+                    await asyncio.to_thread(self._store, done)
+            for p, verdict in zip(batch, results):
+                if not p.future.done():
+                    p.future.set_result(bool(verdict))
+                self._inflight.pop(p.key, None)
+        finally:
+            self._sem.release()  # type: ignore[union-attr]
+
+
+__all__ = ["AsyncSpamLLMFilter"]
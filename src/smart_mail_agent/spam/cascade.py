@@ -0,0 +1,591 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from smart_mail_agent.utils.logger import logger
+
+from . import rules
+from .domain_list import sender_domain
+from .html_scan import scan_html
+from .keyword_automaton import normalize_text
+from .reputation import REP_TRUSTED, ReputationStore, default_store
+
+# 檔案位置：src/smart_mail_agent/spam/cascade.py
+# 模組用途：分層 spam 判定引擎（依成本：白名單 → 寄件者信譽 → 編譯規則 → ML 模型 → LLM）
+#   - 每層可「有把握就結束」（spam_at / ham_below），一般正常信在規則層就結束
+#   - 每層有時間預算；超時視為無結論，交給下一層
+#   - 所有層共用同一個 MessageView（寄件網域、正規化文字、可見文字只算一次）
+#   既有 SpamFilterOrchestrator / RuleBasedSpamFilter 皆為本模組的薄包裝
+
+LABEL_SPAM = "spam"
+LABEL_SUSPECT = "suspect"
+LABEL_LEGIT = "legit"
+
+# 模型 / LLM 只看可見文字的前 N 字
+DEFAULT_VIEW_CHARS = int(os.getenv("SMA_SPAM_VIEW_CHARS", "8000"))
+
+
+# ================= 共用訊息視圖 =================
+class MessageView:
+    """
+    一封信的唯讀視圖；衍生欄位第一次用到才計算，之後各層共用。
+    """
+
+    def __init__(
+        self,
+        sender: str = "",
+        subject: str = "",
+        content: str = "",
+        attachments: Optional[Sequence[Union[str, Dict[str, Any]]]] = None,
+        *,
+        view_chars: int = DEFAULT_VIEW_CHARS,
+    ) -> None:
+        self.sender = sender or ""
+        self.subject = subject or ""
+        self.content = content or ""
+        self.attachments = list(attachments or [])
+        self.view_chars = int(view_chars)
+
+    @classmethod
+    def from_email(cls, email: Dict[str, Any], **kw: Any) -> "MessageView":
+        sender, subject, content, attachments = rules._email_fields(email)
+        return cls(sender, subject, content, attachments, **kw)
+
+    def as_email(self) -> Dict[str, Any]:
+        return {"sender": self.sender, "subject": self.subject, "content": self.content, "attachments": self.attachments}
+
+    @cached_property
+    def sender_domain(self) -> str:
+        return sender_domain(self.sender)
+
+    @cached_property
+    def attachment_names(self) -> List[str]:
+        return rules._attachment_names(self.attachments)
+
+    @cached_property
+    def visible_text(self) -> str:
+        """HTML 去標籤後的可見文字（主旨 + 內文，最多 view_chars 字）。"""
+        body = scan_html(self.content, max_text_chars=self.view_chars, max_urls=0).text
+        return f"{self.subject}\n{body}"[: self.view_chars]
+
+    @cached_property
+    def normalized(self) -> str:
+        """NFKC + 小寫 的可見文字。"""
+        return normalize_text(self.visible_text)
+
+
+# ================= 層結果 =================
+@dataclass
+class StageResult:
+    """
+    單層輸出。score 為 0~1 的 spam 分數；None 代表此層無結論（不可用 / 超時 / 錯誤）。
+    final=True 代表此層有把握，後續層不再執行。
+    """
+
+    stage: str
+    score: Optional[float] = None
+    label: Optional[str] = None
+    final: bool = False
+    reasons: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    status: str = "ok"  # ok / skipped / timeout / error
+    detail: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class CascadeResult:
+    label: str
+    score: float
+    reasons: List[str]
+    stage: str
+    trace: List[StageResult]
+    elapsed_ms: float
+    detail: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def is_spam(self) -> bool:
+        return self.label == LABEL_SPAM
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = dict(self.detail)
+        out.update(
+            label=self.label,
+            score=float(self.score),
+            reasons=list(self.reasons),
+            stage=self.stage,
+            elapsed_ms=round(self.elapsed_ms, 3),
+        )
+        return out
+
+
+# ================= 各層 =================
+# 模型 / LLM 呼叫在這個共用執行緒池上跑，才能以 timeout 套用時間預算
+_POOL_LOCK = threading.Lock()
+_POOL: Dict[str, Optional[ThreadPoolExecutor]] = {"pool": None}
+
+
+def _pool() -> ThreadPoolExecutor:
+    with _POOL_LOCK:
+        if _POOL["pool"] is None:
+            workers = int(os.getenv("SMA_SPAM_CASCADE_THREADS", "4"))
+            _POOL["pool"] = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sma-spam")
+        return _POOL["pool"]  # type: ignore[return-value]
+
+
+class Stage:
+    """
+    層的基底類別。子類別實作 evaluate()；
+    blocking=True 的層（模型/LLM）在執行緒池上跑，超過 budget_ms 即放棄等待。
+    """
+
+    name = "stage"
+    blocking = False
+
+    def __init__(self, *, budget_ms: float = 0.0) -> None:
+        self.budget_ms = float(budget_ms)
+
+    def available(self) -> bool:
+        return True
+
+    def evaluate(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:  # pragma: no cover
+        raise NotImplementedError
+
+    def run(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:
+        if not self.available():
+            return StageResult(self.name, status="skipped")
+        t0 = time.perf_counter()
+        try:
+            if self.blocking and self.budget_ms > 0:
+                fut = _pool().submit(self.evaluate, view, cr)
+                try:
+                    res = fut.result(timeout=self.budget_ms / 1000.0)
+                except FutureTimeout:
+                    fut.cancel()
+                    logger.warning("[spam.cascade] %s 超過時間預算 %.0fms，改由下一層判定", self.name, self.budget_ms)
+                    res = StageResult(self.name, status="timeout")
+            else:
+                res = self.evaluate(view, cr)
+        except Exception as e:
+            logger.error("[spam.cascade] %s 判定失敗：%s", self.name, e)
+            res = StageResult(self.name, status="error", detail={"error": str(e)})
+        res.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        if self.budget_ms > 0 and res.elapsed_ms > self.budget_ms and res.status == "ok" and not self.blocking:
+            # 同步層無法中斷，只記錄超時；結果仍可用
+            logger.debug("[spam.cascade] %s 耗時 %.1fms 超過預算 %.0fms", self.name, res.elapsed_ms, self.budget_ms)
+        return res
+
+    def observe(self, view: MessageView, result: "CascadeResult") -> None:
+        """整封信判定完成後呼叫（預設不做事）；用來累積統計。"""
+
+
+def _threshold_stage(score: float, spam_at: float, ham_below: float, cr: "rules.CompiledRules") -> Tuple[str, bool]:
+    if score >= cr.score_spam:
+        label = LABEL_SPAM
+    elif score >= cr.score_suspect:
+        label = LABEL_SUSPECT
+    else:
+        label = LABEL_LEGIT
+    return label, (score >= spam_at or score < ham_below)
+
+
+class AllowlistStage(Stage):
+    """寄件網域在白名單（含大型名單）內：直接放行。"""
+
+    name = "allowlist"
+
+    def evaluate(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:
+        if view.sender_domain and cr.domains.is_allowed(view.sender_domain):
+            return StageResult(self.name, 0.0, LABEL_LEGIT, final=True, reasons=[rules._ALLOW_REASON])
+        return StageResult(self.name)
+
+
+class ReputationStage(Stage):
+    """
+    寄件者信譽層（ReputationStore.lookup，微秒級）：
+    - trusted：長期正常的寄件者 / 網域；標記 trusted，下一個內容層沒有硬規則命中
+      （封鎖網域、可疑 TLD、危險附件、高連結比例）就以 legit 結束，不再跑模型 / LLM
+    - burst / bad：新寄件者短時間大量來信、或一向寄 spam；不直接判定，
+      但標記 escalate，後續層不得以「確定正常」提早結束，最終為 legit 時升為 suspect
+    判定完成後由 observe() 把內容層（規則 / 模型 / LLM）有把握的 spam / legit 結論寫回信譽表；
+    suspect、升級過或沒有層有把握的結果不回寫，白名單與信譽本身的結論也不回寫，避免自我強化。
+    """
+
+    name = "reputation"
+    _SELF_STAGES = ("allowlist", "reputation", "none")
+
+    def __init__(self, store: Optional[ReputationStore] = None) -> None:
+        super().__init__()
+        self._store = store
+
+    @property
+    def store(self) -> ReputationStore:
+        if self._store is None:
+            self._store = default_store()
+        return self._store
+
+    def evaluate(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:
+        rep = self.store.lookup(view.sender) if view.sender else None
+        if rep is None or rep.verdict is None:
+            return StageResult(self.name)
+        detail = {"reputation": rep.verdict, "rep_key": rep.key}
+        if rep.verdict == REP_TRUSTED:
+            detail["trusted"] = True
+            return StageResult(self.name, 0.0, LABEL_LEGIT, reasons=["rep:trusted"], detail=detail)
+        detail["escalate"] = True
+        return StageResult(self.name, reasons=[f"rep:{rep.verdict}"], detail=detail)
+
+    def observe(self, view: MessageView, result: "CascadeResult") -> None:
+        if not view.sender or result.stage in self._SELF_STAGES:
+            return
+        if result.label not in (LABEL_SPAM, LABEL_LEGIT):
+            return
+        decided = next((r for r in reversed(result.trace) if r.stage == result.stage), None)
+        if decided is None or not decided.final:
+            return
+        self.store.record(view.sender, result.label == LABEL_SPAM)
+
+
+def _hard_rule(scores: Dict[str, float]) -> bool:
+    # 不看寄件者信譽的規則：封鎖網域 / 可疑 TLD / 危險附件 / 高連結比例（關鍵字不算）
+    return bool(
+        scores.get("url_suspicious")
+        or scores.get("tld_suspicious")
+        or scores.get("attachment_executable")
+        or scores.get("link_ratio", 0.0) >= rules._C_LINK_FLOOR
+    )
+
+
+class RulesStage(Stage):
+    """
+    編譯規則層（rules.label_email 的 dict 版，含判定快取）。
+    - 分數 >= spam_at（預設規則 spam 門檻）：確定 spam
+    - 分數 < ham_below：沒有任何像樣訊號，確定正常
+    budget_ms 會套用為分塊掃描的時間預算（超出時 reasons 記 scan:truncated）。
+    """
+
+    name = "rules"
+
+    def __init__(
+        self,
+        *,
+        spam_at: Optional[float] = None,
+        ham_below: float = 0.15,
+        fast: bool = False,
+        use_cache: bool = True,
+        budget_ms: float = 0.0,
+    ) -> None:
+        super().__init__(budget_ms=budget_ms)
+        self.spam_at = spam_at
+        self.ham_below = float(ham_below)
+        self.fast = bool(fast)
+        self.use_cache = bool(use_cache)
+        self._budgeted: Tuple[int, Optional["rules.CompiledRules"]] = (-1, None)
+
+    def _rules(self, cr: "rules.CompiledRules") -> "rules.CompiledRules":
+        if self.budget_ms <= 0 or (0 < cr.scan_max_ms <= self.budget_ms):
+            return cr
+        gen, snap = self._budgeted
+        if gen != cr.generation or snap is None:
+            snap = replace(cr, scan_max_ms=self.budget_ms)
+            self._budgeted = (cr.generation, snap)
+        return snap
+
+    def evaluate(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:
+        e = view.as_email()
+        e["sender"] = ""  # 白名單已由 AllowlistStage 判斷
+        out = rules._label_email_dict(e, self._rules(cr), self.use_cache, self.fast)
+        score = float(out["score"])
+        spam_at = cr.score_spam if self.spam_at is None else float(self.spam_at)
+        label, final = _threshold_stage(score, spam_at, self.ham_below, cr)
+        detail = {"scores": out["scores"], "points": out["points"], "hard_rule": _hard_rule(out["scores"])}
+        if "near_duplicate" in out:
+            detail["near_duplicate"] = out["near_duplicate"]
+        return StageResult(self.name, score, label, final=final, reasons=list(out["reasons"]), detail=detail)
+
+    def observe(self, view: MessageView, result: "CascadeResult") -> None:
+        # 模型 / LLM 的 spam、suspect 結論登錄到近似重複索引（SMA_SPAM_NEARDUP=1 時）：同一波活動的後續信件在規則層就結束
+        if self.use_cache and result.stage in ("model", "llm") and result.label != LABEL_LEGIT:
+            rules.record_near_duplicate(
+                view.subject,
+                view.content,
+                view.attachments,
+                label=result.label,
+                score=min(1.0, result.score),
+                source=result.stage,
+            )
+
+
+class ModelStage(Stage):
+    """
+    ML 模型層：predict(view) -> spam 機率（0~1）。
+    機率 >= spam_at 或 < ham_below 時結束；未提供 predict 時略過。
+    """
+
+    name = "model"
+    blocking = True
+
+    def __init__(
+        self,
+        predict: Optional[Callable[[MessageView], float]] = None,
+        *,
+        spam_at: float = 0.90,
+        ham_below: float = 0.10,
+        budget_ms: float = 200.0,
+    ) -> None:
+        super().__init__(budget_ms=budget_ms)
+        self.predict = predict
+        self.spam_at = float(spam_at)
+        self.ham_below = float(ham_below)
+
+    def available(self) -> bool:
+        return self.predict is not None
+
+    def evaluate(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:
+        p = float(self.predict(view))  # type: ignore[misc]
+        label, final = _threshold_stage(p, self.spam_at, self.ham_below, cr)
+        return StageResult(self.name, p, label, final=final, reasons=[f"model:{p:.2f}"])
+
+
+class LLMStage(Stage):
+    """
+    LLM 層（最後一層，結果即最終判定）：judge(view) -> True/False/None 或 0~1 分數。
+    未提供 judge 時，第一次使用才建立 SpamLLMFilter；建立失敗（無 openai / 無金鑰）則此層停用。
+    """
+
+    name = "llm"
+    blocking = True
+
+    def __init__(
+        self,
+        judge: Optional[Callable[[MessageView], Union[bool, float, None]]] = None,
+        *,
+        budget_ms: float = 8000.0,
+    ) -> None:
+        super().__init__(budget_ms=budget_ms)
+        self.judge = judge
+        self._disabled = False
+        self._lock = threading.Lock()
+
+    def _default_judge(self) -> Optional[Callable[[MessageView], Union[bool, float, None]]]:
+        with self._lock:
+            if self.judge is None and not self._disabled:
+                try:
+                    from .spam_llm_filter import SpamLLMFilter
+
+                    flt = SpamLLMFilter()
+                    self.judge = lambda v: flt.is_suspicious(v.subject, v.visible_text)
+                except Exception as e:
+                    logger.warning("[spam.cascade] LLM 層停用：%s", e)
+                    self._disabled = True
+            return self.judge
+
+    def available(self) -> bool:
+        return self._default_judge() is not None
+
+    def evaluate(self, view: MessageView, cr: "rules.CompiledRules") -> StageResult:
+        verdict = self.judge(view)  # type: ignore[misc]
+        if verdict is None:
+            return StageResult(self.name, status="error")
+        p = float(verdict) if not isinstance(verdict, bool) else (1.0 if verdict else 0.0)
+        label = LABEL_SPAM if p >= cr.score_spam else (LABEL_SUSPECT if p >= cr.score_suspect else LABEL_LEGIT)
+        return StageResult(self.name, p, label, final=True, reasons=[f"llm:{label}"])
+
+
+# ================= 引擎 =================
+class SpamCascade:
+    """
+    依序執行各層；任一層 final=True 即停止。
+    全部跑完都沒有把握時，採用最後一個有分數的層（越後面的層越精確）。
+    某層標記 escalate（detail）後，之後的層只能以 spam 提早結束，最終 legit 會升為 suspect。
+    stats() 回傳各層執行 / 結束 / 超時次數與累計耗時。
+    """
+
+    def __init__(self, stages: Optional[Sequence[Stage]] = None) -> None:
+        self.stages: Tuple[Stage, ...] = tuple(stages) if stages is not None else (AllowlistStage(), RulesStage())
+        self._stats: Dict[str, Dict[str, float]] = {
+            s.name: {"runs": 0, "exits": 0, "timeouts": 0, "ms": 0.0} for s in self.stages
+        }
+        self._stats_lock = threading.Lock()
+
+    def _count(self, res: StageResult) -> None:
+        with self._stats_lock:
+            st = self._stats.setdefault(res.stage, {"runs": 0, "exits": 0, "timeouts": 0, "ms": 0.0})
+            if res.status == "skipped":
+                return
+            st["runs"] += 1
+            st["ms"] += res.elapsed_ms
+            st["exits"] += int(res.final)
+            st["timeouts"] += int(res.status == "timeout")
+
+    def classify_view(self, view: MessageView) -> CascadeResult:
+        t0 = time.perf_counter()
+        cr = rules.compiled_rules()  # 整封信只取一次規則快照
+        trace: List[StageResult] = []
+        decided: Optional[StageResult] = None
+        trusted: Optional[StageResult] = None
+        escalated = False
+        for stage in self.stages:
+            res = stage.run(view, cr)
+            if escalated and res.final and res.label != LABEL_SPAM:
+                res.final = False
+            trace.append(res)
+            self._count(res)
+            escalated = escalated or bool(res.detail.get("escalate"))
+            if res.score is not None:
+                decided = res
+            if trusted is not None and res.score is not None:
+                # 可信寄件者：第一個有分數的內容層沒有硬規則命中就沿用信譽層的 legit
+                if not res.detail.get("hard_rule"):
+                    decided = trusted
+                break
+            if res.detail.get("trusted"):
+                trusted = res
+            if res.final:
+                break
+
+        reasons: List[str] = []
+        for r in trace:
+            reasons.extend(x for x in r.reasons if x not in reasons)
+        if decided is None:
+            decided = StageResult("none", 0.0, LABEL_LEGIT)
+        detail = dict(decided.detail)
+        label = decided.label or LABEL_LEGIT
+        if escalated and label == LABEL_LEGIT:
+            label = LABEL_SUSPECT
+        result = CascadeResult(
+            label=label,
+            score=float(decided.score or 0.0),
+            reasons=reasons,
+            stage=decided.stage,
+            trace=trace,
+            elapsed_ms=(time.perf_counter() - t0) * 1000.0,
+            detail=detail,
+        )
+        for stage in self.stages:
+            try:
+                stage.observe(view, result)
+            except Exception as e:
+                logger.debug("[spam.cascade] %s observe 失敗：%s", stage.name, e)
+        return result
+
+    def classify(
+        self,
+        subject: str = "",
+        content: str = "",
+        sender: str = "",
+        attachments: Optional[Sequence[Union[str, Dict[str, Any]]]] = None,
+    ) -> CascadeResult:
+        return self.classify_view(MessageView(sender, subject, content, attachments))
+
+    def classify_email(self, email: Dict[str, Any]) -> CascadeResult:
+        return self.classify_view(MessageView.from_email(email))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._stats_lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+
+def _env_on(name: str) -> bool:
+    return (os.getenv(name) or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+_DEFAULT: Dict[str, Optional[SpamCascade]] = {"cascade": None}
+_DEFAULT_LOCK = threading.Lock()
+
+
+def build_cascade(
+    *,
+    model: Optional[Callable[[MessageView], float]] = None,
+    llm: Union[bool, Callable[[MessageView], Union[bool, float, None]], None] = None,
+    rules_budget_ms: float = 0.0,
+    model_budget_ms: float = 200.0,
+    llm_budget_ms: float = 8000.0,
+    reputation: Union[bool, ReputationStore, None] = None,
+) -> SpamCascade:
+    """
+    組出標準順序的引擎；llm=True 表示使用預設 SpamLLMFilter，
+    reputation=True 使用行程內共用信譽表（也可直接傳入 ReputationStore）。
+    """
+    stages: List[Stage] = [AllowlistStage()]
+    if reputation:
+        stages.append(ReputationStage(None if reputation is True else reputation))  # type: ignore[arg-type]
+    stages.append(RulesStage(budget_ms=rules_budget_ms))
+    if model is not None:
+        stages.append(ModelStage(model, budget_ms=model_budget_ms))
+    if llm:
+        stages.append(LLMStage(None if llm is True else llm, budget_ms=llm_budget_ms))  # type: ignore[arg-type]
+    return SpamCascade(stages)
+
+
+def _default_model() -> Optional[Callable[[MessageView], float]]:
+    # 有訓練好的 n-gram 模型（SMA_SPAM_MODEL_PATH）且裝了 numpy 才加入模型層
+    try:
+        from .ml_spam_classifier import cascade_predictor
+
+        return cascade_predictor()
+    except Exception as e:
+        logger.debug("[spam.cascade] 未啟用模型層：%s", e)
+        return None
+
+
+def default_cascade() -> SpamCascade:
+    """
+    行程內共用引擎：白名單 → 寄件者信譽 → 規則 →（有模型檔時）n-gram 模型 →（SMA_SPAM_CASCADE_LLM=1 時）LLM。
+    信譽層預設關閉，SMA_SPAM_REPUTATION=1 啟用。
+    """
+    with _DEFAULT_LOCK:
+        if _DEFAULT["cascade"] is None:
+            _DEFAULT["cascade"] = build_cascade(
+                model=_default_model(),
+                llm=_env_on("SMA_SPAM_CASCADE_LLM"),
+                reputation=_env_on("SMA_SPAM_REPUTATION"),
+                rules_budget_ms=float(os.getenv("SMA_SPAM_RULES_BUDGET_MS", "0")),
+            )
+        return _DEFAULT["cascade"]  # type: ignore[return-value]
+
+
+def set_default_cascade(cascade: Optional[SpamCascade]) -> None:
+    """替換（或以 None 重設）行程內共用引擎。"""
+    with _DEFAULT_LOCK:
+        _DEFAULT["cascade"] = cascade
+
+
+def classify(
+    subject: str = "",
+    content: str = "",
+    sender: str = "",
+    attachments: Optional[Sequence[Union[str, Dict[str, Any]]]] = None,
+) -> CascadeResult:
+    return default_cascade().classify(subject, content, sender, attachments)
+
+
+def score_spam(subject: str, content: str, sender: str = "") -> Dict[str, Any]:
+    """相容 API：{"score": 0~1, "reasons": [...]}。"""
+    res = classify(subject, content, sender)
+    return {"score": res.score, "reasons": res.reasons}
+
+
+__all__ = [
+    "MessageView",
+    "StageResult",
+    "CascadeResult",
+    "Stage",
+    "AllowlistStage",
+    "ReputationStage",
+    "RulesStage",
+    "ModelStage",
+    "LLMStage",
+    "SpamCascade",
+    "build_cascade",
+    "default_cascade",
+    "set_default_cascade",
+    "classify",
+    "score_spam",
+]
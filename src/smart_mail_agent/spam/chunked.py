@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable, Iterator, Optional, Pattern, Sequence
+
+# 檔案位置：src/smart_mail_agent/spam/chunked.py
+# 模組用途：大型信件的分塊掃描工具
+#   - TextSource：主旨 + "\n" + 內文 的分塊視圖（不建立整份副本），並套用掃描預算
+#   - stream_finditer：regex 在分塊上的 finditer，以重疊視窗保留跨塊命中
+
+DEFAULT_CHUNK_CHARS = 64 * 1024
+
+
+class TextSource:
+    """
+    把數段文字（預設主旨、"\\n"、內文）當成一段連續文字分塊讀取。
+    - chunk_chars：每塊字元數
+    - max_bytes：每次走訪最多處理的 UTF-8 位元組數（0 = 不限）
+    - max_ms：整封信的掃描時間預算（0 = 不限；多個階段共用同一個期限）
+    超出預算時停止產出並設 truncated=True。
+    """
+
+    def __init__(
+        self,
+        parts: Sequence[str],
+        *,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        max_bytes: int = 0,
+        max_ms: float = 0.0,
+    ) -> None:
+        self.parts = tuple(p or "" for p in parts)
+        self.chunk_chars = max(1, int(chunk_chars))
+        self.max_bytes = max(0, int(max_bytes))
+        self.deadline: Optional[float] = time.monotonic() + max_ms / 1000.0 if max_ms and max_ms > 0 else None
+        self.truncated = False
+
+    @classmethod
+    def for_email(cls, subject: str, content: str, **kw) -> "TextSource":
+        return cls((subject or "", "\n", content or ""), **kw)
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self.parts)
+
+    def chunks(self) -> Iterator[str]:
+        size, used = self.chunk_chars, 0
+        for part in self.parts:
+            for i in range(0, len(part), size):
+                if self.deadline is not None and time.monotonic() > self.deadline:
+                    self.truncated = True
+                    return
+                c = part[i : i + size]
+                if self.max_bytes:
+                    used += len(c.encode("utf-8", "surrogatepass"))
+                    if used > self.max_bytes:
+                        self.truncated = True
+                        return
+                yield c
+
+
+def stream_finditer(rx: Pattern[str], chunks: Iterable[str], window: int) -> Iterator[str]:
+    """
+    在分塊文字上做 rx.finditer，結果與對整段文字 finditer 相同（前提：單一命中長度 < window）。
+    - 碰到緩衝區尾端的命中可能還會變長：延到下一塊再判斷
+    - 只在「起點之後已有 window 個字元」時才確定命中，其餘與下一塊重疊重掃
+    - 保留 1 個前導字元給 lookbehind
+    """
+    buf = ""
+    pos = 0
+    it = iter(chunks)
+    nxt: Optional[str] = next(it, None)
+    while nxt is not None:
+        buf += nxt
+        nxt = next(it, None)
+        if nxt is None:
+            for m in rx.finditer(buf, pos):
+                yield m.group(0)
+            return
+        safe = len(buf) - window
+        resume = max(pos, safe)
+        for m in rx.finditer(buf, pos):
+            if m.start() >= safe or m.end() >= len(buf):
+                resume = min(m.start(), resume)
+                break
+            yield m.group(0)
+            resume = max(m.end(), safe)
+        cut = max(0, resume - 1)
+        buf = buf[cut:]
+        pos = resume - cut
+
+
+__all__ = ["TextSource", "stream_finditer", "DEFAULT_CHUNK_CHARS"]
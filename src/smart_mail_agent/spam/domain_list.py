@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# 檔案位置：src/smart_mail_agent/spam/domain_list.py
+# 模組用途：寄件者/網域名單引擎（block + allow）
+#   - DomainTrie：label 反轉 trie（"bit.ly" 存成 ly → bit），查詢 O(labels)
+#   - 編譯檔：開放定址雜湊表，mmap 後直接查詢，數十萬筆也不需載入記憶體
+#   - 比對以 label 為界："bit.ly" 命中 "bit.ly"、"x.bit.ly"，不命中 "notbit.ly"
+
+PathLike = Union[str, Path]
+
+_MAGIC = b"SMADL\x00\x01\x00"
+_HEADER = struct.Struct("<8sII")  # magic, n_entries, n_slots
+_SLOT = struct.Struct("<I")
+_LEN = struct.Struct("<H")
+_END = ""  # trie 終點標記（正規化後的 label 不可能為空字串）
+
+_RE_ADDR_DOMAIN = re.compile(r"@([^@\s>]+)>?\s*$")
+
+
+def normalize_domain(domain: str) -> str:
+    """小寫、去掉萬用字元前綴/前後的點、port 與 email 的 local part。"""
+    d = (domain or "").strip().lower()
+    if "@" in d:
+        d = d.rsplit("@", 1)[1]
+    d = d.split("/", 1)[0].split(":", 1)[0].rstrip(">").strip()
+    if d.startswith("*."):
+        d = d[2:]
+    return d.strip(".")
+
+
+def sender_domain(sender: str) -> str:
+    """由 "Name <user@host>" 或 "user@host" 取出網域；取不到回傳空字串。"""
+    m = _RE_ADDR_DOMAIN.search(sender or "")
+    return normalize_domain(m.group(1)) if m else ""
+
+
+def _suffixes(domain: str) -> Iterator[str]:
+    """"a.b.c" → "c", "b.c", "a.b.c"（由最上層開始）。"""
+    labels = domain.split(".")
+    for i in range(len(labels) - 1, -1, -1):
+        yield ".".join(labels[i:])
+
+
+class DomainTrie:
+    """label 反轉 trie；match() 回傳命中的名單項目（最上層者）。"""
+
+    def __init__(self, domains: Iterable[str] = ()) -> None:
+        self._root: Dict[str, dict] = {}
+        self._n = 0
+        for d in domains:
+            self.add(d)
+
+    def add(self, domain: str) -> None:
+        d = normalize_domain(domain)
+        if not d:
+            return
+        node = self._root
+        for label in reversed(d.split(".")):
+            node = node.setdefault(label, {})
+        if _END not in node:
+            node[_END] = d
+            self._n += 1
+
+    def match(self, domain: str) -> Optional[str]:
+        node = self._root
+        for label in reversed(normalize_domain(domain).split(".")):
+            node = node.get(label)  # type: ignore[assignment]
+            if node is None:
+                return None
+            hit = node.get(_END)
+            if hit is not None:
+                return hit  # type: ignore[return-value]
+        return None
+
+    def __contains__(self, domain: object) -> bool:
+        return isinstance(domain, str) and self.match(domain) is not None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self) -> Iterator[str]:
+        stack: List[dict] = [self._root]
+        while stack:
+            node = stack.pop()
+            for k, v in node.items():
+                if k == _END:
+                    yield v  # type: ignore[misc]
+                else:
+                    stack.append(v)
+
+
+# ================= 編譯檔（mmap） =================
+def compile_domain_list(domains: Iterable[str], path: PathLike) -> int:
+    """
+    將名單寫成可 mmap 的編譯檔（原子替換），回傳筆數。
+    版面：header | slots[n_slots] (u32，0=空，否則 blob 位移+1) | blob（u16 長度 + UTF-8）
+    """
+    uniq = sorted({d for d in (normalize_domain(x) for x in domains) if d})
+    n_slots = 8
+    while n_slots < len(uniq) * 2:
+        n_slots <<= 1
+    mask = n_slots - 1
+    slots = [0] * n_slots
+    blob = bytearray()
+    for d in uniq:
+        raw = d.encode("utf-8")
+        i = zlib.crc32(raw) & mask
+        while slots[i]:
+            i = (i + 1) & mask
+        slots[i] = len(blob) + 1
+        blob += _LEN.pack(len(raw)) + raw
+
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(p.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(uniq), n_slots))
+        f.write(struct.pack(f"<{n_slots}I", *slots))
+        f.write(blob)
+    os.replace(tmp, p)
+    return len(uniq)
+
+
+class MappedDomainList:
+    """mmap 編譯檔的唯讀名單；每個 label 一次雜湊探查，與名單大小無關。"""
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._n, self._n_slots = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or self._n_slots & (self._n_slots - 1):
+            self._mm.close()
+            raise ValueError(f"[MappedDomainList] 非編譯名單檔：{self.path}")
+        self._slots_off = _HEADER.size
+        self._blob_off = self._slots_off + self._n_slots * _SLOT.size
+
+    def _contains_exact(self, raw: bytes) -> bool:
+        mm, mask = self._mm, self._n_slots - 1
+        i = zlib.crc32(raw) & mask
+        while True:
+            (ref,) = _SLOT.unpack_from(mm, self._slots_off + i * _SLOT.size)
+            if not ref:
+                return False
+            off = self._blob_off + ref - 1
+            (ln,) = _LEN.unpack_from(mm, off)
+            if ln == len(raw) and mm[off + _LEN.size : off + _LEN.size + ln] == raw:
+                return True
+            i = (i + 1) & mask
+
+    def match(self, domain: str) -> Optional[str]:
+        d = normalize_domain(domain)
+        if not d or not self._n:
+            return None
+        for suffix in _suffixes(d):
+            if self._contains_exact(suffix.encode("utf-8")):
+                return suffix
+        return None
+
+    def __contains__(self, domain: object) -> bool:
+        return isinstance(domain, str) and self.match(domain) is not None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+DomainMatcher = Union[DomainTrie, MappedDomainList]
+
+
+def load_domain_list(path: PathLike) -> DomainMatcher:
+    """編譯檔 → MappedDomainList；一般文字檔（每行一筆、# 註解）→ DomainTrie。"""
+    p = Path(path)
+    with open(p, "rb") as f:
+        head = f.read(len(_MAGIC))
+    if head == _MAGIC:
+        return MappedDomainList(p)
+    lines = p.read_text(encoding="utf-8").splitlines()
+    return DomainTrie(ln.split("#", 1)[0].strip() for ln in lines)
+
+
+# ================= 引擎 =================
+class DomainListEngine:
+    """allow/block 兩份名單（各可由多個 trie/編譯檔組成）；allow 優先。"""
+
+    def __init__(self, allow: Sequence[DomainMatcher] = (), block: Sequence[DomainMatcher] = ()) -> None:
+        self.allow: Tuple[DomainMatcher, ...] = tuple(allow)
+        self.block: Tuple[DomainMatcher, ...] = tuple(block)
+
+    @classmethod
+    def from_lists(
+        cls,
+        allow: Iterable[str] = (),
+        block: Iterable[str] = (),
+        *,
+        allow_files: Iterable[PathLike] = (),
+        block_files: Iterable[PathLike] = (),
+    ) -> "DomainListEngine":
+        return cls(
+            allow=[DomainTrie(allow), *(load_domain_list(p) for p in allow_files)],
+            block=[DomainTrie(block), *(load_domain_list(p) for p in block_files)],
+        )
+
+    @staticmethod
+    def _first(matchers: Sequence[DomainMatcher], domain: str) -> Optional[str]:
+        for m in matchers:
+            hit = m.match(domain)
+            if hit is not None:
+                return hit
+        return None
+
+    def allowed(self, domain: str) -> Optional[str]:
+        return self._first(self.allow, domain) if domain else None
+
+    def blocked(self, domain: str) -> Optional[str]:
+        return self._first(self.block, domain) if domain else None
+
+    def is_allowed(self, domain: str) -> bool:
+        return self.allowed(domain) is not None
+
+    def sender_allowed(self, sender: str) -> bool:
+        return self.is_allowed(sender_domain(sender))
+
+    def check(self, domain: str) -> Optional[str]:
+        """回傳 "allow" / "block" / None。"""
+        if self.allowed(domain) is not None:
+            return "allow"
+        if self.blocked(domain) is not None:
+            return "block"
+        return None
+
+
+__all__ = [
+    "DomainTrie",
+    "MappedDomainList",
+    "DomainListEngine",
+    "compile_domain_list",
+    "load_domain_list",
+    "normalize_domain",
+    "sender_domain",
+]
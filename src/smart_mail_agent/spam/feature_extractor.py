@@ -1,15 +1,173 @@
 #!/usr/bin/env python3
 # 檔案位置：src/smart_mail_agent/spam/feature_extractor.py
-# 模組用途：相容 shim，如有正式實作則轉接；否則提供最小介面
+# 模組用途：spam 模型特徵：字元 n-gram 特徵雜湊（中英混合適用，不需斷詞）
+#   - prepare_text：主旨 + 內文（去 HTML 標籤）+ 附件檔名，NFKC/小寫/空白壓縮並截斷
+#   - hash_batch：一批文字一次向量化算出所有 n-gram 雜湊（NumPy），回傳 COO 稀疏矩陣
+#   - extract_features：相容介面（長度欄位 + 模型用的 text）
 from __future__ import annotations
 
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+
 try:
-    from ..feature_extractor import *  # type: ignore  # noqa: F401,F403
-except Exception:
-
-    def extract_features(subject: str, content: str, sender: str | None = None) -> dict:
-        return {
-            "len_subject": len(subject or ""),
-            "len_content": len(content or ""),
-            "has_sender": bool(sender),
-        }
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover - 未安裝 ml extra
+    np = None  # type: ignore
+
+DEFAULT_N_FEATURES = 1 << 18
+DEFAULT_NGRAM_RANGE: Tuple[int, int] = (2, 4)
+DEFAULT_MAX_CHARS = 1500
+
+_RE_TAG = re.compile(r"<[^>]{0,512}>")
+_RE_WS = re.compile(r"[\s\x00]+")
+
+# 32-bit FNV-1a 常數與 murmur3 fmix32 常數
+_FNV_OFFSET = 0x811C9DC5
+_FNV_PRIME = 0x01000193
+_MIX1 = 0x85EBCA6B
+_MIX2 = 0xC2B2AE35
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("spam 模型需要 numpy（pip install smart-mail-agent[ml]）")
+
+
+def prepare_text(
+    subject: str,
+    content: str,
+    attachments: Optional[Iterable[Any]] = None,
+    *,
+    max_chars: int = DEFAULT_MAX_CHARS,
+) -> str:
+    """模型輸入文字：主旨、去標籤內文、附件檔名，正規化後截斷到 max_chars。"""
+    names = [a if isinstance(a, str) else (a or {}).get("filename") or "" for a in attachments or []]
+    # 先粗截再正規化：超大內文不必整份做 NFKC
+    body = _RE_TAG.sub(" ", (content or "")[: max_chars * 2])
+    raw = f"{subject or ''} \n {body} \n {' '.join(names)}"
+    text = _RE_WS.sub(" ", unicodedata.normalize("NFKC", raw).lower()).strip()
+    return text[:max_chars]
+
+
+@dataclass
+class HashedBatch:
+    """
+    COO 稀疏矩陣（同一格可重複出現，相加即為值）：
+      rows/cols/vals 等長；值 = ±1（雜湊符號）/ sqrt(該列 n-gram 數)，跨文字邊界的項目值為 0
+    """
+
+    rows: Any
+    cols: Any
+    vals: Any
+    n_rows: int
+    n_features: int
+
+
+def _fmix32(h: Any) -> Any:
+    h = h ^ (h >> np.uint32(16))
+    h *= np.uint32(_MIX1)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(_MIX2)
+    h ^= h >> np.uint32(16)
+    return h
+
+
+def hash_batch(
+    texts: Sequence[str],
+    *,
+    n_features: int = DEFAULT_N_FEATURES,
+    ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+) -> HashedBatch:
+    """
+    把已 prepare_text 的文字整批轉成雜湊特徵。
+    所有文字以 \\x00 串接成一個碼位陣列，每多一個字元只多一次向量化運算，跨越分隔字元的 n-gram 丟棄。
+    n_features 須為 2 的次方。
+    """
+    _require_numpy()
+    if n_features & (n_features - 1):
+        raise ValueError("n_features 必須是 2 的次方")
+    n_rows = len(texts)
+    empty = np.empty(0, dtype=np.int64)
+    if not n_rows:
+        return HashedBatch(empty, empty, np.empty(0, dtype=np.float32), 0, n_features)
+
+    joined = "\x00".join(t.replace("\x00", " ") for t in texts)
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    total = len(codes)
+    # row：位置 i 所屬的文字編號；dist：到下一個分隔字元（或結尾）的距離，n-gram 需 dist >= n
+    is_sep = codes == 0
+    row_of = np.cumsum(is_sep, dtype=np.intp) - is_sep
+    seps = np.append(np.flatnonzero(is_sep), total)
+    dist = seps[row_of] - np.arange(total)
+    mask = np.uint32(n_features - 1)
+
+    rows_l, cols_l, sign_l = [], [], []
+    lo, hi = ngram_range
+    # FNV-1a 可逐字延伸：長度 n 的雜湊由長度 n-1 的雜湊再併入一個字元
+    h = np.full(total, _FNV_OFFSET, dtype=np.uint32)
+    prime = np.uint32(_FNV_PRIME)
+    for n in range(1, hi + 1):
+        span = total - n + 1
+        if span <= 0:
+            break
+        h = h[:span]
+        h ^= codes[n - 1 : n - 1 + span]
+        h *= prime
+        if n < lo:
+            continue
+        m = _fmix32(h)
+        # 跨越分隔字元的 n-gram 不刪除（省去 gather），改以權重 0 表示
+        sign = (m >> np.uint32(31)).astype(np.float32)
+        sign *= -2.0
+        sign += 1.0
+        sign *= dist[:span] >= n
+        m &= mask
+        rows_l.append(row_of[:span])
+        cols_l.append(m)
+        sign_l.append(sign)
+    if not rows_l:
+        return HashedBatch(empty, empty, np.empty(0, dtype=np.float32), n_rows, n_features)
+
+    rows = np.concatenate(rows_l)
+    cols = np.concatenate(cols_l).astype(np.intp)
+    vals = np.concatenate(sign_l)
+    # 長度正規化：每列除以 sqrt(有效 n-gram 數)，長短信件分數可比
+    counts = np.bincount(rows, weights=np.abs(vals), minlength=n_rows)
+    vals *= (1.0 / np.sqrt(np.maximum(counts, 1.0))).astype(np.float32)[rows]
+    return HashedBatch(rows, cols, vals, n_rows, n_features)
+
+
+EmailLike = Union[str, Dict[str, Any], Tuple[str, str]]
+
+
+def email_text(item: EmailLike, *, max_chars: int = DEFAULT_MAX_CHARS) -> str:
+    """str（視為內文）/ (subject, content) / email dict → prepare_text 結果。"""
+    if isinstance(item, str):
+        return prepare_text("", item, max_chars=max_chars)
+    if isinstance(item, tuple):
+        return prepare_text(item[0], item[1], max_chars=max_chars)
+    content = item.get("content") or item.get("body") or item.get("text") or ""
+    return prepare_text(item.get("subject") or "", content, item.get("attachments"), max_chars=max_chars)
+
+
+def extract_features(subject: str, content: str, sender: str | None = None) -> dict:
+    return {
+        "len_subject": len(subject or ""),
+        "len_content": len(content or ""),
+        "has_sender": bool(sender),
+        "text": prepare_text(subject, content),
+    }
+
+
+__all__ = [
+    "DEFAULT_N_FEATURES",
+    "DEFAULT_NGRAM_RANGE",
+    "DEFAULT_MAX_CHARS",
+    "HashedBatch",
+    "prepare_text",
+    "hash_batch",
+    "email_text",
+    "extract_features",
+]
@@ -3,31 +3,48 @@ from __future__ import annotations
 import re
 from typing import Dict, List, Tuple
 
+from .cascade import SpamCascade, default_cascade, score_spam
+
+# 檔案位置：src/smart_mail_agent/spam/filter.py
+# 模組用途：相容包裝；score() 回傳 (分數, 結果) 的舊介面
+# 原本的關鍵字 0.4 / 連結 0.4 / 金額 0.2 權重仍保留，與 spam.cascade 取較高分（cascade 只會讓判定更嚴）
+
 _URL = re.compile(r"(https?://|tinyurl\.|bit\.ly|t\.co)", re.I)
 _MONEY = re.compile(r"\b(\$|\d{1,3}(?:,\d{3})+)\b")
 _SPAM_WORDS = ("free", "bonus", "viagra", "限時", "免費")
 
 
+def _legacy_score(subject: str, content: str) -> Tuple[float, List[str]]:
+    text = f"{subject or ''} {content or ''}"
+    reasons: List[str] = []
+    s = text.lower()
+    score = 0.0
+    if any(w in s for w in _SPAM_WORDS):
+        score += 0.4
+        reasons.append("keyword")
+    if _URL.search(text):
+        score += 0.4
+        reasons.append("shortlink/url")
+    if _MONEY.search(text):
+        score += 0.2
+        reasons.append("money")
+    return score, reasons
+
+
 class SpamFilterOrchestrator:
-    def __init__(self, threshold: float = 0.5, explain: bool = False):
+    def __init__(self, threshold: float = 0.5, explain: bool = False, cascade: SpamCascade | None = None):
         self.threshold = float(threshold)
         self.explain = bool(explain)
+        self._cascade = cascade
 
     def score(self, subject: str, content: str, sender: str) -> Tuple[float, Dict]:
-        text = f"{subject or ''} {content or ''}"
-        reasons: List[str] = []
-        s = text.lower()
-        score = 0.0
-        if any(w in s for w in _SPAM_WORDS):
-            score += 0.4
-            reasons.append("keyword")
-        if _URL.search(text):
-            score += 0.4
-            reasons.append("shortlink/url")
-        if _MONEY.search(text):
-            score += 0.2
-            reasons.append("money")
-        result = {"is_spam": score >= self.threshold}
+        legacy, reasons = _legacy_score(subject, content)
+        res = (self._cascade or default_cascade()).classify(subject, content, sender)
+        score = max(legacy, res.score)
+        result: Dict = {"is_spam": score >= self.threshold}
         if self.explain:
-            result["reasons"] = reasons
+            result["reasons"] = reasons + [r for r in res.reasons if r not in reasons]
         return score, result
+
+
+__all__ = ["SpamFilterOrchestrator", "score_spam"]
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import List, Optional, Sequence, Tuple
+
+# 檔案位置：src/smart_mail_agent/spam/html_scan.py
+# 模組用途：單次掃描 HTML（或純文字），同時取得可見文字長度、連結文字長度、URL 清單
+#           與隱藏內容統計；線性時間、記憶體有上限，結果可供其他階段重用純文字
+#           （HTMLParser 遇到未結束的 <!--、<script、屬性引號會一直緩衝後續輸入，因此 feed 的總量也有上限）
+
+# 與 rules.extract_urls 相同的 URL 樣式
+RE_URL = re.compile(r"(https?://|www\.)[^\s<>\)\"']{1,256}", re.IGNORECASE)
+_RE_WS = re.compile(r"\s+", re.UNICODE)
+_RE_HIDDEN_WORD = re.compile(r"\bhidden\b", re.IGNORECASE)
+_RE_HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+
+# 沒有結束標籤的元素：不可能包住隱藏子樹
+_VOID_TAGS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+)
+# 內容不會顯示給收件者的元素，視同隱藏
+_INVISIBLE_TAGS = frozenset({"script", "style", "template", "head", "title"})
+
+DEFAULT_MAX_TEXT_CHARS = 200_000
+DEFAULT_MAX_URLS = 1_000
+DEFAULT_MAX_INPUT_CHARS = 1_000_000
+
+
+@dataclass
+class HtmlScan:
+    """單次掃描結果（長度皆為去除空白後的字元數）。"""
+
+    visible_chars: int = 0
+    anchor_chars: int = 0
+    url_count: int = 0
+    urls: List[str] = field(default_factory=list)
+    hidden_elements: int = 0
+    hidden_chars: int = 0
+    text: str = ""
+    text_truncated: bool = False
+    input_truncated: bool = False
+
+
+def _is_hidden(attrs: Sequence[Tuple[str, Optional[str]]]) -> bool:
+    for name, value in attrs:
+        if name == "hidden":
+            return True
+        if value and (_RE_HIDDEN_WORD.search(value) or (name == "style" and _RE_HIDDEN_STYLE.search(value))):
+            return True
+    return False
+
+
+class HtmlScanner(HTMLParser):
+    """
+    增量式 tokenizer：可多次 feed()，close() 後以 result() 取得 HtmlScan。
+    - 隱藏子樹（hidden 屬性、display:none、visibility:hidden）以同名標籤深度追蹤，正確處理巢狀
+    - 只有具 href 的 <a> 內文字算作連結文字
+    - URL 取自可見文字與非隱藏元素的屬性值
+    - feed() 累計超過 max_input_chars 的部分直接丟棄（input_truncated），parser 緩衝區不會無限成長
+    """
+
+    def __init__(
+        self,
+        *,
+        keep_text: bool = True,
+        max_text_chars: int = DEFAULT_MAX_TEXT_CHARS,
+        max_urls: int = DEFAULT_MAX_URLS,
+        max_input_chars: int = DEFAULT_MAX_INPUT_CHARS,
+    ) -> None:
+        super().__init__(convert_charrefs=True)
+        self._scan = HtmlScan()
+        self._keep_text = bool(keep_text)
+        self._max_text = max(0, int(max_text_chars))
+        self._max_urls = max(0, int(max_urls))
+        self._max_input = max(0, int(max_input_chars))
+        self._fed = 0
+        self._text_parts: List[str] = []
+        self._text_len = 0
+        self._hidden_tag: Optional[str] = None
+        self._hidden_depth = 0
+        self._anchor = False
+
+    # ---------- 內部 ----------
+    def _add_urls(self, s: str) -> None:
+        sc = self._scan
+        for m in RE_URL.finditer(s):
+            sc.url_count += 1
+            if len(sc.urls) < self._max_urls:
+                sc.urls.append(m.group(0))
+
+    def _add_text(self, data: str) -> None:
+        room = self._max_text - self._text_len
+        if room <= 0:
+            self._scan.text_truncated = True
+            return
+        piece = data if len(data) <= room else data[:room]
+        if len(piece) < len(data):
+            self._scan.text_truncated = True
+        self._text_parts.append(piece)
+        self._text_len += len(piece)
+
+    def feed(self, data: str) -> None:
+        room = self._max_input - self._fed
+        if len(data) > room:
+            self._scan.input_truncated = True
+            data = data[: max(0, room)]
+        if data:
+            self._fed += len(data)
+            super().feed(data)
+
+    # ---------- HTMLParser 回呼 ----------
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self._hidden_tag is not None:
+            if tag == self._hidden_tag:
+                self._hidden_depth += 1
+            return
+        if _is_hidden(attrs) or tag in _INVISIBLE_TAGS:
+            self._scan.hidden_elements += 1
+            if tag not in _VOID_TAGS:
+                self._hidden_tag = tag
+                self._hidden_depth = 1
+            return
+        for name, value in attrs:
+            if value:
+                self._add_urls(value)
+        if tag == "a" and any(name == "href" for name, _ in attrs):
+            self._anchor = True
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        # <br/>、<img .../>：不開啟子樹
+        if self._hidden_tag is not None:
+            return
+        if _is_hidden(attrs):
+            self._scan.hidden_elements += 1
+            return
+        for _name, value in attrs:
+            if value:
+                self._add_urls(value)
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._hidden_tag is not None:
+            if tag == self._hidden_tag:
+                self._hidden_depth -= 1
+                if self._hidden_depth <= 0:
+                    self._hidden_tag = None
+                    self._hidden_depth = 0
+            return
+        if tag == "a":
+            self._anchor = False
+
+    def handle_data(self, data: str) -> None:
+        n = len(_RE_WS.sub("", data))
+        if self._hidden_tag is not None:
+            self._scan.hidden_chars += n
+            return
+        self._scan.visible_chars += n
+        if self._anchor:
+            self._scan.anchor_chars += n
+        self._add_urls(data)
+        if self._keep_text and n:
+            self._add_text(data)
+
+    # ---------- 結果 ----------
+    def result(self) -> HtmlScan:
+        sc = self._scan
+        if self._keep_text:
+            sc.text = "".join(self._text_parts)
+        return sc
+
+
+def scan_html(
+    html_or_text: str,
+    *,
+    keep_text: bool = True,
+    max_text_chars: int = DEFAULT_MAX_TEXT_CHARS,
+    max_urls: int = DEFAULT_MAX_URLS,
+    max_input_chars: int = DEFAULT_MAX_INPUT_CHARS,
+) -> HtmlScan:
+    """一次走訪 HTML/純文字，回傳 HtmlScan（只看前 max_input_chars 個字元）。"""
+    p = HtmlScanner(
+        keep_text=keep_text, max_text_chars=max_text_chars, max_urls=max_urls, max_input_chars=max_input_chars
+    )
+    p.feed(html_or_text or "")
+    p.close()
+    return p.result()
+
+
+__all__ = ["HtmlScan", "HtmlScanner", "scan_html", "RE_URL"]
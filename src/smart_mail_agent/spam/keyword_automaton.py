@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+# 檔案位置：src/smart_mail_agent/spam/keyword_automaton.py
+# 模組用途：多關鍵字 Aho-Corasick 自動機，一次掃描文字取得所有命中與權重
+#           （每個規則世代編譯一次；每封信成本與關鍵字數量無關）
+
+KeywordSource = Union[Mapping[str, Any], Iterable[str]]
+
+_ASCII_WORD = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+
+def normalize_text(s: str) -> str:
+    """NFKC + 小寫；關鍵字與待掃描文字共用同一套正規化。"""
+    return unicodedata.normalize("NFKC", s or "").lower()
+
+
+def _is_ascii_word(w: str) -> bool:
+    return bool(w) and all(ch in _ASCII_WORD for ch in w)
+
+
+def _weight_of(v: Any) -> float:
+    # YAML 內 keywords 可能是 {詞: 權重} 或其他型別（list/None）；非數值一律視為 1
+    if isinstance(v, bool):
+        return 1.0
+    if isinstance(v, (int, float)):
+        return float(v)
+    return 1.0
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick 多模式比對器。
+    - 關鍵字與文字皆以 NFKC/小寫 比對
+    - match_word_boundary=True 時，純 ASCII 單字需落在 ASCII 字界（前後不是 [A-Za-z0-9_]），
+      避免 "price" 命中 "pricelist"；CJK 詞不受影響
+    """
+
+    __slots__ = ("_goto", "_fail", "_out", "_words", "_weights", "_bounded", "_maxlen", "match_word_boundary")
+
+    def __init__(self, keywords: Optional[KeywordSource] = None, *, match_word_boundary: bool = False) -> None:
+        self.match_word_boundary = bool(match_word_boundary)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._words: List[str] = []
+        self._weights: List[float] = []
+        self._bounded: List[bool] = []
+
+        items: Iterable[Tuple[Any, Any]]
+        if keywords is None:
+            items = ()
+        elif isinstance(keywords, Mapping):
+            items = keywords.items()
+        else:
+            items = ((k, 1) for k in keywords)
+
+        index: Dict[str, int] = {}
+        for k, v in items:
+            w = normalize_text(str(k)).strip()
+            if not w:
+                continue
+            weight = _weight_of(v)
+            if w in index:
+                # "FREE" 與 "free" 正規化後相同：保留較大的權重
+                i = index[w]
+                self._weights[i] = max(self._weights[i], weight)
+                continue
+            index[w] = len(self._words)
+            self._words.append(w)
+            self._weights.append(weight)
+            self._bounded.append(self.match_word_boundary and _is_ascii_word(w))
+            self._insert(w, index[w])
+        self._maxlen = max((len(w) for w in self._words), default=0)
+        self._build_fail_links()
+
+    # ---------- 建構 ----------
+    def _insert(self, word: str, pid: int) -> None:
+        node = 0
+        for ch in word:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (pid,)
+
+    def _build_fail_links(self) -> None:
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                cand = goto[f].get(ch, 0)
+                fail[nxt] = cand if cand != nxt else 0
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+    # ---------- 查詢 ----------
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @property
+    def keywords(self) -> Tuple[str, ...]:
+        return tuple(self._words)
+
+    def weight(self, keyword: str) -> float:
+        w = normalize_text(keyword).strip()
+        try:
+            return self._weights[self._words.index(w)]
+        except ValueError:
+            return 0.0
+
+    def iter_matches(self, text: str, *, normalized: bool = False) -> Iterator[Tuple[str, float, int]]:
+        """逐一產生 (keyword, weight, start)；start 為正規化後文字中的位置。"""
+        if not self._words:
+            return
+        st = self.stream()
+        yield from st.feed(text, normalized=normalized)
+        yield from st.close()
+
+    def stream(self) -> "KeywordStream":
+        """分塊掃描用的狀態物件：跨塊命中不會遺漏，記憶體只保留最長關鍵字長度的尾端。"""
+        return KeywordStream(self)
+
+    def search(self, text: str, *, normalized: bool = False) -> bool:
+        """是否命中任一關鍵字（命中即停）。"""
+        for _ in self.iter_matches(text, normalized=normalized):
+            return True
+        return False
+
+    def find_all(self, text: str, *, normalized: bool = False) -> List[Tuple[str, float]]:
+        """所有命中的關鍵字與權重（去重，依首次出現順序）。"""
+        seen: Dict[str, float] = {}
+        for w, weight, _start in self.iter_matches(text, normalized=normalized):
+            if w not in seen:
+                seen[w] = weight
+        return list(seen.items())
+
+
+class KeywordStream:
+    """
+    KeywordAutomaton 的分塊掃描器：feed() 可重複呼叫（每塊各自正規化），close() 收尾。
+    - 自動機狀態跨塊延續，跨塊的關鍵字照樣命中
+    - 字界判斷需要前一字元（保留上一塊尾端）與下一字元（命中暫存到下一塊再判斷）
+    start 為整段正規化文字中的絕對位置。
+    """
+
+    __slots__ = ("_ac", "_state", "_tail", "_offset", "_pending")
+
+    def __init__(self, ac: KeywordAutomaton) -> None:
+        self._ac = ac
+        self._state = 0
+        self._tail = ""
+        self._offset = 0
+        self._pending: List[Tuple[int, int]] = []
+
+    def feed(self, chunk: str, *, normalized: bool = False) -> Iterator[Tuple[str, float, int]]:
+        ac = self._ac
+        t = chunk if normalized else normalize_text(chunk)
+        if not t or not ac._words:
+            return
+        goto, fail, out = ac._goto, ac._fail, ac._out
+        words, weights, bounded = ac._words, ac._weights, ac._bounded
+        tail, base, n = self._tail, self._offset, len(t)
+
+        if self._pending:
+            ok = t[0] not in _ASCII_WORD
+            pending, self._pending = self._pending, []
+            if ok:
+                for pid, start in pending:
+                    yield words[pid], weights[pid], start
+
+        state = self._state
+        for i, ch in enumerate(t):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            for pid in out[state]:
+                start = i - len(words[pid]) + 1
+                if bounded[pid]:
+                    if start > 0:
+                        before = t[start - 1]
+                    elif -start < len(tail):
+                        before = tail[start - 1]
+                    else:
+                        before = ""
+                    if before and before in _ASCII_WORD:
+                        continue
+                    if i + 1 >= n:
+                        self._pending.append((pid, base + start))
+                        continue
+                    if t[i + 1] in _ASCII_WORD:
+                        continue
+                yield words[pid], weights[pid], base + start
+        self._state = state
+        keep = ac._maxlen + 1
+        self._tail = t[-keep:] if n >= keep else (tail + t)[-keep:]
+        self._offset = base + n
+
+    def close(self) -> Iterator[Tuple[str, float, int]]:
+        """文字結尾也算字界：送出最後一塊尾端暫存的命中。"""
+        pending, self._pending = self._pending, []
+        ac = self._ac
+        for pid, start in pending:
+            yield ac._words[pid], ac._weights[pid], start
+
+
+__all__ = ["KeywordAutomaton", "KeywordStream", "normalize_text"]
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+
+from smart_mail_agent.utils.config import data_dir
+from smart_mail_agent.utils.logger import logger
+
+from .keyword_automaton import normalize_text
+from .llm_prompt import DEFAULT_ITEM_TOKENS, PROMPT_VERSION
+
+# 檔案位置：src/smart_mail_agent/spam/llm_cache.py
+# 模組用途：LLM 判定（L2）的磁碟快取與同鍵請求合併
+#   - LLMVerdictCache：SQLite，鍵 = 正規化文字雜湊 + 模型名稱 + 截斷預算 + 提示詞版本，含 TTL；跨行程 / 重啟後仍有效
+#   - Coalescer：同一個鍵同時只有一個上游請求，其餘呼叫等待同一個結果
+
+T = TypeVar("T")
+
+
+def default_cache_path() -> str:
+    """SMA_LLM_CACHE_PATH；未設定時放在資料目錄（SMA_DATA_DIR，見 utils.config.data_dir）的 cache/ 下。"""
+    env = os.getenv("SMA_LLM_CACHE_PATH")
+    if env:
+        return env
+    return str(data_dir() / "cache" / "spam_llm_cache.sqlite")
+
+
+DEFAULT_CACHE_PATH = default_cache_path()  # import 時的值；建立快取時以 default_cache_path() 為準
+DEFAULT_TTL_S = float(os.getenv("SMA_LLM_CACHE_TTL", "86400"))
+
+_RE_WS = re.compile(r"\s+")
+
+
+def llm_cache_key(
+    subject: str,
+    content: str,
+    model: str,
+    *,
+    item_tokens: int = DEFAULT_ITEM_TOKENS,
+    prompt_version: str = PROMPT_VERSION,
+) -> str:
+    """
+    NFKC/小寫/空白壓縮後的主旨 + 內文，加上模型名稱、item_tokens 與提示詞版本的雜湊鍵。
+    截斷預算或提示詞不同時，LLM 看到的內容不同，判定不能共用。
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{model or ''}\x00{int(item_tokens)}\x00{prompt_version}".encode("utf-8"))
+    for part in (subject, content):
+        h.update(b"\x00")
+        h.update(_RE_WS.sub(" ", normalize_text(part or "")).strip().encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class LLMVerdictCache:
+    """
+    SQLite 判定快取（單一連線 + 鎖，WAL 模式）。
+    path 未指定時為 default_cache_path()；path=":memory:" 可用於測試；讀寫失敗只記 log，不影響判定流程。
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None, ttl: float = DEFAULT_TTL_S) -> None:
+        self.path = str(path or default_cache_path())
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_verdicts(
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                verdict INTEGER,
+                created_at REAL
+            )"""
+            )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bool]:
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT verdict, created_at FROM llm_verdicts WHERE key=?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("[LLMVerdictCache] 讀取失敗：%s", e)
+            return None
+        if row is None or (self.ttl > 0 and row[1] + self.ttl < time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bool(row[0])
+
+    def put(self, key: str, verdict: bool, model: str = "") -> None:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_verdicts(key, model, verdict, created_at) VALUES(?,?,?,?)",
+                    (key, model, int(bool(verdict)), time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning("[LLMVerdictCache] 寫入失敗：%s", e)
+
+    def purge_expired(self) -> int:
+        """刪除過期項目，回傳刪除筆數。"""
+        if self.ttl <= 0:
+            return 0
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM llm_verdicts WHERE created_at < ?", (time.time() - self.ttl,))
+            return int(cur.rowcount or 0)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_verdicts").fetchone()[0]
+        return {"path": self.path, "ttl": self.ttl, "size": int(size), "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class Coalescer:
+    """
+    同鍵請求合併：第一個呼叫者執行 fn，同時間其他相同鍵的呼叫者等待並共用結果（含例外）。
+    結果不保留；完成後下一次呼叫會重新執行（持久結果交給 LLMVerdictCache）。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, "Future[Any]"] = {}
+        self.coalesced = 0
+
+    def run(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._inflight[key] = fut
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()  # type: ignore[union-attr]
+        try:
+            val = fn()
+        except BaseException as e:
+            fut.set_exception(e)  # type: ignore[union-attr]
+            raise
+        else:
+            fut.set_result(val)  # type: ignore[union-attr]
+            return val
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+__all__ = [
+    "LLMVerdictCache",
+    "Coalescer",
+    "llm_cache_key",
+    "default_cache_path",
+    "DEFAULT_CACHE_PATH",
+    "DEFAULT_TTL_S",
+]
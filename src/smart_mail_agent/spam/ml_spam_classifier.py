@@ -1,12 +1,245 @@
 #!/usr/bin/env python3
 # 檔案位置：src/smart_mail_agent/spam/ml_spam_classifier.py
-# 模組用途：相容 shim，如有正式實作則轉接；否則提供 predict_proba 最小介面
+# 模組用途：CPU 上的 spam 機率模型：字元 n-gram 雜湊特徵 + 邏輯迴歸（NumPy）
+#   - HashedNgramModel：predict_proba_batch 整批向量化計分；save/load 為 .npz（只存非零權重）
+#   - fit_hashed_model：稀疏 AdaGrad 訓練（trainers/train_spam_ngram.py 呼叫）
+#   - predict_proba：相容介面；找不到模型檔時沿用舊的關鍵字判斷
 from __future__ import annotations
 
-try:
-    from ..ml_spam_classifier import *  # type: ignore  # noqa: F401,F403
-except Exception:
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
-    def predict_proba(features: dict) -> float:
-        s = str(features)
-        return 0.9 if ("中獎" in s or "lottery" in s) else 0.1
+from smart_mail_agent.utils.config import data_dir
+from smart_mail_agent.utils.logger import logger
+
+from .feature_extractor import (
+    DEFAULT_MAX_CHARS,
+    DEFAULT_N_FEATURES,
+    DEFAULT_NGRAM_RANGE,
+    EmailLike,
+    HashedBatch,
+    _require_numpy,
+    email_text,
+    hash_batch,
+    np,
+)
+
+
+def default_model_path() -> str:
+    """SMA_SPAM_MODEL_PATH；未設定時放在資料目錄（見 utils.config.data_dir）的 models/ 下。"""
+    env = os.getenv("SMA_SPAM_MODEL_PATH")
+    if env:
+        return env
+    return str(data_dir() / "models" / "spam_ngram.npz")
+
+
+DEFAULT_MODEL_PATH = default_model_path()  # import 時的值；載入時以 default_model_path() 為準
+_FORMAT = "sma-hashed-ngram-lr/1"
+
+
+def _sigmoid(z: Any) -> Any:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
+class HashedNgramModel:
+    """雜湊 n-gram 邏輯迴歸。權重為長度 n_features 的 float32 向量。"""
+
+    def __init__(
+        self,
+        weights: Any,
+        bias: float = 0.0,
+        *,
+        ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        max_chars: int = DEFAULT_MAX_CHARS,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        _require_numpy()
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.n_features = int(self.weights.shape[0])
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self.max_chars = int(max_chars)
+        self.meta: Dict[str, Any] = dict(meta or {})
+
+    # ---------- 計分 ----------
+    def transform(self, texts: Sequence[str]) -> HashedBatch:
+        return hash_batch(texts, n_features=self.n_features, ngram_range=self.ngram_range)
+
+    def decision_function(self, batch: HashedBatch) -> Any:
+        z = np.bincount(batch.rows, weights=self.weights[batch.cols] * batch.vals, minlength=batch.n_rows)
+        return z + self.bias
+
+    def predict_proba_texts(self, texts: Sequence[str]) -> Any:
+        """已 prepare_text 的文字 → spam 機率（float64 陣列）。"""
+        return _sigmoid(self.decision_function(self.transform(texts)))
+
+    def predict_proba_batch(self, items: Sequence[EmailLike]) -> Any:
+        """email dict / (subject, content) / 純文字 的序列 → spam 機率陣列（依輸入順序）。"""
+        return self.predict_proba_texts([email_text(x, max_chars=self.max_chars) for x in items])
+
+    def predict_proba_one(self, subject: str, content: str, attachments: Optional[Sequence[Any]] = None) -> float:
+        item = {"subject": subject, "content": content, "attachments": attachments or []}
+        return float(self.predict_proba_batch([item])[0])
+
+    # ---------- 存取 ----------
+    def save(self, path: Union[str, Path]) -> Path:
+        """存成壓縮 .npz：只存非零權重的索引與值。"""
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        nz = np.flatnonzero(self.weights).astype(np.uint32)
+        header = {
+            "format": _FORMAT,
+            "n_features": self.n_features,
+            "ngram_range": list(self.ngram_range),
+            "max_chars": self.max_chars,
+            "bias": self.bias,
+            "meta": self.meta,
+        }
+        with open(p, "wb") as f:
+            np.savez_compressed(f, header=np.array(json.dumps(header)), idx=nz, val=self.weights[nz])
+        return p
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "HashedNgramModel":
+        _require_numpy()
+        with np.load(str(path), allow_pickle=False) as z:
+            header = json.loads(str(z["header"]))
+            if header.get("format") != _FORMAT:
+                raise ValueError(f"不支援的模型格式：{header.get('format')}")
+            w = np.zeros(int(header["n_features"]), dtype=np.float32)
+            w[z["idx"]] = z["val"]
+        return cls(
+            w,
+            header.get("bias", 0.0),
+            ngram_range=tuple(header.get("ngram_range") or DEFAULT_NGRAM_RANGE),  # type: ignore[arg-type]
+            max_chars=int(header.get("max_chars") or DEFAULT_MAX_CHARS),
+            meta=header.get("meta") or {},
+        )
+
+
+def fit_hashed_model(
+    texts: Sequence[str],
+    labels: Sequence[int],
+    *,
+    n_features: int = DEFAULT_N_FEATURES,
+    ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+    max_chars: int = DEFAULT_MAX_CHARS,
+    epochs: int = 8,
+    batch_size: int = 256,
+    lr: float = 0.5,
+    l2: float = 1e-6,
+    seed: int = 0,
+) -> HashedNgramModel:
+    """
+    以已 prepare_text 的文字訓練邏輯迴歸（小批次 AdaGrad + L2）。
+    特徵只雜湊一次；每個小批次的梯度以 bincount 在稀疏欄位上累加。
+    """
+    _require_numpy()
+    y = np.asarray(labels, dtype=np.float64)
+    if len(y) != len(texts) or not len(y):
+        raise ValueError("texts 與 labels 長度需相同且不可為空")
+    X = hash_batch(texts, n_features=n_features, ngram_range=ngram_range)
+    by_row = np.argsort(X.rows, kind="stable")
+    X = HashedBatch(X.rows[by_row], X.cols[by_row], X.vals[by_row], X.n_rows, X.n_features)
+    indptr = np.searchsorted(X.rows, np.arange(X.n_rows + 1))
+
+    w = np.zeros(n_features, dtype=np.float64)
+    g2 = np.full(n_features, 1e-8)
+    pos = float(y.mean())
+    b = float(np.log((pos + 1e-3) / (1 - pos + 1e-3)))
+    gb2 = 1e-8
+    rng = np.random.default_rng(seed)
+    for _ in range(max(1, int(epochs))):
+        order = rng.permutation(X.n_rows)
+        for start in range(0, X.n_rows, batch_size):
+            sel = order[start : start + batch_size]
+            spans = [np.arange(indptr[i], indptr[i + 1]) for i in sel]
+            nnz = np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+            local = np.repeat(np.arange(len(sel)), [len(s) for s in spans])
+            cols, vals = X.cols[nnz], X.vals[nnz]
+            z = np.bincount(local, weights=w[cols] * vals, minlength=len(sel)) + b
+            err = (_sigmoid(z) - y[sel]) / len(sel)
+            touched = np.unique(cols)
+            grad = np.bincount(cols, weights=vals * err[local], minlength=n_features)[touched] + l2 * w[touched]
+            g2[touched] += grad * grad
+            w[touched] -= lr * grad / np.sqrt(g2[touched])
+            gb = float(err.sum())
+            gb2 += gb * gb
+            b -= lr * gb / np.sqrt(gb2)
+
+    meta = {"n_train": int(len(y)), "pos_rate": round(pos, 4), "epochs": int(epochs)}
+    return HashedNgramModel(w, b, ngram_range=ngram_range, max_chars=max_chars, meta=meta)
+
+
+# ================= 行程內共用模型 =================
+_MODEL_LOCK = threading.Lock()
+_MODEL: Dict[str, Any] = {"key": None, "model": None}
+
+
+def _stat_key(p: str) -> Optional[Tuple[str, float, int]]:
+    try:
+        st = Path(p).stat()
+    except OSError:
+        return None
+    return (p, st.st_mtime, st.st_size)
+
+
+def load_model(path: Union[str, Path, None] = None) -> Optional[HashedNgramModel]:
+    """
+    載入（並快取）模型；檔案不存在或缺 numpy 時回傳 None。
+    快取鍵為 (路徑, mtime, size)：之後才訓練出來或被覆寫的模型檔會重新載入；找不到 / 載入失敗不快取。
+    """
+    p = str(path or default_model_path())
+    key = _stat_key(p)
+    if key is None or np is None:
+        return None
+    with _MODEL_LOCK:
+        if _MODEL["key"] == key:
+            return _MODEL["model"]
+        try:
+            model = HashedNgramModel.load(p)
+        except Exception as e:
+            logger.warning("[ml_spam_classifier] 模型載入失敗 %s：%s", p, e)
+            return None
+        _MODEL.update(key=key, model=model)
+        return model
+
+
+def predict_proba_batch(items: Sequence[EmailLike], model: Optional[HashedNgramModel] = None) -> Any:
+    """整批 spam 機率；未提供 model 時使用 load_model()。"""
+    m = model or load_model()
+    if m is None:
+        raise RuntimeError(f"找不到 spam 模型：{default_model_path()}（請先執行 trainers/train_spam_ngram.py）")
+    return m.predict_proba_batch(items)
+
+
+def predict_proba(features: dict) -> float:
+    """相容介面：extract_features() 的結果 → spam 機率。"""
+    m = load_model()
+    if m is not None and isinstance(features, dict) and "text" in features:
+        return float(m.predict_proba_texts([features["text"]])[0])
+    s = str(features)
+    return 0.9 if ("中獎" in s or "lottery" in s) else 0.1
+
+
+def cascade_predictor(model: Optional[HashedNgramModel] = None) -> Optional[Callable[[Any], float]]:
+    """給 spam.cascade.ModelStage 用的 predict(view)；沒有模型時回傳 None。"""
+    m = model or load_model()
+    if m is None:
+        return None
+    return lambda view: m.predict_proba_one(view.subject, view.content, view.attachment_names)
+
+
+__all__: List[str] = [
+    "HashedNgramModel",
+    "fit_hashed_model",
+    "load_model",
+    "predict_proba",
+    "predict_proba_batch",
+    "cascade_predictor",
+    "DEFAULT_MODEL_PATH",
+    "default_model_path",
+]
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .keyword_automaton import normalize_text
+
+# 檔案位置：src/smart_mail_agent/spam/near_dup.py
+# 模組用途：近似重複信件索引（SimHash + 分段查表），讓同一波 spam 活動共用判定
+#   - 正規化：去 HTML 標籤、URL 只留主機名、數字與長追蹤碼遮罩 → 每位收件者換 token 也會落在同一群
+#   - 特徵：字元 5-gram shingle 取雜湊最小的 max_shingles 個（bottom-k，近似內容選到的樣本也近似）
+#   - 索引：64 位元指紋切成 max_distance+1 段，漢明距離 <= max_distance 必有一段完全相同（鴿籠原理）
+#     查詢只看同段桶內的候選，與索引大小無關；容量與存活時間皆有上限
+
+_RE_TAG = re.compile(r"<[^>]{0,512}>")
+_RE_URL = re.compile(r"(?:https?://|www\.)([^\s/<>\)\"'?#]{1,253})[^\s<>\)\"']{0,2048}", re.IGNORECASE)
+# 追蹤碼 / 訂單編號之類：含數字的長英數串；其餘數字一律視為 0
+_RE_TOKEN_ID = re.compile(r"\b(?=[a-z_\-]*\d)[a-z0-9_\-]{12,}\b")
+_RE_DIGITS = re.compile(r"\d+")
+_RE_WS = re.compile(r"\s+")
+
+SHINGLE = 5
+DEFAULT_MAX_CHARS = 2048
+DEFAULT_MAX_SHINGLES = 256
+DEFAULT_MIN_SHINGLES = 16
+
+
+def normalize_for_shingles(
+    subject: str,
+    content: str,
+    attachment_names: Iterable[str] = (),
+    *,
+    max_chars: int = DEFAULT_MAX_CHARS,
+) -> str:
+    """主旨 + 內文 + 附件檔名 → 遮罩個人化片段後的正規化文字（最多 max_chars 字）。"""
+    body = _RE_TAG.sub(" ", (content or "")[: max_chars * 2])
+    text = normalize_text(f"{subject or ''} {body} {' '.join(n or '' for n in attachment_names)}")
+    text = _RE_URL.sub(lambda m: f" url:{m.group(1)} ", text)
+    text = _RE_TOKEN_ID.sub("#", text)
+    text = _RE_DIGITS.sub("0", text)
+    return _RE_WS.sub(" ", text).strip()[:max_chars]
+
+
+def simhash(
+    text: str,
+    *,
+    max_shingles: int = DEFAULT_MAX_SHINGLES,
+    min_shingles: int = DEFAULT_MIN_SHINGLES,
+) -> Optional[int]:
+    """
+    已正規化文字的 64 位元 SimHash；shingle 太少（短信件，指紋不穩定）時回傳 None。
+    每個 shingle 的 64 位元雜湊由兩個 crc32 組成（C 實作，比 hashlib 快一個數量級）。
+    """
+    n = len(text) - SHINGLE + 1
+    if n < min_shingles:
+        return None
+    # UTF-32 每字固定 4 位元組：直接切位元組，不必逐段編碼
+    data = text.encode("utf-32-le", "surrogatepass")
+    step = 4 * SHINGLE
+    grams = {data[i : i + step] for i in range(0, 4 * n, 4)}
+    if len(grams) < min_shingles:
+        return None
+    hashes = {(zlib.crc32(g) << 32) | zlib.crc32(g, 0x9E3779B9) for g in grams}
+    if len(hashes) > max_shingles:
+        hashes = set(heapq.nsmallest(max_shingles, hashes))
+    # 逐位元計票：轉成等長二進位字串後按欄 zip，str/tuple.count 都在 C 裡跑
+    cols = zip(*(format(h, "064b") for h in hashes))
+    half = len(hashes) / 2.0
+    fp = 0
+    for col in cols:
+        fp = (fp << 1) | (col.count("1") > half)
+    return fp
+
+
+def fingerprint(subject: str, content: str, attachment_names: Iterable[str] = ()) -> Optional[int]:
+    """normalize_for_shingles + simhash。"""
+    return simhash(normalize_for_shingles(subject, content, attachment_names))
+
+
+@dataclass
+class NearDupHit:
+    verdict: Dict[str, Any]
+    distance: int
+    fingerprint: int
+
+
+class NearDupIndex:
+    """
+    SimHash 近似重複索引（執行緒安全）。
+    - put(fp, verdict)：登錄一封已判定信件的指紋與結果
+    - get(fp)：找漢明距離 <= max_distance 的最近一筆；候選只來自同段桶
+    - maxsize 筆上限（先進先出）、ttl 秒後過期；generation 改變（規則換代）時清空
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 20000,
+        ttl: float = 3600.0,
+        *,
+        max_distance: int = 3,
+        bucket_cap: int = 64,
+    ) -> None:
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self.max_distance = max(0, min(int(max_distance), 15))
+        self.bucket_cap = max(1, int(bucket_cap))
+        n_bands = self.max_distance + 1
+        width = 64 // n_bands
+        # 最後一段吃掉除不盡的位元
+        self._bands: Tuple[Tuple[int, int], ...] = tuple(
+            (i * width, (64 - i * width) if i == n_bands - 1 else width) for i in range(n_bands)
+        )
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, fp: int) -> Iterable[Tuple[int, int]]:
+        for i, (shift, width) in enumerate(self._bands):
+            yield i, (fp >> shift) & ((1 << width) - 1)
+
+    def _sync_generation(self, generation: Optional[int]) -> None:
+        if generation is not None and self._generation != generation:
+            self._entries.clear()
+            for t in self._tables:
+                t.clear()
+            self._generation = generation
+
+    def _drop(self, fp: int) -> None:
+        self._entries.pop(fp, None)
+        for i, key in self._band_keys(fp):
+            bucket = self._tables[i].get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(fp)
+            except ValueError:
+                pass
+            if not bucket:
+                del self._tables[i][key]
+
+    def _expire(self, now: float) -> None:
+        # 同一 ttl 下插入順序即到期順序：只需從最舊的一端清
+        while self._entries:
+            fp, (exp, _) = next(iter(self._entries.items()))
+            if exp >= now and len(self._entries) <= self.maxsize:
+                break
+            self._drop(fp)
+
+    def get(self, fp: Optional[int], generation: Optional[int] = None) -> Optional[NearDupHit]:
+        if fp is None or not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._sync_generation(generation)
+            best: Optional[Tuple[int, int]] = None
+            seen = set()
+            for i, key in self._band_keys(fp):
+                for cand in self._tables[i].get(key, ()):
+                    if cand in seen:
+                        continue
+                    seen.add(cand)
+                    d = (fp ^ cand).bit_count()
+                    if d <= self.max_distance and (best is None or d < best[0]):
+                        best = (d, cand)
+            if best is not None:
+                exp, verdict = self._entries[best[1]]
+                if exp >= now:
+                    self.hits += 1
+                    return NearDupHit(verdict, best[0], best[1])
+                self._drop(best[1])
+            self.misses += 1
+            return None
+
+    def put(self, fp: Optional[int], verdict: Dict[str, Any], generation: Optional[int] = None) -> None:
+        if fp is None or not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._sync_generation(generation)
+            if fp in self._entries:
+                self._drop(fp)
+            self._entries[fp] = (now + self.ttl, dict(verdict))
+            for i, key in self._band_keys(fp):
+                bucket = self._tables[i].setdefault(key, [])
+                bucket.append(fp)
+                # 低熵指紋段（例如大量模板信共用的段）桶子可能很長：只留最新的 bucket_cap 筆
+                if len(bucket) > self.bucket_cap:
+                    del bucket[0]
+            self._expire(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for t in self._tables:
+                t.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "generation": self._generation,
+            }
+
+
+__all__ = ["NearDupIndex", "NearDupHit", "normalize_for_shingles", "simhash", "fingerprint"]
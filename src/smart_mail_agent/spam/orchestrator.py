@@ -1,32 +1,50 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
+
+from .cascade import SpamCascade, default_cascade, score_spam
+
+# 檔案位置：src/smart_mail_agent/spam/orchestrator.py
+# 模組用途：相容包裝；判定交給 spam.cascade 分層引擎，另保留本類原本的關鍵字 / 寄件網域權重與門檻
+# 分數取兩者較高者：cascade 只會讓判定更嚴，不會讓原本判為 spam 的信變成正常信
 
 _SPAM_KW = ["免費", "中獎", "點此", "tinyurl", "bonus", "offer"]
 _SHORT_DOMAINS = ["unknown-domain.com"]
 
 
+def _legacy_score(subject: str, content: str, sender: str) -> Tuple[float, List[str]]:
+    s = ((subject or "") + " " + (content or "")).lower()
+    sc = 0.0
+    rs: List[str] = []
+    if any(k.lower() in s for k in _SPAM_KW):
+        sc += 0.75
+        rs.append("zh_keywords")
+    if sender and any(d in sender for d in _SHORT_DOMAINS):
+        sc = max(sc, 0.6)
+        rs.append("suspicious_domain")
+    return sc, rs
+
+
 class SpamFilterOrchestrator:
-    def __init__(self, threshold: float = 0.5) -> None:
+    def __init__(self, threshold: float = 0.5, cascade: SpamCascade | None = None) -> None:
         self.threshold = float(threshold)
+        self._cascade = cascade
+
+    @property
+    def cascade(self) -> SpamCascade:
+        return self._cascade or default_cascade()
+
+    def _combined(self, subject: str, content: str, sender: str) -> Tuple[float, List[str]]:
+        legacy, rs = _legacy_score(subject, content, sender)
+        res = self.cascade.classify(subject, content, sender)
+        rs += [r for r in res.reasons if r not in rs]
+        return round(max(legacy, res.score), 2), rs
 
     def score(self, subject: str, content: str, sender: str = "") -> Dict[str, float]:
-        s = (subject or "") + " " + (content or "")
-        sc = 0.0
-        if any(k.lower() in s.lower() for k in _SPAM_KW):
-            sc += 0.75
-        if sender and any(d in sender for d in _SHORT_DOMAINS):
-            sc = max(sc, 0.6)
-        return {"score": round(sc, 2)}
+        return {"score": self._combined(subject, content, sender)[0]}
 
     def is_spam(self, subject: str, content: str, sender: str = "") -> Dict[str, object]:
-        rs: List[str] = []
-        s = (subject or "") + " " + (content or "")
-        if any(k.lower() in s.lower() for k in _SPAM_KW):
-            rs.append("zh_keywords")
-        if sender and any(d in sender for d in _SHORT_DOMAINS):
-            rs.append("suspicious_domain")
-        sc = self.score(subject, content, sender)["score"]
+        sc, rs = self._combined(subject, content, sender)
         return {
             "is_spam": sc >= self.threshold,
             "score": sc,
@@ -38,3 +56,6 @@ class SpamFilterOrchestrator:
         r = self.is_spam(subject, content, sender)
         r["allow"] = not bool(r["is_spam"])
         return r
+
+
+__all__ = ["SpamFilterOrchestrator", "score_spam"]
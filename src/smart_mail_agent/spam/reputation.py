@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import atexit
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple, Union
+
+from smart_mail_agent.utils.logger import logger
+
+from .domain_list import sender_domain
+
+# 檔案位置：src/smart_mail_agent/spam/reputation.py
+# 模組用途：寄件者 / 寄件網域信譽表（記憶體，含時間衰減的 spam/ham 計數）
+#   - lookup() 只做 dict 查詢與幾次浮點運算（微秒級），供 cascade 最前面的層使用
+#   - 長期正常的寄件者 → trusted（略過模型 / LLM，硬規則仍生效）；新出現且短時間大量來信 → burst（升級檢查，優先於 trusted）
+#   - 定期寫回 SQLite，啟動時載回
+
+_LN2 = math.log(2.0)
+_RE_ADDR = re.compile(r"<?([^<>\s@]+@[^<>\s@]+?)>?\s*$")
+
+# 共用信箱網域：只看個別地址，不累積網域信譽
+DEFAULT_SHARED_DOMAINS: FrozenSet[str] = frozenset(
+    {"gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com", "icloud.com", "qq.com", "163.com"}
+)
+
+REP_TRUSTED = "trusted"
+REP_BURST = "burst"
+REP_BAD = "bad"
+
+
+def sender_address(sender: str) -> str:
+    """由 "Name <user@host>" 取出小寫地址；取不到回傳空字串。"""
+    m = _RE_ADDR.search(sender or "")
+    return m.group(1).lower() if m else ""
+
+
+@dataclass(frozen=True)
+class Reputation:
+    key: str
+    spam: float
+    ham: float
+    recent: float
+    first_seen: float
+    verdict: Optional[str] = None
+
+    @property
+    def total(self) -> float:
+        return self.spam + self.ham
+
+    @property
+    def spam_ratio(self) -> float:
+        t = self.total
+        return self.spam / t if t > 0 else 0.0
+
+
+class ReputationStore:
+    """
+    每個鍵（"s:地址" / "d:網域"）存 [spam, ham, recent, last_ts, first_ts]：
+      - spam/ham 以 half_life_s 指數衰減
+      - recent 為所有來信的短期計數（burst_half_life_s 衰減），用來抓突發量
+    path 為 None 時只在記憶體；否則啟動時載入，record() 距上次寫回超過 flush_interval_s 時寫回髒資料。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path, None] = None,
+        *,
+        half_life_s: float = 14 * 86400.0,
+        burst_half_life_s: float = 300.0,
+        flush_interval_s: float = 30.0,
+        trusted_min_ham: float = 30.0,
+        trusted_domain_min_ham: float = 200.0,
+        trusted_max_spam_ratio: float = 0.02,
+        bad_min_spam: float = 5.0,
+        bad_min_spam_ratio: float = 0.8,
+        burst_count: float = 20.0,
+        new_sender_s: float = 86400.0,
+        shared_domains: FrozenSet[str] = DEFAULT_SHARED_DOMAINS,
+    ) -> None:
+        self.path = str(path) if path else None
+        self.half_life_s = float(half_life_s)
+        self.burst_half_life_s = float(burst_half_life_s)
+        self.flush_interval_s = float(flush_interval_s)
+        self.trusted_min_ham = float(trusted_min_ham)
+        self.trusted_domain_min_ham = float(trusted_domain_min_ham)
+        self.trusted_max_spam_ratio = float(trusted_max_spam_ratio)
+        self.bad_min_spam = float(bad_min_spam)
+        self.bad_min_spam_ratio = float(bad_min_spam_ratio)
+        self.burst_count = float(burst_count)
+        self.new_sender_s = float(new_sender_s)
+        self.shared_domains = frozenset(shared_domains)
+
+        self._data: Dict[str, List[float]] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path:
+            self._open()
+
+    # ---------- 持久化 ----------
+    def _open(self) -> None:
+        assert self.path
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sender_reputation(
+            key TEXT PRIMARY KEY,
+            spam REAL,
+            ham REAL,
+            recent REAL,
+            last_ts REAL,
+            first_ts REAL
+        )"""
+        )
+        rows = self._conn.execute("SELECT key, spam, ham, recent, last_ts, first_ts FROM sender_reputation").fetchall()
+        for key, spam, ham, recent, last_ts, first_ts in rows:
+            self._data[key] = [spam, ham, recent, last_ts, first_ts]
+        logger.debug("[ReputationStore] 載入 %d 筆信譽資料：%s", len(rows), self.path)
+
+    def flush(self) -> int:
+        """把髒資料寫回 SQLite，回傳寫入筆數。"""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            items = [(k, *self._data[k]) for k in self._dirty if k in self._data]
+            self._dirty.clear()
+            self._last_flush = time.monotonic()
+        if not items:
+            return 0
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sender_reputation(key, spam, ham, recent, last_ts, first_ts) "
+                    "VALUES(?,?,?,?,?,?)",
+                    items,
+                )
+        except sqlite3.Error as e:
+            logger.warning("[ReputationStore] 寫回失敗：%s", e)
+            with self._lock:
+                self._dirty.update(k for k, *_ in items)
+            return 0
+        return len(items)
+
+    def close(self) -> None:
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ---------- 讀寫 ----------
+    def _keys(self, sender: str) -> Tuple[str, str]:
+        addr = sender_address(sender)
+        dom = sender_domain(sender)
+        return (f"s:{addr}" if addr else "", f"d:{dom}" if dom and dom not in self.shared_domains else "")
+
+    def _decayed(self, e: List[float], now: float) -> Tuple[float, float, float]:
+        dt = max(0.0, now - e[3])
+        f = math.exp(-dt * _LN2 / self.half_life_s)
+        fr = math.exp(-dt * _LN2 / self.burst_half_life_s)
+        return e[0] * f, e[1] * f, e[2] * fr
+
+    def record(self, sender: str, is_spam: bool, *, now: Optional[float] = None) -> None:
+        """記錄一次判定結果（寄件地址與網域各一筆）。"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for key in self._keys(sender):
+                if not key:
+                    continue
+                e = self._data.get(key)
+                if e is None:
+                    e = self._data[key] = [0.0, 0.0, 0.0, now, now]
+                spam, ham, recent = self._decayed(e, now)
+                e[0] = spam + (1.0 if is_spam else 0.0)
+                e[1] = ham + (0.0 if is_spam else 1.0)
+                e[2] = recent + 1.0
+                e[3] = now
+                self._dirty.add(key)
+            due = self._conn is not None and time.monotonic() - self._last_flush >= self.flush_interval_s
+        if due:
+            self.flush()
+
+    def _rep(self, key: str, now: float, min_ham: float) -> Optional[Reputation]:
+        e = self._data.get(key)
+        if e is None:
+            return None
+        spam, ham, recent = self._decayed(e, now)
+        total = spam + ham
+        verdict: Optional[str] = None
+        if total > 0 and spam >= self.bad_min_spam and spam / total >= self.bad_min_spam_ratio:
+            verdict = REP_BAD
+        elif now - e[4] <= self.new_sender_s and recent >= self.burst_count:
+            # 新寄件者先看突發量：短時間灌進大量信件本身就能累積出 trusted 的 ham 數
+            verdict = REP_BURST
+        elif ham >= min_ham and spam / total <= self.trusted_max_spam_ratio:
+            verdict = REP_TRUSTED
+        return Reputation(key, spam, ham, recent, e[4], verdict)
+
+    def lookup(self, sender: str, *, now: Optional[float] = None) -> Optional[Reputation]:
+        """
+        寄件地址優先；地址沒有結論時看網域（共用信箱網域除外）。
+        回傳有結論（verdict 非 None）的那一筆，否則回傳地址那筆（可能為 None）。
+        """
+        now = time.time() if now is None else now
+        skey, dkey = self._keys(sender)
+        srep = self._rep(skey, now, self.trusted_min_ham) if skey else None
+        if srep is not None and srep.verdict is not None:
+            return srep
+        drep = self._rep(dkey, now, self.trusted_domain_min_ham) if dkey else None
+        if drep is not None and drep.verdict is not None:
+            return drep
+        return srep
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def info(self) -> Dict[str, Any]:
+        return {"size": len(self._data), "dirty": len(self._dirty), "path": self.path}
+
+
+_DEFAULT: Dict[str, Optional[ReputationStore]] = {"store": None}
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_store() -> ReputationStore:
+    """行程內共用信譽表；SMA_SPAM_REPUTATION_DB 指定 SQLite 路徑時啟用持久化。"""
+    with _DEFAULT_LOCK:
+        if _DEFAULT["store"] is None:
+            store = ReputationStore(os.getenv("SMA_SPAM_REPUTATION_DB") or None)
+            if store.path:
+                atexit.register(store.close)
+            _DEFAULT["store"] = store
+        return _DEFAULT["store"]  # type: ignore[return-value]
+
+
+__all__ = [
+    "Reputation",
+    "ReputationStore",
+    "default_store",
+    "sender_address",
+    "REP_TRUSTED",
+    "REP_BURST",
+    "REP_BAD",
+    "DEFAULT_SHARED_DOMAINS",
+]
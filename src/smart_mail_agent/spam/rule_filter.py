@@ -2,19 +2,26 @@
 from __future__ import annotations
 
 import re
+from typing import Optional
 
 from smart_mail_agent.utils.logger import logger
 
+from .cascade import AllowlistStage, MessageView, RulesStage, SpamCascade
+
 # 檔案位置：src/spam/rule_filter.py
 # 模組用途：使用靜態規則（關鍵字、黑名單、樣式）偵測垃圾郵件內容
+#           自帶清單任一命中即為 spam；否則交給 cascade 的白名單 + 規則兩層（只會更嚴，不會放行原本判為 spam 的信）
 
 
 class RuleBasedSpamFilter:
     """
-    規則式垃圾信過濾器：透過關鍵字、黑名單網域、常見連結樣式進行 spam 偵測。
+    規則式垃圾信過濾器：透過關鍵字、黑名單網域、常見連結樣式進行 spam 偵測，
+    再加上 cascade 的白名單 + 規則兩層（不呼叫模型 / LLM）。
     """
 
-    def __init__(self):
+    def __init__(self, cascade: Optional[SpamCascade] = None):
+        self.cascade = cascade or SpamCascade((AllowlistStage(), RulesStage()))
+
         # 黑名單網域（若 email 內容包含此網址，視為 spam）
         self.blacklist_domains = ["xxx.com", "freemoney.cn", "spamlink.net"]
 
@@ -40,48 +47,33 @@ class RuleBasedSpamFilter:
             re.compile(r"https?://[^\s]*\.xxx\.com", re.IGNORECASE),
             re.compile(r"line\s*[:：]?\s*[\w\-]+", re.IGNORECASE),
         ]
-        # [SMA] 強化高風險關鍵字
-        try:
-            self.keywords.extend(
-                [
-                    "免費中獎",
-                    "中獎",
-                    "點此領獎",
-                    "領獎",
-                    "百萬",
-                    "點擊領取",
-                    "刷卡驗證",
-                    "帳號異常",
-                    "快速致富",
-                    "投資保證獲利",
-                ]
-            )
-        except Exception:
-            pass
-
-    def is_spam(self, text: str) -> bool:
-        """
-        判斷文字是否為垃圾信件內容。
-
-        :param text: 信件主旨與內容合併後的純文字
-        :return: bool - 是否為 spam
-        """
-        text = text.lower()
-        logger.debug("[RuleBasedSpamFilter] 進行規則式 Spam 檢查")
 
+    def _legacy_hit(self, text: str) -> Optional[str]:
         for kw in self.suspicious_keywords:
             if kw in text:
-                logger.info(f"[RuleBasedSpamFilter] 偵測關鍵字：{kw}")
-                return True
-
+                return f"偵測關鍵字：{kw}"
         for domain in self.blacklist_domains:
             if domain in text:
-                logger.info(f"[RuleBasedSpamFilter] 偵測黑名單網址：{domain}")
-                return True
-
+                return f"偵測黑名單網址：{domain}"
         for pattern in self.patterns:
             if pattern.search(text):
-                logger.info(f"[RuleBasedSpamFilter] 偵測樣式：{pattern.pattern}")
-                return True
+                return f"偵測樣式：{pattern.pattern}"
+        return None
+
+    def is_spam(self, text: str, sender: str = "") -> bool:
+        """
+        判斷文字是否為垃圾信件內容。
 
-        return False
+        :param text: 信件主旨與內容合併後的純文字
+        :param sender: 寄件者（選填；只影響 cascade 的白名單，不會放行自帶規則命中的信）
+        :return: bool - 是否為 spam
+        """
+        logger.debug("[RuleBasedSpamFilter] 進行規則式 Spam 檢查")
+        hit = self._legacy_hit((text or "").lower())
+        if hit is not None:
+            logger.info(f"[RuleBasedSpamFilter] {hit}")
+            return True
+        res = self.cascade.classify_view(MessageView(sender, "", text or ""))
+        if res.is_spam:
+            logger.info(f"[RuleBasedSpamFilter] 判定 spam：{res.reasons}")
+        return res.is_spam
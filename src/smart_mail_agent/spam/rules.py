@@ -1,19 +1,52 @@
 from __future__ import annotations
 
+import os
 import re
+import threading
+import time
 import unicodedata
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 try:
     import yaml  # type: ignore
 except Exception:  # pragma: no cover
     yaml = None  # type: ignore
 
+from smart_mail_agent.utils.logger import logger
+
+from .chunked import DEFAULT_CHUNK_CHARS, TextSource, stream_finditer
+from .domain_list import DomainListEngine
+from .html_scan import RE_URL, HtmlScan, HtmlScanner, scan_html
+from .keyword_automaton import KeywordAutomaton
+from .near_dup import NearDupIndex, fingerprint
+from .verdict_cache import VerdictCache, content_key
+
 # ================= 設定與快取 =================
 CONF_PATH: Union[str, Path] = Path(__file__).with_name("spam_rules.yaml")
-_CACHE: Dict[str, Any] = {"mtime": None, "rules": None}
+_CACHE: Dict[str, Any] = {"mtime": None, "rules": None, "generation": 0, "compiled": None, "checked_at": 0.0}
 
 DEFAULT_RULES: Dict[str, Any] = {
     "keywords": {
@@ -34,7 +67,10 @@ DEFAULT_RULES: Dict[str, Any] = {
     "suspicious_domains": ["bit.ly", "tinyurl.com", "t.co", "goo.gl"],
     "suspicious_tlds": ["tk", "top", "xyz"],
     "bad_extensions": [".exe", ".js", ".vbs", ".scr", ".bat"],
-    "whitelist_domains": ["example.com"],
+    # 只放保留網域；實際放行名單由 spam_rules.yaml 的 whitelist_domains / domain_lists.allow 設定
+    "whitelist_domains": ["trusted.example"],
+    # 大型名單：{allow: [路徑], block: [路徑]}；可為 compile_domain_list 編譯檔或每行一筆的文字檔
+    "domain_lists": {"allow": [], "block": []},
     # raw points（供自訂 YAML 測試）；規範化分數另外算
     "weights": {
         "keywords": 2,
@@ -47,6 +83,8 @@ DEFAULT_RULES: Dict[str, Any] = {
     "thresholds": {"suspect": 0.45, "spam": 0.60},
     # orchestrator 參考門檻
     "link_ratio_thresholds": {"review": 0.30, "drop": 0.50},
+    # 分塊掃描：每塊字元數、每封信最多掃描的位元組數 / 毫秒數（0 = 不限；超出時 reasons 記 scan:truncated）
+    "scan": {"chunk_chars": 65536, "max_bytes": 0, "max_ms": 0},
 }
 
 
@@ -74,16 +112,199 @@ def _deep_merge_rules(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[st
     return out
 
 
-def _load_rules() -> Dict[str, Any]:
+def _floats(d: Any) -> Dict[str, float]:
+    return {str(k): float(v) for k, v in (d or {}).items()}
+
+
+@dataclass(frozen=True)
+class CompiledRules:
+    """
+    規則快照（不可變）：每次設定檔變更編譯一次，整份原子替換。
+    熱路徑只讀取這個物件，不做檔案系統呼叫，也不重建集合/門檻。
+    """
+
+    generation: int
+    path: str
+    mtime: Optional[float]
+    raw: Mapping[str, Any]
+    keywords: KeywordAutomaton
+    keywords_word_boundary: KeywordAutomaton
+    suspicious_domains: FrozenSet[str]
+    suspicious_tlds: FrozenSet[str]
+    bad_extensions: Tuple[str, ...]
+    whitelist_domains: FrozenSet[str]
+    domains: DomainListEngine
+    weights: Mapping[str, float]
+    # raw points 門檻（參數式 label_email）與規範化分數門檻（dict 版）
+    points_spam: float
+    points_suspect: float
+    score_spam: float
+    score_suspect: float
+    link_ratio_review: float
+    link_ratio_drop: float
+    scan_chunk_chars: int
+    scan_max_bytes: int
+    scan_max_ms: float
+
+    def automaton(self, match_word_boundary: bool = False) -> KeywordAutomaton:
+        return self.keywords_word_boundary if match_word_boundary else self.keywords
+
+    def text_source(self, subject: str, content: str) -> TextSource:
+        """套用本快照掃描預算的分塊文字視圖（每封信一個）。"""
+        return TextSource.for_email(
+            subject,
+            content,
+            chunk_chars=self.scan_chunk_chars,
+            max_bytes=self.scan_max_bytes,
+            max_ms=self.scan_max_ms,
+        )
+
+
+def _list_files(rules: Dict[str, Any], kind: str, base: Path) -> List[Path]:
+    # YAML 的 domain_lists.<kind> 加上環境變數 SMA_SPAM_ALLOWLIST / SMA_SPAM_BLOCKLIST（os.pathsep 分隔）
+    spec = (rules.get("domain_lists") or {}).get(kind) or []
+    items = [spec] if isinstance(spec, str) else list(spec)
+    env = os.getenv("SMA_SPAM_ALLOWLIST" if kind == "allow" else "SMA_SPAM_BLOCKLIST", "")
+    items += [x for x in env.split(os.pathsep) if x]
+    out: List[Path] = []
+    for it in items:
+        p = Path(str(it))
+        p = p if p.is_absolute() else base / p
+        if p.exists():
+            out.append(p)
+        else:
+            logger.warning("[spam.rules] 找不到網域名單：%s", p)
+    return out
+
+
+def _build_domain_engine(rules: Dict[str, Any], path: str) -> DomainListEngine:
+    base = Path(path).parent
+    return DomainListEngine.from_lists(
+        allow=rules.get("whitelist_domains") or [],
+        block=rules.get("suspicious_domains") or [],
+        allow_files=_list_files(rules, "allow", base),
+        block_files=_list_files(rules, "block", base),
+    )
+
+
+def _compile_rules(rules: Dict[str, Any], *, generation: int, path: str, mtime: Optional[float]) -> CompiledRules:
+    kw_src = rules.get("keywords", {})
+    kw: Union[Dict[str, Any], List[str]] = kw_src if isinstance(kw_src, dict) else list(kw_src or [])
+    th = rules.get("thresholds") or {}
+    lr = rules.get("link_ratio_thresholds") or {}
+    scan = rules.get("scan") or {}
+    return CompiledRules(
+        generation=generation,
+        path=path,
+        mtime=mtime,
+        raw=MappingProxyType(rules),
+        keywords=KeywordAutomaton(kw),
+        keywords_word_boundary=KeywordAutomaton(kw, match_word_boundary=True),
+        suspicious_domains=frozenset(str(d).lower() for d in rules.get("suspicious_domains") or []),
+        suspicious_tlds=frozenset(str(t).lower() for t in rules.get("suspicious_tlds") or []),
+        bad_extensions=tuple(
+            str(e).lower() for e in (rules.get("bad_extensions") or DEFAULT_RULES["bad_extensions"])
+        ),
+        whitelist_domains=frozenset(str(d).lower() for d in rules.get("whitelist_domains") or []),
+        domains=_build_domain_engine(rules, path),
+        weights=MappingProxyType(_floats(rules.get("weights"))),
+        points_spam=float(th.get("spam", 8)),
+        points_suspect=float(th.get("suspect", 4)),
+        score_spam=float(th.get("spam", 0.60)),
+        score_suspect=float(th.get("suspect", 0.45)),
+        link_ratio_review=float(lr.get("review", 0.30)),
+        link_ratio_drop=float(lr.get("drop", 0.50)),
+        scan_chunk_chars=int(scan.get("chunk_chars") or DEFAULT_CHUNK_CHARS),
+        scan_max_bytes=int(scan.get("max_bytes") or 0),
+        scan_max_ms=float(scan.get("max_ms") or 0),
+    )
+
+
+# 變更偵測：預設每 N 秒最多 stat 一次；背景 watcher 啟動後熱路徑完全不 stat
+_POLL_INTERVAL_S = float(os.getenv("SMA_SPAM_RULES_POLL_S", "2.0"))
+_RELOAD_LOCK = threading.Lock()
+_WATCHER: Dict[str, Any] = {"thread": None, "stop": None}
+
+
+def _mtime_of(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def reload_rules(*, force: bool = False) -> CompiledRules:
+    """檢查設定檔，有變更（或 force）時重新編譯並原子替換快照；回傳目前快照。"""
     path = Path(CONF_PATH)
-    mtime = path.stat().st_mtime if path.exists() else None
-    if _CACHE.get("mtime") == mtime and _CACHE.get("rules") is not None:
-        return _CACHE["rules"]
-    file_rules = _read_yaml(path)
-    rules = _deep_merge_rules(DEFAULT_RULES, file_rules)
-    _CACHE["mtime"] = mtime
-    _CACHE["rules"] = rules
-    return rules
+    with _RELOAD_LOCK:
+        mtime = _mtime_of(path)
+        cur: Optional[CompiledRules] = _CACHE.get("compiled")
+        _CACHE["checked_at"] = time.monotonic()
+        if (
+            not force
+            and cur is not None
+            and _CACHE.get("rules") is not None
+            and cur.path == str(path)
+            and cur.mtime == mtime
+        ):
+            return cur
+        rules = _deep_merge_rules(DEFAULT_RULES, _read_yaml(path))
+        gen = int(_CACHE.get("generation") or 0) + 1
+        snap = _compile_rules(rules, generation=gen, path=str(path), mtime=mtime)
+        _CACHE.update(mtime=mtime, rules=rules, generation=gen, compiled=snap)
+        return snap
+
+
+def compiled_rules() -> CompiledRules:
+    """
+    取得目前規則快照。
+    - CONF_PATH 被替換時立即重載（不需 syscall 即可判斷）
+    - 未啟動 watcher 時，距上次檢查超過 SMA_SPAM_RULES_POLL_S 秒才 stat 一次
+    """
+    cur: Optional[CompiledRules] = _CACHE.get("compiled")
+    if cur is None or _CACHE.get("rules") is None or cur.path != str(CONF_PATH):
+        return reload_rules()
+    if _WATCHER["thread"] is None and time.monotonic() - _CACHE.get("checked_at", 0.0) >= _POLL_INTERVAL_S:
+        return reload_rules()
+    return cur
+
+
+def rules_generation() -> int:
+    """目前規則世代；每次重新編譯 +1，可作為下游快取的失效鍵。"""
+    return compiled_rules().generation
+
+
+def start_rules_watcher(interval: float = 1.0) -> threading.Thread:
+    """啟動背景 watcher：定期檢查設定檔並替換快照（已啟動則回傳既有執行緒）。"""
+    th = _WATCHER["thread"]
+    if th is not None and th.is_alive():
+        return th
+    stop = threading.Event()
+
+    def _run() -> None:
+        while not stop.wait(max(0.05, float(interval))):
+            try:
+                reload_rules()
+            except Exception:  # pragma: no cover - 壞檔不應讓 watcher 結束
+                pass
+
+    th = threading.Thread(target=_run, name="sma-spam-rules-watcher", daemon=True)
+    _WATCHER.update(thread=th, stop=stop)
+    th.start()
+    return th
+
+
+def stop_rules_watcher() -> None:
+    th, stop = _WATCHER["thread"], _WATCHER["stop"]
+    _WATCHER.update(thread=None, stop=None)
+    if stop is not None:
+        stop.set()
+    if th is not None:
+        th.join(timeout=2.0)
+
+
+def _load_rules() -> Mapping[str, Any]:
+    return compiled_rules().raw
 
 
 # ================= 基礎工具 =================
@@ -91,8 +312,21 @@ def _nfkc(s: str) -> str:
     return unicodedata.normalize("NFKC", s or "")
 
 
-def _is_ascii_word(w: str) -> bool:
-    return bool(re.fullmatch(r"[A-Za-z0-9_]+", w))
+@lru_cache(maxsize=32)
+def _compile_adhoc(items: Tuple[Tuple[str, Any], ...], match_word_boundary: bool) -> KeywordAutomaton:
+    return KeywordAutomaton(dict(items), match_word_boundary=match_word_boundary)
+
+
+def _automaton_for(
+    keywords: Optional[Union[Iterable[str], Dict[str, Any]]], match_word_boundary: bool
+) -> KeywordAutomaton:
+    if keywords is None:
+        return compiled_rules().automaton(match_word_boundary)
+    if isinstance(keywords, dict):
+        items = tuple((str(k), v if isinstance(v, (int, float)) else 1) for k, v in keywords.items())
+    else:
+        items = tuple((str(k), 1) for k in keywords)
+    return _compile_adhoc(items, match_word_boundary)
 
 
 def contains_keywords(
@@ -104,32 +338,23 @@ def contains_keywords(
     """
     是否包含任一關鍵字（NFKC/不分大小寫）。
     - keywords 為 None 時，使用設定檔內的 keywords
-    - match_word_boundary=True 僅對 ASCII 單字使用 \b 邊界比對（避免 "price" 命中 "pricelist"）
+    - match_word_boundary=True 僅對 ASCII 單字使用 ASCII 字界比對（避免 "price" 命中 "pricelist"）
     """
-    cfg = _load_rules()
-    ks: Iterable[str]
-    if keywords is None:
-        src = cfg.get("keywords", {})
-        ks = src.keys() if isinstance(src, dict) else src  # type: ignore
-    else:
-        ks = keywords.keys() if isinstance(keywords, dict) else keywords
+    return _automaton_for(keywords, match_word_boundary).search(text)
 
-    t = _nfkc(text).lower()
-    for k in ks:
-        w = _nfkc(str(k)).lower().strip()
-        if not w:
-            continue
-        if match_word_boundary and _is_ascii_word(w):
-            if re.search(rf"\b{re.escape(w)}\b", t):
-                return True
-        else:
-            if w in t:
-                return True
-    return False
+
+def keyword_hits(
+    text: str,
+    keywords: Optional[Union[Iterable[str], Dict[str, Any]]] = None,
+    *,
+    match_word_boundary: bool = False,
+) -> List[Tuple[str, float]]:
+    """一次掃描取得所有命中的關鍵字與權重：[(keyword, weight), ...]（keyword 為正規化後形式）。"""
+    return _automaton_for(keywords, match_word_boundary).find_all(text)
 
 
 # 抽 URL（簡易）
-_RE_URL = re.compile(r"(https?://|www\.)[^\s<>\)\"']{1,256}", re.IGNORECASE)
+_RE_URL = RE_URL
 
 
 def extract_urls(text: str) -> List[str]:
@@ -137,32 +362,18 @@ def extract_urls(text: str) -> List[str]:
 
 
 # ================= link ratio =================
-_RE_TAG = re.compile(r"<[^>]+>")
-_RE_WS = re.compile(r"\s+", re.UNICODE)
-# 移除 hidden / display:none / visibility:hidden 的整段節點
-_RE_HIDDEN_BLOCK = re.compile(
-    r"<([a-zA-Z0-9]+)\b[^>]*?(?:\bhidden\b|style\s*=\s*(?:\"[^\"]*?(?:display\s*:\s*none|visibility\s*:\s*hidden)[^\"]*\"|'[^']*?(?:display\s*:\s*none|visibility\s*:\s*hidden)[^']*'))[^>]*>.*?</\1>",
-    re.IGNORECASE | re.DOTALL,
-)
-# 只計算有 href 的 a
-_RE_A_HREF = re.compile(
-    r"<a\b[^>]*\bhref\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))[^>]*>(.*?)</a>",
-    re.IGNORECASE | re.DOTALL,
-)
-
-
-def _strip_ws(s: str) -> str:
-    return _RE_WS.sub("", s or "")
+# 純文字 URL 以一條 ≈ 14 字元估算
+_URL_TEXT_CHARS = 14
 
 
-def _remove_hidden(s: str) -> str:
-    prev = None
-    cur = s or ""
-    # 反覆移除，直到不再匹配（足夠應付測試）
-    while prev != cur:
-        prev = cur
-        cur = _RE_HIDDEN_BLOCK.sub("", cur)
-    return cur
+def link_ratio_from_scan(scan: HtmlScan) -> float:
+    """由 scan_html 的結果計算 link ratio（供已掃描過本文的階段重用）。"""
+    link_len = scan.anchor_chars + scan.url_count * _URL_TEXT_CHARS
+    eps = 1e-6
+    denom = max(eps, float(scan.visible_chars) + eps)
+    r = link_len / denom
+    r = max(0.0, min(1.0 - 1e-6, r))
+    return float(r)
 
 
 def link_ratio(html_or_text: str) -> float:
@@ -171,37 +382,15 @@ def link_ratio(html_or_text: str) -> float:
     - 只計算具 href 的 <a>
     - 移除 hidden / display:none / visibility:hidden 節點
     - 純文字 URL 以一條 ≈ 14 字元估算（讓「很多網址」能過阈值）
+    以 html_scan 單次走訪完成，不再多次 regex 掃描
     """
-    s = _remove_hidden(html_or_text or "")
-
-    # 取出 <a href=...> 內文字長度（去 tag、去空白）
-    link_len = 0
-    for m in _RE_A_HREF.finditer(s):
-        _href = (m.group(1) or m.group(2) or m.group(3) or "").strip()  # extracted but unused
-        text = m.group(4) or ""
-        # 有 href 即算（'#' 也算；符合測試對大量 <a> 的期待）
-        link_len += len(_strip_ws(_RE_TAG.sub("", text)))
-
-    # 所有可見文字（去 tag、去空白）
-    visible = _strip_ws(_RE_TAG.sub("", s))
-    vis_len = len(visible)
-
-    # 純文字 URL 估算
-    urls = extract_urls(s)
-    url_count = len(urls)
-    link_len += url_count * 14
-
-    eps = 1e-6
-    denom = max(eps, float(vis_len) + eps)
-    r = link_len / denom
-    r = max(0.0, min(1.0 - 1e-6, r))
-    return float(r)
+    return link_ratio_from_scan(scan_html(html_or_text or "", keep_text=False))
 
 
 # ================= 附件風險 =================
 def _is_danger_ext(name: str, bad_exts: Sequence[str]) -> bool:
     n = (name or "").lower()
-    return any(n.endswith(ext.lower()) for ext in bad_exts)
+    return n.endswith(tuple(ext.lower() for ext in bad_exts))
 
 
 def _has_double_ext(name: str) -> bool:
@@ -219,6 +408,7 @@ class Features:
     attach_exec: bool = False
     link_ratio_val: float = 0.0
     url_count: int = 0
+    truncated: bool = False
 
 
 def _domain_from_url(u: str) -> str:
@@ -226,48 +416,71 @@ def _domain_from_url(u: str) -> str:
     return (m.group(1) if m else u).lower()
 
 
+# 文字中的類網域字串（label 邊界；不含 http 前綴也能抓到 bit.ly/xxx）
+_RE_DOMAIN_TOKEN = re.compile(
+    r"(?<![A-Za-z0-9.-])(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.){1,8}[A-Za-z]{2,63}(?![A-Za-z0-9-])"
+)
+# 分塊重疊視窗：需大於單一命中的最大長度
+_URL_WINDOW = 300
+_DOMAIN_WINDOW = 9 * 64 + 64
+
+
 def _tld_of_domain(d: str) -> str:
     p = d.rsplit(".", 1)
     return p[-1].lower() if len(p) == 2 else ""
 
 
-def _collect_features(
-    sender: str, subject: str, content: str, attachments: Sequence[Union[str, Dict[str, Any]]]
-) -> Tuple[Features, List[str]]:
-    cfg = _load_rules()
-    feats = Features()
-    reasons: List[str] = []
+# 各訊號在規範化分數中的值（見 _normalized_score_and_label）
+_C_KEYWORDS = 0.20
+_C_URL = 0.60
+_C_TLD = 0.60
+_C_ATTACH = 0.50
+_C_LINK_FLOOR = 0.60
+_LINK_SCALE = 1.2
 
-    text_all = f"{subject or ''}\n{content or ''}"
 
-    if contains_keywords(text_all, match_word_boundary=False):
+def _stage_keywords(feats: Features, reasons: List[str], src: TextSource, cr: CompiledRules) -> None:
+    st = cr.keywords.stream()
+    for chunk in src.chunks():
+        for _hit in st.feed(chunk):
+            feats.keyword_hit = True
+            reasons.append("kw:hit")
+            return
+    for _hit in st.close():
         feats.keyword_hit = True
         reasons.append("kw:hit")
+        return
 
-    urls = extract_urls(text_all)
-    feats.url_count = len(urls)
-    sus_domains = set(cfg.get("suspicious_domains", []))
-    sus_tlds = set(cfg.get("suspicious_tlds", []))
+
+def _stage_domains(feats: Features, reasons: List[str], src: TextSource, cr: CompiledRules) -> None:
+    sus_tlds = cr.suspicious_tlds
 
     # 正規 URL
-    for u in urls:
+    for u in stream_finditer(_RE_URL, src.chunks(), _URL_WINDOW):
+        feats.url_count += 1
         d = _domain_from_url(u)
         tld = _tld_of_domain(d)
-        if any(d.endswith(sd) for sd in sus_domains):
+        if cr.domains.blocked(d) is not None:
             feats.url_sus += 1
             reasons.append(f"url:{d}")
         if tld in sus_tlds:
             feats.tld_sus += 1
             reasons.append(f"tld:{tld}")
 
-    # 純字串短網址（沒有 http/https/www 前綴也抓）
-    lowtext = (text_all or "").lower()
-    for sd in sus_domains:
-        if sd.lower() in lowtext:
+    # 純字串短網址（沒有 http/https/www 前綴也抓）：每個類網域字串查一次名單，每個名單項目只計一次
+    seen: Set[str] = set()
+    for token in stream_finditer(_RE_DOMAIN_TOKEN, src.chunks(), _DOMAIN_WINDOW):
+        hit = cr.domains.blocked(token)
+        if hit is not None and hit not in seen:
+            seen.add(hit)
             feats.url_sus += 1
-            reasons.append(f"url:{sd.lower()}")
+            reasons.append(f"url:{hit}")
+
 
-    bad_exts = cfg.get("bad_extensions", DEFAULT_RULES["bad_extensions"])
+def _stage_attachments(
+    feats: Features, reasons: List[str], attachments: Sequence[Union[str, Dict[str, Any]]], cr: CompiledRules
+) -> None:
+    bad_exts = cr.bad_extensions
     for a in attachments or []:
         fname = a if isinstance(a, str) else (a.get("filename") or "")
         if _is_danger_ext(fname, bad_exts):
@@ -276,90 +489,384 @@ def _collect_features(
         if _has_double_ext(fname):
             reasons.append("attach:double_ext")
 
-    feats.link_ratio_val = link_ratio(text_all)
+
+def _stage_link_ratio(feats: Features, reasons: List[str], src: TextSource, cr: CompiledRules) -> None:
+    scanner = HtmlScanner(keep_text=False)
+    for chunk in src.chunks():
+        scanner.feed(chunk)
+    scanner.close()
+    scan = scanner.result()
+    feats.link_ratio_val = link_ratio_from_scan(scan)
+    if scan.input_truncated:
+        # 超過 max_input_chars 的部分沒看到：link_ratio 只代表前段，與 TextSource 截斷同樣不可快取
+        _set_truncated(feats, reasons)
 
     # orchestrator 規則前綴（供測試檢查）
-    lr_drop = float(cfg.get("link_ratio_thresholds", {}).get("drop", 0.50))
-    lr_rev = float(cfg.get("link_ratio_thresholds", {}).get("review", 0.30))
+    lr_drop = cr.link_ratio_drop
+    lr_rev = cr.link_ratio_review
     if feats.link_ratio_val >= lr_drop:
         reasons.append(f"rule:link_ratio>={lr_drop:.2f}")
     elif feats.link_ratio_val >= lr_rev:
         reasons.append(f"rule:link_ratio>={lr_rev:.2f}")
 
+
+def _set_truncated(feats: Features, reasons: List[str]) -> None:
+    feats.truncated = True
+    if "scan:truncated" not in reasons:
+        reasons.append("scan:truncated")
+
+
+def _mark_truncated(feats: Features, reasons: List[str], src: TextSource) -> None:
+    if src.truncated:
+        _set_truncated(feats, reasons)
+
+
+def _collect_features(
+    sender: str,
+    subject: str,
+    content: str,
+    attachments: Sequence[Union[str, Dict[str, Any]]],
+    cr: Optional[CompiledRules] = None,
+) -> Tuple[Features, List[str]]:
+    cr = cr or compiled_rules()
+    feats = Features()
+    reasons: List[str] = []
+
+    # 主旨 + "\n" + 內文 以分塊走訪，不建立整份（或正規化後的）副本
+    src = cr.text_source(subject, content)
+
+    _stage_keywords(feats, reasons, src, cr)
+    _stage_domains(feats, reasons, src, cr)
+    _stage_attachments(feats, reasons, attachments, cr)
+    _stage_link_ratio(feats, reasons, src, cr)
+    _mark_truncated(feats, reasons, src)
+    return feats, reasons
+
+
+def _collect_features_fast(
+    sender: str,
+    subject: str,
+    content: str,
+    attachments: Sequence[Union[str, Dict[str, Any]]],
+    cr: CompiledRules,
+) -> Tuple[Features, List[str], Optional[str]]:
+    """
+    依成本由低到高（附件副檔名 → 網域名單 → 關鍵字 → HTML link ratio）評估，
+    一旦標籤不可能再改變就停止；回傳 (feats, reasons, 停止所在階段 或 None)。
+    分數取各訊號最大值，因此：
+      - 已達 spam 門檻：之後任何訊號都不會改變標籤
+      - 某階段可達的最大值低於「下一個門檻」：該階段可略過
+    """
+    feats = Features()
+    reasons: List[str] = []
+    src = cr.text_source(subject, content)
+
+    stages = (
+        ("attachments", _C_ATTACH, lambda: _stage_attachments(feats, reasons, attachments, cr)),
+        ("domains", max(_C_URL, _C_TLD, _C_LINK_FLOOR), lambda: _stage_domains(feats, reasons, src, cr)),
+        ("keywords", _C_KEYWORDS, lambda: _stage_keywords(feats, reasons, src, cr)),
+        ("link_ratio", _LINK_SCALE, lambda: _stage_link_ratio(feats, reasons, src, cr)),
+    )
+    for name, ceiling, run in stages:
+        score = max(_signal_scores(feats).values())
+        nxt = cr.score_suspect if score < cr.score_suspect else cr.score_spam
+        if ceiling < nxt:
+            continue
+        run()
+        if max(_signal_scores(feats).values()) >= cr.score_spam:
+            _mark_truncated(feats, reasons, src)
+            return feats, reasons, name
+    _mark_truncated(feats, reasons, src)
+    return feats, reasons, None
+
+
+# ================= 判定快取 =================
+_VERDICT_CACHE = VerdictCache(
+    maxsize=int(os.getenv("SMA_SPAM_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("SMA_SPAM_CACHE_TTL", "300")),
+)
+
+
+def _attachment_names(attachments: Sequence[Union[str, Dict[str, Any]]]) -> List[str]:
+    return [a if isinstance(a, str) else (a.get("filename") or "") for a in attachments or []]
+
+
+_Probe = Tuple[Optional[str], Optional[Tuple[Features, Tuple[str, ...]]]]
+
+
+def _cache_probe(
+    subject: str, content: str, attachments: Sequence[Union[str, Dict[str, Any]]], cr: CompiledRules
+) -> _Probe:
+    """(內容雜湊鍵, 快取中的 (features, reasons) 或 None)；快取停用時鍵為 None。"""
+    if not _VERDICT_CACHE.enabled:
+        return None, None
+    key = content_key(subject, content, _attachment_names(attachments), cr.generation)
+    return key, _VERDICT_CACHE.get(key, cr.generation)
+
+
+def _features_cached(
+    sender: str,
+    subject: str,
+    content: str,
+    attachments: Sequence[Union[str, Dict[str, Any]]],
+    cr: CompiledRules,
+    use_cache: bool = True,
+    probe: Optional[_Probe] = None,
+) -> Tuple[Features, List[str]]:
+    # 特徵只與主旨/內文/附件檔名有關（寄件者白名單在此之前判斷），故以內容雜湊為鍵
+    if not (use_cache and _VERDICT_CACHE.enabled):
+        return _collect_features(sender, subject, content, attachments, cr)
+    key, hit = probe if probe is not None else _cache_probe(subject, content, attachments, cr)
+    if hit is not None:
+        return hit[0], list(hit[1])
+    feats, reasons = _collect_features(sender, subject, content, attachments, cr)
+    if not feats.truncated:
+        # 受時間預算截斷的結果與時機有關，不寫入快取
+        _VERDICT_CACHE.put(key, (feats, tuple(reasons)), cr.generation)
     return feats, reasons
 
 
-def _raw_points_and_label(feats: Features) -> Tuple[float, str]:
+def _features_fast(
+    sender: str,
+    subject: str,
+    content: str,
+    attachments: Sequence[Union[str, Dict[str, Any]]],
+    cr: CompiledRules,
+    use_cache: bool = True,
+    probe: Optional[_Probe] = None,
+) -> Tuple[Features, List[str], Optional[str]]:
+    # 快取中若已有完整特徵就直接用；短路得到的部分特徵不寫回快取
+    if use_cache and _VERDICT_CACHE.enabled:
+        _, hit = probe if probe is not None else _cache_probe(subject, content, attachments, cr)
+        if hit is not None:
+            return hit[0], list(hit[1]), None
+    return _collect_features_fast(sender, subject, content, attachments, cr)
+
+
+# ================= 近似重複索引 =================
+# 同一波活動（每位收件者換追蹤碼 / 連結）的信件共用已知判定；只登錄 spam / suspect
+# 預設關閉（沿用別封信的判定）：SMA_SPAM_NEARDUP=1 才啟用；沿用時只帶 neardup:<來源>，不複製原信的 reasons
+_NEAR_DUP_ON = (os.getenv("SMA_SPAM_NEARDUP") or "").strip().lower() in ("1", "true", "yes", "on")
+_NEAR_DUP = NearDupIndex(
+    maxsize=int(os.getenv("SMA_SPAM_NEARDUP_SIZE", "20000")) if _NEAR_DUP_ON else 0,
+    ttl=float(os.getenv("SMA_SPAM_NEARDUP_TTL", "3600")),
+    max_distance=int(os.getenv("SMA_SPAM_NEARDUP_DISTANCE", "3")),
+)
+_NEAR_DUP_KEYS = ("label", "score", "scores", "points")
+
+
+def record_near_duplicate(
+    subject: str,
+    content: str,
+    attachments: Sequence[Union[str, Dict[str, Any]]] = (),
+    *,
+    label: str,
+    score: float,
+    source: str = "rules",
+    scores: Optional[Mapping[str, float]] = None,
+    points: float = 0.0,
+    generation: Optional[int] = None,
+) -> bool:
+    """
+    登錄一封已判定信件（規則 / 模型 / LLM 皆可）；之後近似的信件在 label_email(dict) 直接沿用標籤與分數。
+    原信的 reasons 不登錄（那是另一封信的證據）。legit、太短（指紋不穩定）或索引未啟用時不登錄，回傳是否有登錄。
+    """
+    if label == "legit" or not _NEAR_DUP.enabled:
+        return False
+    fp = fingerprint(subject, content, _attachment_names(attachments))
+    if fp is None:
+        return False
+    verdict = {
+        "label": label,
+        "score": float(score),
+        "scores": dict(scores) if scores is not None else {k: 0.0 for k in SIGNALS},
+        "points": float(points),
+        "source": source,
+    }
+    _NEAR_DUP.put(fp, verdict, compiled_rules().generation if generation is None else generation)
+    return True
+
+
+def _near_dup_lookup(
+    subject: str, content: str, atts: Sequence[Union[str, Dict[str, Any]]], cr: CompiledRules
+) -> Optional[Dict[str, Any]]:
+    # 索引是空的就不必算指紋：平時大多數信件不付任何成本
+    if not (_NEAR_DUP.enabled and len(_NEAR_DUP)):
+        return None
+    hit = _NEAR_DUP.get(fingerprint(subject, content, _attachment_names(atts)), cr.generation)
+    if hit is None:
+        return None
+    out = {k: hit.verdict[k] for k in _NEAR_DUP_KEYS}
+    out["reasons"] = [f"neardup:{hit.verdict['source']}"]
+    out["scores"] = dict(out["scores"])
+    out["near_duplicate"] = {"source": hit.verdict["source"], "distance": hit.distance}
+    return out
+
+
+def near_dup_info() -> Dict[str, Any]:
+    """近似重複索引統計：size/hits/misses/hit_rate/...。"""
+    return _NEAR_DUP.info()
+
+
+def clear_near_dup() -> None:
+    _NEAR_DUP.clear()
+
+
+def verdict_cache_info() -> Dict[str, Any]:
+    """判定快取統計：size/hits/misses/evictions/hit_rate/generation。"""
+    return _VERDICT_CACHE.info()
+
+
+def clear_verdict_cache() -> None:
+    _VERDICT_CACHE.clear()
+
+
+def _raw_points_and_label(feats: Features, cr: Optional[CompiledRules] = None) -> Tuple[float, str]:
     """
     for label_email(sender, subject, content, attachments) 測試：
     以 YAML weights 計 raw points；thresholds: suspect/spam
     """
-    cfg = _load_rules()
-    w = cfg.get("weights", {})
+    cr = cr or compiled_rules()
+    w = cr.weights
 
     points = 0.0
     if feats.keyword_hit:
-        points += float(w.get("keywords", 0))
+        points += w.get("keywords", 0.0)
     if feats.url_sus > 0:
-        points += float(w.get("url_suspicious", 0))
+        points += w.get("url_suspicious", 0.0)
     if feats.tld_sus > 0:
-        points += float(w.get("tld_suspicious", 0))
+        points += w.get("tld_suspicious", 0.0)
     if feats.attach_exec:
-        points += float(w.get("attachment_executable", 0))
+        points += w.get("attachment_executable", 0.0)
     # link ratio 達 drop 門檻才加分
-    if feats.link_ratio_val >= float(cfg.get("link_ratio_thresholds", {}).get("drop", 0.50)):
-        points += float(w.get("link_ratio", 0))
+    if feats.link_ratio_val >= cr.link_ratio_drop:
+        points += w.get("link_ratio", 0.0)
 
-    th = cfg.get("thresholds", {})
-    if points >= float(th.get("spam", 8)):
+    if points >= cr.points_spam:
         label = "spam"
-    elif points >= float(th.get("suspect", 4)):
+    elif points >= cr.points_suspect:
         label = "suspect"
     else:
         label = "legit"
     return points, label
 
 
-def _normalized_score_and_label(feats: Features) -> Tuple[float, str, Dict[str, float]]:
+def _signal_scores(feats: Features) -> Dict[str, float]:
+    c_keywords = _C_KEYWORDS if feats.keyword_hit else 0.0
+    c_url = _C_URL if feats.url_sus > 0 else 0.0
+    c_tld = _C_TLD if feats.tld_sus > 0 else 0.0
+    c_attach = _C_ATTACH if feats.attach_exec else 0.0
+
+    # 連結：一般情況採比例 * 1.2；若極多 URL（>=10）或比例達 0.5，直接拉到 0.60
+    c_link = feats.link_ratio_val * _LINK_SCALE
+    if feats.link_ratio_val >= 0.50 or feats.url_count >= 10:
+        c_link = max(c_link, _C_LINK_FLOOR)
+
+    return {
+        "keywords": float(c_keywords),
+        "url_suspicious": float(c_url),
+        "tld_suspicious": float(c_tld),
+        "attachment_executable": float(c_attach),
+        "link_ratio": float(c_link),
+    }
+
+
+def _normalized_score_and_label(
+    feats: Features, cr: Optional[CompiledRules] = None
+) -> Tuple[float, str, Dict[str, float]]:
     """
     規範化分數：訊號對映到 [0,1]，取最大值，滿足：
       - 危險附件（.exe 等） => score >= 0.45（suspect）
       - 很多連結或 link_ratio >= 0.50 => score >= 0.60（spam）
       - 短網址/可疑網域 或 可疑 TLD => 直接拉到 0.60（spam）
     """
-    cfg = _load_rules()
-    c_keywords = 0.20 if feats.keyword_hit else 0.0
-    c_url = 0.60 if feats.url_sus > 0 else 0.0
-    c_tld = 0.60 if feats.tld_sus > 0 else 0.0
-    c_attach = 0.50 if feats.attach_exec else 0.0
+    cr = cr or compiled_rules()
+    scores_detail = _signal_scores(feats)
+    score = max(scores_detail.values())
 
-    # 連結：一般情況採比例 * 1.2；若極多 URL（>=10）或比例達 0.5，直接拉到 0.60
-    c_link = feats.link_ratio_val * 1.2
-    if feats.link_ratio_val >= 0.50 or feats.url_count >= 10:
-        c_link = max(c_link, 0.60)
-
-    score = max(c_keywords, c_url, c_tld, c_attach, c_link)
-
-    th = cfg.get("thresholds", {})
-    if score >= float(th.get("spam", 0.60)):
+    if score >= cr.score_spam:
         label = "spam"
-    elif score >= float(th.get("suspect", 0.45)):
+    elif score >= cr.score_suspect:
         label = "suspect"
     else:
         label = "legit"
 
-    scores_detail = {
-        "keywords": float(c_keywords),
-        "url_suspicious": float(c_url),
-        "tld_suspicious": float(c_tld),
-        "attachment_executable": float(c_attach),
-        "link_ratio": float(c_link),
-    }
     return float(score), label, scores_detail
 
 
 # ================= 公開 API =================
 EmailDict = Dict[str, Any]
+# 規範化分數的各訊號名稱（label_email(dict)["scores"] 的鍵）
+SIGNALS: Tuple[str, ...] = ("keywords", "url_suspicious", "tld_suspicious", "attachment_executable", "link_ratio")
+
+
+def _email_fields(e: EmailDict) -> Tuple[str, str, str, Sequence[Union[str, Dict[str, Any]]]]:
+    sender = e.get("sender") or e.get("from") or ""
+    subj = e.get("subject") or ""
+    cont = e.get("content") or e.get("body") or ""
+    atts = e.get("attachments") or []
+    return sender, subj, cont, atts
+
+
+_ALLOW_REASON = "allow:sender"
+
+
+def _allowlisted_result() -> Dict[str, Any]:
+    return {
+        "label": "legit",
+        "score": 0.0,
+        "reasons": [_ALLOW_REASON],
+        "scores": {k: 0.0 for k in SIGNALS},
+        "points": 0.0,
+    }
+
+
+def _label_email_dict(
+    e: EmailDict, cr: CompiledRules, use_cache: bool = True, fast: bool = False
+) -> Dict[str, Any]:
+    sender, subj, cont, atts = _email_fields(e)
+    # 白名單寄件者：整個 spam 階段直接放行
+    if cr.domains.sender_allowed(sender):
+        return _allowlisted_result()
+    probe: Optional[_Probe] = None
+    if use_cache:
+        # 完全相同的內容先走判定快取；沒命中才查近似重複索引
+        probe = _cache_probe(subj, cont, atts, cr)
+        if probe[1] is None:
+            dup = _near_dup_lookup(subj, cont, atts, cr)
+            if dup is not None:
+                if fast:
+                    dup["short_circuit"] = "near_dup"
+                return dup
+    stop: Optional[str] = None
+    if fast:
+        feats, reasons, stop = _features_fast(sender, subj, cont, atts, cr, use_cache, probe)
+    else:
+        feats, reasons = _features_cached(sender, subj, cont, atts, cr, use_cache, probe)
+    score_norm, label, scores_detail = _normalized_score_and_label(feats, cr)
+    raw_points, _ = _raw_points_and_label(feats, cr)
+    out: Dict[str, Any] = {
+        "label": label,
+        "score": float(score_norm),
+        "reasons": reasons,
+        "scores": scores_detail,
+        "points": float(raw_points),
+    }
+    if fast:
+        out["short_circuit"] = stop
+    elif use_cache and probe is not None and probe[1] is None and label != "legit" and not feats.truncated:
+        # 只登錄新算出的完整結果；fast 的部分特徵不代表整封信
+        record_near_duplicate(
+            subj,
+            cont,
+            atts,
+            label=label,
+            score=score_norm,
+            scores=scores_detail,
+            points=raw_points,
+            generation=cr.generation,
+        )
+    return out
 
 
 def label_email(
@@ -367,29 +874,25 @@ def label_email(
     subject: str | None = None,
     content: str | None = None,
     attachments: Sequence[Union[str, Dict[str, Any]]] | None = None,
+    *,
+    use_cache: bool = True,
+    fast: bool = False,
+    explain: bool = False,
 ) -> Union[Dict[str, Any], Tuple[str, float, List[str]]]:
     """
     兩種用法：
       1) label_email(email_dict) -> {label, score(0~1), reasons, scores, points}
       2) label_email(sender, subject, content, attachments) -> (label, raw_points, reasons)
+    相同內容（主旨/內文/附件檔名）在同一規則世代內走判定快取；use_cache=False 可強制重算。
+    dict 用法另查近似重複索引（SMA_SPAM_NEARDUP=1 時）：與已判定為 spam/suspect 的信件近似時沿用其標籤與分數
+      （reasons 只有 neardup:<來源>，結果多一個 near_duplicate）；explain=True 不查。
+    fast=True（僅 dict 用法）：依成本由低到高評估訊號，標籤確定即停止；
+      結果多一個 short_circuit（停止的階段名或 None），reasons/scores/points 只反映已評估的訊號。
+    explain=True：一律完整評估（稽核用），即使同時指定 fast。
     """
     if isinstance(email_or_sender, dict):
-        e = email_or_sender
-        sender = e.get("sender") or e.get("from") or ""
-        subj = e.get("subject") or ""
-        cont = e.get("content") or e.get("body") or ""
-        atts = e.get("attachments") or []
-
-        feats, reasons = _collect_features(sender, subj, cont, atts)
-        score_norm, label, scores_detail = _normalized_score_and_label(feats)
-        raw_points, _ = _raw_points_and_label(feats)
-        return {
-            "label": label,
-            "score": float(score_norm),
-            "reasons": reasons,
-            "scores": scores_detail,
-            "points": float(raw_points),
-        }
+        # 整封信只取一次快照：避免中途換代造成前後不一致
+        return _label_email_dict(email_or_sender, compiled_rules(), use_cache and not explain, fast and not explain)
 
     # 參數式：回傳 raw points（供自訂 YAML 測試）
     sender = email_or_sender or ""
@@ -397,11 +900,166 @@ def label_email(
     cont = content or ""
     atts = attachments or []
 
-    feats, reasons = _collect_features(sender, subj, cont, atts)
-    raw_points, label = _raw_points_and_label(feats)
+    cr = compiled_rules()
+    if cr.domains.sender_allowed(sender):
+        return "legit", 0.0, [_ALLOW_REASON]
+    feats, reasons = _features_cached(sender, subj, cont, atts, cr, use_cache)
+    raw_points, label = _raw_points_and_label(feats, cr)
     return label, float(raw_points), reasons
 
 
 def get_link_ratio_thresholds() -> Dict[str, float]:
     cfg = _load_rules()
-    return {k: float(v) for k, v in cfg.get("link_ratio_thresholds", {}).items()}
+    return {k: float(v) for k, v in (cfg.get("link_ratio_thresholds") or {}).items()}
+
+
+# ================= 批次 API =================
+
+
+@dataclass
+class BatchLabels:
+    """
+    label_emails 的欄式結果：第 i 列對應輸入第 i 封信。
+    scores/points/signals 為 array('d')，可零拷貝轉 numpy：np.frombuffer(res.scores)。
+    """
+
+    labels: List[str]
+    scores: array[float]
+    points: array[float]
+    signals: Dict[str, array[float]]
+    reasons: Optional[List[List[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def _extend(self, other: BatchLabels) -> None:
+        self.labels.extend(other.labels)
+        self.scores.extend(other.scores)
+        self.points.extend(other.points)
+        for k in SIGNALS:
+            self.signals[k].extend(other.signals[k])
+        if self.reasons is not None and other.reasons is not None:
+            self.reasons.extend(other.reasons)
+
+
+def _empty_batch(with_reasons: bool) -> BatchLabels:
+    return BatchLabels(
+        labels=[],
+        scores=array("d"),
+        points=array("d"),
+        signals={k: array("d") for k in SIGNALS},
+        reasons=[] if with_reasons else None,
+    )
+
+
+def _label_chunk(chunk: List[EmailDict], with_reasons: bool, fast: bool = False) -> BatchLabels:
+    # 一個 chunk 只取一次規則快照
+    cr = compiled_rules()
+    out = _empty_batch(with_reasons)
+    for e in chunk:
+        r = _label_email_dict(e, cr, fast=fast)
+        out.labels.append(r["label"])
+        out.scores.append(r["score"])
+        out.points.append(r["points"])
+        for k in SIGNALS:
+            out.signals[k].append(r["scores"][k])
+        if out.reasons is not None:
+            out.reasons.append(r["reasons"])
+    return out
+
+
+def _label_chunk_dicts(chunk: List[EmailDict], fast: bool = False) -> List[Dict[str, Any]]:
+    cr = compiled_rules()
+    return [_label_email_dict(e, cr, fast=fast) for e in chunk]
+
+
+def _worker_init(conf_path: str) -> None:
+    # 子行程：對齊父行程的設定檔並先編譯一次（fork 時直接沿用父行程快照，copy-on-write 共享）
+    global CONF_PATH
+    CONF_PATH = conf_path
+    compiled_rules()
+
+
+def _chunks(emails: Iterable[EmailDict], chunksize: int) -> Iterator[List[EmailDict]]:
+    buf: List[EmailDict] = []
+    for e in emails:
+        buf.append(e)
+        if len(buf) >= chunksize:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+_T = TypeVar("_T")
+
+
+def map_email_chunks(
+    fn: Callable[..., _T],
+    emails: Iterable[EmailDict],
+    *,
+    workers: Optional[int] = 1,
+    chunksize: int = 256,
+    args: Tuple[Any, ...] = (),
+) -> Iterator[_T]:
+    """
+    依輸入順序逐 chunk 產出 fn(chunk, *args)。
+    多行程時 fork 前先編譯規則（子行程共享同一份快照），在途 chunk 數上限 2 * workers（背壓，輸入可為無限串流）。
+    fn 需為模組層函式（可 pickle）；workers=None 為 CPU 核心數。
+    """
+    n = (os.cpu_count() or 1) if workers is None else max(1, int(workers))
+    size = max(1, int(chunksize))
+    if n <= 1:
+        for chunk in _chunks(emails, size):
+            yield fn(chunk, *args)
+        return
+
+    compiled_rules()  # fork 前先編譯，子行程直接共享
+    with ProcessPoolExecutor(max_workers=n, initializer=_worker_init, initargs=(str(CONF_PATH),)) as ex:
+        pending: Deque[Future[_T]] = deque()
+        for chunk in _chunks(emails, size):
+            pending.append(ex.submit(fn, chunk, *args))
+            if len(pending) >= n * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_batches(
+    emails: Iterable[EmailDict], *, workers: Optional[int], chunksize: int, reasons: bool, fast: bool = False
+) -> Iterator[BatchLabels]:
+    return map_email_chunks(_label_chunk, emails, workers=workers, chunksize=chunksize, args=(reasons, fast))
+
+
+def iter_label_emails(
+    emails: Iterable[EmailDict],
+    *,
+    workers: Optional[int] = 1,
+    chunksize: int = 256,
+    fast: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """逐封產出 label_email(dict) 結果（依輸入順序）；適合不想整批留在記憶體的串流處理。"""
+    for part in map_email_chunks(_label_chunk_dicts, emails, workers=workers, chunksize=chunksize, args=(fast,)):
+        yield from part
+
+
+def label_emails(
+    emails: Iterable[EmailDict],
+    *,
+    workers: Optional[int] = 1,
+    chunksize: int = 256,
+    reasons: bool = False,
+    fast: bool = False,
+) -> BatchLabels:
+    """
+    批次標記（與 label_email(dict) 同語意），回傳欄式結果 BatchLabels。
+    - emails：任意 iterable（逐 chunk 讀取，不會一次載入）
+    - workers：行程數；1 為同行程，None 為 CPU 核心數
+    - chunksize：每個工作單位的信件數（越大 IPC 成本越低）
+    - reasons：是否一併回傳每封信的 reasons
+    - fast：同 label_email(fast=True)，標籤確定即停止評估
+    """
+    out = _empty_batch(reasons)
+    for part in _iter_batches(emails, workers=workers, chunksize=chunksize, reasons=reasons, fast=fast):
+        out._extend(part)
+    return out
@@ -1,27 +1,44 @@
 from __future__ import annotations
 
 import re
-from typing import Dict
+from typing import Any, Dict, List, Optional, Sequence
+
+from .cascade import SpamCascade, default_cascade, score_spam
+
+# 檔案位置：src/smart_mail_agent/spam/spam_filter_orchestrator.py
+# 模組用途：相容包裝（utils.spam_filter / sma-spamcheck 使用）；判定交給 spam.cascade
+# 原本的短網址 / 中英文關鍵字規則仍保留：任一命中即為 spam（cascade 只會讓判定更嚴）
 
 _SHORTLINK_RE = re.compile(r"(?:\b(?:t\.co|tinyurl\.com|bit\.ly)/[A-Za-z0-9]+)", re.I)
 _EN_SPAM = re.compile(r"\b(free|viagra|lottery|winner)\b", re.I)
 _ZH_SPAM = re.compile(r"(免費|限時|優惠|中獎)")
 
 
+def _legacy_reasons(subject: str, content: str, sender: str) -> List[str]:
+    text = " ".join([subject or "", content or "", sender or ""])
+    reasons: List[str] = []
+    if _SHORTLINK_RE.search(text):
+        reasons.append("shortlink")
+    if _EN_SPAM.search(text):
+        reasons.append("en_keywords")
+    if _ZH_SPAM.search(text):
+        reasons.append("zh_keywords")
+    return reasons
+
+
 class SpamFilterOrchestrator:
-    def is_legit(self, subject: str, content: str, sender: str) -> Dict[str, object]:
-        text = " ".join([subject or "", content or "", sender or ""])
-        reasons = []
-        spam = False
-
-        if _SHORTLINK_RE.search(text):
-            spam = True
-            reasons.append("shortlink")
-        if _EN_SPAM.search(text):
-            spam = True
-            reasons.append("en_keywords")
-        if _ZH_SPAM.search(text):
-            spam = True
-            reasons.append("zh_keywords")
-
-        return {"is_spam": spam, "reasons": reasons}
+    def __init__(self, cascade: Optional[SpamCascade] = None) -> None:
+        self._cascade = cascade
+
+    def is_legit(
+        self, subject: str, content: str, sender: str, attachments: Optional[Sequence[Any]] = None
+    ) -> Dict[str, object]:
+        legacy = _legacy_reasons(subject, content, sender)
+        res = (self._cascade or default_cascade()).classify(subject, content, sender, attachments)
+        reasons = legacy + [r for r in res.reasons if r not in legacy]
+        is_spam = bool(legacy) or res.is_spam
+        label = "spam" if is_spam else res.label
+        return {"is_spam": is_spam, "reasons": reasons, "label": label, "score": res.score}
+
+
+__all__ = ["SpamFilterOrchestrator", "score_spam"]
@@ -1,60 +1,127 @@
 from __future__ import annotations
 
 import os
+from typing import Any, Optional, Union
 
 #!/usr/bin/env python3
 # 模組用途：使用 OpenAI GPT 模型判斷信件是否具詐騙/釣魚嫌疑（L2）
-from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
+#           判定結果寫入磁碟快取（正規化文字雜湊 + 模型），同內容的並行呼叫合併成一次上游請求
+#           提示詞只放可見文字（依 item_tokens 截斷）；非同步批次版見 async_llm_filter.py
+try:
+    from dotenv import load_dotenv
+except Exception:  # pragma: no cover - 未安裝 python-dotenv：只讀既有環境變數
+    load_dotenv = None  # type: ignore
+
+try:
+    from openai import OpenAI, OpenAIError  # type: ignore
+except Exception:  # pragma: no cover - 未安裝 llm extra
+    OpenAI = None  # type: ignore
+    OpenAIError = Exception  # type: ignore
 
 from smart_mail_agent.utils.logger import logger
 
-load_dotenv()
+from .llm_cache import DEFAULT_TTL_S, Coalescer, LLMVerdictCache, llm_cache_key
+from .llm_prompt import DEFAULT_ITEM_TOKENS, SYSTEM_PROMPT, minimize_message, single_prompt
+
+if load_dotenv is not None:
+    load_dotenv()
+
+# 行程內共用：不同 SpamLLMFilter 實例對同一鍵也只送一次
+_INFLIGHT = Coalescer()
 
 
 class SpamLLMFilter:
     """
     使用 OpenAI GPT API 進行詐騙信判斷（L2 分層）
     回傳是否可疑（bool）
+    - base_url：OpenAI 相容端點（預設讀 OPENAI_BASE_URL；本機假伺服器測試用）
+    - cache：LLMVerdictCache 實例、快取檔路徑，或 False 停用（預設 llm_cache.default_cache_path()：SMA_LLM_CACHE_PATH 或 SMA_DATA_DIR 下的 cache/）
+    - item_tokens：每封信送出的估計 token 上限
     """
 
-    def __init__(self, model: str = "gpt-3.5-turbo", max_tokens: int = 256):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("[SpamLLMFilter] 缺少必要環境變數 OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key)
+    def __init__(
+        self,
+        model: str = "gpt-3.5-turbo",
+        max_tokens: int = 256,
+        *,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        cache: Union[LLMVerdictCache, str, bool, None] = None,
+        cache_ttl: float = DEFAULT_TTL_S,
+        client: Any = None,
+        item_tokens: int = DEFAULT_ITEM_TOKENS,
+    ):
+        base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        if client is None:
+            if OpenAI is None:
+                raise ImportError("[SpamLLMFilter] 需要安裝 openai（pip install smart-mail-agent[llm]）")
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+            if not api_key and not base_url:
+                raise ValueError("[SpamLLMFilter] 缺少必要環境變數 OPENAI_API_KEY")
+            # 本機相容端點通常不驗證金鑰
+            client = OpenAI(api_key=api_key or "local", base_url=base_url)
+        self.client = client
         self.model = model
         self.max_tokens = max_tokens
+        self.item_tokens = int(item_tokens)
+
+        if cache is False:
+            self.cache: Optional[LLMVerdictCache] = None
+        elif isinstance(cache, LLMVerdictCache):
+            self.cache = cache
+        else:
+            try:
+                self.cache = LLMVerdictCache(cache or None, ttl=cache_ttl)
+            except Exception as e:
+                logger.warning(f"[SpamLLMFilter] 無法開啟判定快取，改為不快取：{e}")
+                self.cache = None
+
+    def _ask(self, subject: str, content: str) -> bool:
+        prompt = single_prompt(minimize_message(subject, content, self.item_tokens))
+
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=self.max_tokens,
+            temperature=0.0,
+        )
+
+        answer = response.choices[0].message.content.strip().upper()
+        logger.debug(f"[SpamLLMFilter] 判斷結果：{answer}")
+        return "SUSPICIOUS" in answer
+
+    def _ask_and_store(self, key: str, subject: str, content: str) -> bool:
+        # 等待合併期間其他行程可能已寫入
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+        verdict = self._ask(subject, content)
+        if self.cache is not None:
+            self.cache.put(key, verdict, self.model)
+        return verdict
 
     def is_suspicious(self, subject: str, content: str) -> bool:
         """
-        呼叫 OpenAI 判斷是否為詐騙信件。
+        呼叫 OpenAI 判斷是否為詐騙信件（先查快取；同內容並行呼叫只送一次）。
 
         :param subject: 信件主旨
         :param content: 信件內容
         :return: bool - 是否具可疑詐騙嫌疑
         """
+        key = llm_cache_key(subject, content, self.model, item_tokens=self.item_tokens)
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
         try:
-            full_text = f"主旨：{subject}\n內容：{content}".strip()
-            prompt = f"判斷以下郵件是否為詐騙信或社交工程釣魚信。\n如果你判斷為【正常信件】，請回：OK\n如果你判斷為【可能詐騙或釣魚】，請回：SUSPICIOUS\n\n{full_text}"
-
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "你是資安專家，負責分析詐騙信件。"},
-                    {"role": "user", "content": prompt},
-                ],
-                max_tokens=self.max_tokens,
-                temperature=0.0,
-            )
-
-            answer = response.choices[0].message.content.strip().upper()
-            logger.debug(f"[SpamLLMFilter] 判斷結果：{answer}")
-            return "SUSPICIOUS" in answer
-
+            return _INFLIGHT.run(key, lambda: self._ask_and_store(key, subject, content))
         except OpenAIError as e:
             logger.error(f"[SpamLLMFilter] OpenAI API 錯誤：{e}")
         except Exception as e:
             logger.error(f"[SpamLLMFilter] LLM 判斷失敗：{e}")
 
-        return False  # fallback 預設為非可疑
+        return False  # fallback 預設為非可疑（錯誤不寫入快取）
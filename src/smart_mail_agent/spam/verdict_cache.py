@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+# 檔案位置：src/smart_mail_agent/spam/verdict_cache.py
+# 模組用途：spam 階段的內容雜湊判定快取（LRU + TTL + 命中統計）
+#           群發信（大量相同內容）第二封起直接取結果，不再重算特徵
+
+_HASH_CHUNK = 64 * 1024
+
+
+def content_key(subject: str, content: str, attachment_names: Iterable[str], generation: int) -> str:
+    """主旨/內文/附件檔名（小寫）+ 規則世代 的雜湊鍵。"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(int(generation)).encode("ascii"))
+    for part in (subject, content):
+        h.update(b"\x00")
+        part = part or ""
+        # 分塊小寫化：大型內文不建立整份副本
+        for i in range(0, len(part), _HASH_CHUNK):
+            h.update(part[i : i + _HASH_CHUNK].lower().encode("utf-8", "surrogatepass"))
+    for name in attachment_names:
+        h.update(b"\x01")
+        h.update((name or "").lower().encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class VerdictCache:
+    """
+    執行緒安全的 LRU 快取，容量與存活時間皆有上限。
+    - generation 改變時（規則換代）自動清空
+    - maxsize <= 0 代表停用
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0) -> None:
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def _sync_generation(self, generation: int) -> None:
+        if self._generation != generation:
+            self._data.clear()
+            self._generation = generation
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._sync_generation(generation)
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._sync_generation(generation)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "generation": self._generation,
+            }
+
+
+__all__ = ["VerdictCache", "content_key"]
@@ -0,0 +1,198 @@
+"""
+Import-safe exporter: transformers sequence-classification checkpoint -> ONNX (+ dynamic int8).
+- Input: a `save_pretrained` directory, e.g. `trainers/train_classifier` output or
+  `paths.model_dir` in `configs/default.yml` (outputs/roberta-zh-checkpoint).
+- Output dir: `model.onnx`, `model.int8.onnx`, tokenizer files and `config.json`,
+  loadable with `IntentClassifier(<dir>, backend="onnx")`.
+- `--bench DATA` compares the torch and ONNX backends on the same emails:
+  accuracy (when labels exist), agreement, single-email latency and batched throughput.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# ----- Optional dependencies (clean guards) -----
+_TORCH_AVAILABLE = False
+try:
+    import torch  # type: ignore
+
+    _TORCH_AVAILABLE = True
+except Exception:  # pragma: no cover
+    torch = None  # type: ignore
+
+_TRANSFORMERS_AVAILABLE = False
+try:
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer  # type: ignore
+
+    _TRANSFORMERS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    AutoModelForSequenceClassification = AutoTokenizer = None  # type: ignore
+
+_ORT_QUANT_AVAILABLE = False
+try:
+    from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+
+    _ORT_QUANT_AVAILABLE = True
+except Exception:  # pragma: no cover
+    QuantType = quantize_dynamic = None  # type: ignore
+
+DEFAULT_MODEL_DIR = "outputs/roberta-zh-checkpoint"
+_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def _mb(p: Path) -> float:
+    return round(p.stat().st_size / 1e6, 2) if p.exists() else 0.0
+
+
+# ----- Public API -----
+def export_onnx(
+    model_dir: str = DEFAULT_MODEL_DIR,
+    output_dir: Optional[str] = None,
+    *,
+    quantize: bool = True,
+    opset: int = 17,
+) -> Dict[str, Any]:
+    """匯出 ONNX（batch / sequence 為動態維度），quantize=True 時再做權重 int8 動態量化。"""
+    if not (_TORCH_AVAILABLE and _TRANSFORMERS_AVAILABLE):
+        raise RuntimeError("`torch` and `transformers` are required. Install with: pip install -e .[llm]")
+    if quantize and not _ORT_QUANT_AVAILABLE:
+        raise RuntimeError("`onnxruntime` not installed. Install with: pip install -e .[onnx]")
+    from smart_mail_agent.core.onnx_backend import ONNX_FP32, ONNX_INT8
+
+    out = Path(output_dir or f"{str(model_dir).rstrip('/')}-onnx")
+    out.mkdir(parents=True, exist_ok=True)
+    tok = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    sample = tok(["報價詢問 quotation sample", "系統無法登入"], padding=True, return_tensors="pt")
+    names = [n for n in _INPUT_NAMES if n in sample]
+
+    class _Logits(torch.nn.Module):  # 只輸出 logits，ONNX 圖的輸出固定為單一張量
+        def __init__(self, inner: Any) -> None:
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args: Any) -> Any:
+            return self.inner(**dict(zip(names, args))).logits
+
+    fp32 = out / ONNX_FP32
+    dynamic = {n: {0: "batch", 1: "sequence"} for n in names}
+    dynamic["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Logits(model),
+            tuple(sample[n] for n in names),
+            str(fp32),
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    info: Dict[str, Any] = {"output": str(out), "fp32": str(fp32), "fp32_mb": _mb(fp32)}
+    if quantize:
+        int8 = out / ONNX_INT8
+        quantize_dynamic(str(fp32), str(int8), weight_type=QuantType.QInt8)
+        info.update(int8=str(int8), int8_mb=_mb(int8))
+    tok.save_pretrained(str(out))
+    model.config.save_pretrained(str(out))
+    return info
+
+
+def load_eval_data(path: str, limit: Optional[int] = None) -> Tuple[List[Tuple[str, str]], List[Optional[str]]]:
+    """JSON list 或 JSONL；每筆取 subject + content/body（或 text），label 可省略。"""
+    raw = Path(path).read_text(encoding="utf-8").strip()
+    recs = json.loads(raw) if raw.startswith("[") else [json.loads(x) for x in raw.splitlines() if x.strip()]
+    pairs: List[Tuple[str, str]] = []
+    labels: List[Optional[str]] = []
+    for r in recs[: limit or None]:
+        if not isinstance(r, dict):
+            continue
+        pairs.append((str(r.get("subject") or ""), str(r.get("content") or r.get("body") or r.get("text") or "")))
+        lab = r.get("label", r.get("predicted_label"))
+        labels.append(None if lab is None else str(lab))
+    return pairs, labels
+
+
+def _bench_one(clf: Any, pairs: Sequence[Tuple[str, str]], batch_size: int, latency_n: int) -> Dict[str, Any]:
+    clf.classify_many(list(pairs[:batch_size]), batch_size=batch_size)  # warmup
+    lat = []
+    for s, c in pairs[:latency_n]:
+        t0 = time.perf_counter()
+        clf.classify(s, c)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    t0 = time.perf_counter()
+    preds = clf.classify_many(list(pairs), batch_size=batch_size)
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "labels": [p["predicted_label"] for p in preds],
+        "p50_ms": round(statistics.median(lat), 3) if lat else None,
+        "p95_ms": round(lat[int(0.95 * (len(lat) - 1))], 3) if lat else None,
+        "emails_per_s": round(len(pairs) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def benchmark_backends(
+    model_dir: str,
+    onnx_dir: str,
+    data_path: str,
+    *,
+    batch_size: int = 32,
+    limit: Optional[int] = None,
+    latency_n: int = 50,
+) -> Dict[str, Any]:
+    """同一批信件分別跑 torch 與 ONNX 後端，回傳準確率差、一致率、延遲與吞吐量倍率。"""
+    from smart_mail_agent.core.classifier import IntentClassifier
+
+    pairs, gold = load_eval_data(data_path, limit)
+    if not pairs:
+        raise ValueError(f"{data_path} 沒有可用的資料")
+    report: Dict[str, Any] = {"n": len(pairs), "batch_size": batch_size}
+    for name, clf in (
+        # rules_first=False：兩個後端都對每封信跑模型，比較的是模型本身
+        ("torch", IntentClassifier(model_dir, rules_first=False)),
+        ("onnx", IntentClassifier(onnx_dir, backend="onnx", rules_first=False)),
+    ):
+        r = _bench_one(clf, pairs, batch_size, latency_n)
+        scored = [(p, g) for p, g in zip(r["labels"], gold) if g is not None]
+        r["accuracy"] = round(sum(p == g for p, g in scored) / len(scored), 4) if scored else None
+        report[name] = r
+    a, b = report["torch"].pop("labels"), report["onnx"].pop("labels")
+    report["agreement"] = round(sum(x == y for x, y in zip(a, b)) / len(a), 4)
+    if report["torch"]["accuracy"] is not None:
+        report["accuracy_delta"] = round(report["onnx"]["accuracy"] - report["torch"]["accuracy"], 4)
+    if report["torch"]["emails_per_s"] and report["onnx"]["emails_per_s"]:
+        report["throughput_speedup"] = round(report["onnx"]["emails_per_s"] / report["torch"]["emails_per_s"], 2)
+    if report["torch"]["p50_ms"] and report["onnx"]["p50_ms"]:
+        report["latency_speedup"] = round(report["torch"]["p50_ms"] / report["onnx"]["p50_ms"], 2)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Export the intent classifier to ONNX (int8) and benchmark it")
+    p.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    p.add_argument("--output", default=None, help="default: <model-dir>-onnx")
+    p.add_argument("--no-quantize", action="store_true")
+    p.add_argument("--opset", type=int, default=17)
+    p.add_argument("--bench", default=None, help="JSON/JSONL emails to compare torch vs ONNX on")
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--limit", type=int, default=None)
+    ns = p.parse_args(argv)
+    info = export_onnx(ns.model_dir, ns.output, quantize=not ns.no_quantize, opset=ns.opset)
+    print(json.dumps(info, ensure_ascii=False))
+    if ns.bench:
+        report = benchmark_backends(ns.model_dir, info["output"], ns.bench, batch_size=ns.batch_size, limit=ns.limit)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+__all__ = ["export_onnx", "benchmark_backends", "load_eval_data", "main"]
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -87,9 +87,13 @@ def train_bert_spam_classifier(
         save_strategy="no",
         logging_strategy="no",
         report_to="none",
+        save_safetensors=True,
     )
     trainer = Trainer(model=model, args=args, train_dataset=ds["train"])
     trainer.train()
+    # model.safetensors + tokenizer：可用 core.weights 以 mmap 載入
+    trainer.save_model(output_dir)
+    tok.save_pretrained(output_dir)
 
 
 __all__ = ["train_bert_spam_classifier"]
@@ -83,9 +83,13 @@ def train_classifier(
         save_strategy="no",
         logging_strategy="no",
         report_to="none",
+        save_safetensors=True,  # model.safetensors：core.weights 以 mmap 載入
     )
     trainer = Trainer(model=model, args=args, train_dataset=ds["train"])
     trainer.train()
+    # save_pretrained 格式：IntentClassifier / trainers.export_onnx 直接讀取
+    trainer.save_model(output_dir)
+    tok.save_pretrained(output_dir)
 
 
 __all__ = ["train_classifier"]
@@ -0,0 +1,100 @@
+"""
+Import-safe trainer for the hashed char n-gram spam model (NumPy only, CPU).
+- Reads `data/train/emails_train.json`-style data: a JSON list or JSONL of records.
+  Text comes from `text`, or from `subject` + `content`/`body` (+ `attachments`).
+  The label comes from `label` ("spam"/"ham"/"legit"/1/0) or from the bool `is_spam`.
+- Writes a compact `.npz` artifact loadable by `spam.ml_spam_classifier.load_model`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_SPAM_LABELS = {"spam", "1", "true", "junk", "phishing", "scam"}
+_HAM_LABELS = {"ham", "legit", "0", "false", "normal", "ok"}
+
+
+def _iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    raw = path.read_text(encoding="utf-8").strip()
+    if not raw:
+        return
+    if raw[0] == "[":
+        yield from (r for r in json.loads(raw) if isinstance(r, dict))
+        return
+    for line in raw.splitlines():
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _label_of(rec: Dict[str, Any]) -> Optional[int]:
+    if "is_spam" in rec:
+        return int(bool(rec["is_spam"]))
+    v = str(rec.get("label", "")).strip().lower()
+    if v in _SPAM_LABELS:
+        return 1
+    if v in _HAM_LABELS:
+        return 0
+    return None
+
+
+def load_training_data(path: str, *, max_chars: Optional[int] = None) -> Tuple[List[str], List[int]]:
+    """回傳 (prepare_text 後的文字, 0/1 標籤)；無法辨識標籤的紀錄略過。"""
+    from smart_mail_agent.spam.feature_extractor import DEFAULT_MAX_CHARS, email_text
+
+    texts: List[str] = []
+    labels: List[int] = []
+    for rec in _iter_records(Path(path)):
+        y = _label_of(rec)
+        if y is None:
+            continue
+        texts.append(email_text(rec, max_chars=max_chars or DEFAULT_MAX_CHARS))
+        labels.append(y)
+    return texts, labels
+
+
+# ----- Public API -----
+def train_spam_ngram(
+    data_path: str = "data/train/emails_train.json",
+    *,
+    output_path: Optional[str] = None,
+    epochs: int = 8,
+    n_features_log2: int = 18,
+    l2: float = 1e-6,
+) -> Dict[str, Any]:
+    """訓練並存檔（預設存到 load_model 讀取的 default_model_path()）；回傳筆數、訓練集準確率與耗時摘要。"""
+    from smart_mail_agent.spam.ml_spam_classifier import default_model_path, fit_hashed_model
+
+    texts, labels = load_training_data(data_path)
+    if not texts or len(set(labels)) < 2:
+        raise ValueError(f"{data_path} 需同時含 spam 與 ham 的標記資料（目前 {len(texts)} 筆）")
+    t0 = time.perf_counter()
+    model = fit_hashed_model(texts, labels, n_features=1 << int(n_features_log2), epochs=epochs, l2=l2)
+    elapsed = time.perf_counter() - t0
+    proba = model.predict_proba_texts(texts)
+    acc = float(((proba >= 0.5).astype(int) == labels).mean())
+    out = model.save(output_path or default_model_path())
+    return {"n": len(texts), "train_acc": round(acc, 4), "seconds": round(elapsed, 3), "output": str(out)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Train the hashed n-gram spam model")
+    p.add_argument("--data", default="data/train/emails_train.json")
+    p.add_argument("--output", default=None, help="default: $SMA_SPAM_MODEL_PATH or <data dir>/models/spam_ngram.npz")
+    p.add_argument("--epochs", type=int, default=8)
+    p.add_argument("--bits", type=int, default=18, help="hash space = 2**bits")
+    p.add_argument("--l2", type=float, default=1e-6)
+    ns = p.parse_args(argv)
+    info = train_spam_ngram(ns.data, output_path=ns.output, epochs=ns.epochs, n_features_log2=ns.bits, l2=ns.l2)
+    print(json.dumps(info, ensure_ascii=False))
+    return 0
+
+
+__all__ = ["train_spam_ngram", "load_training_data", "main"]
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from pathlib import Path
 
 
 @dataclass
@@ -15,3 +16,15 @@ class Settings:
 
 
 SETTINGS = Settings()
+
+
+def data_dir() -> Path:
+    """
+    執行期資料（快取 / 狀態檔）的根目錄，不隨工作目錄改變：
+    SMA_DATA_DIR > $XDG_DATA_HOME/smart-mail-agent > ~/.local/share/smart-mail-agent
+    """
+    env = os.getenv("SMA_DATA_DIR")
+    if env:
+        return Path(env).expanduser().resolve()
+    base = os.getenv("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return (Path(base).expanduser() / "smart-mail-agent").resolve()
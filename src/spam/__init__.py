@@ -3,6 +3,10 @@ from __future__ import annotations
 import re
 from typing import Dict, List
 
+from smart_mail_agent.spam.cascade import score_spam as _cascade_score
+
+# 相容 shim：score_spam 保留原本的詞表與權重（門檻 0.6），再與 smart_mail_agent.spam.cascade 分層引擎取較高分
+
 __all__ = ["score_spam", "SpamFilterOrchestrator", "run"]
 
 SHORTENERS = ("bit.ly", "tinyurl.com", "goo.gl", "t.co")
@@ -16,7 +20,7 @@ def _casefold(s: str) -> str:
     return (s or "").casefold()
 
 
-def score_spam(subject: str, content: str, sender: str = "") -> Dict[str, float | List[str]]:
+def _legacy_score(subject: str, content: str, sender: str = "") -> Dict[str, float | List[str]]:
     s, c, snd = _casefold(subject), _casefold(content), _casefold(sender)
     text = f"{s} {c}"
     reasons: List[str] = []
@@ -55,6 +59,14 @@ def score_spam(subject: str, content: str, sender: str = "") -> Dict[str, float
     return {"score": min(score, 1.0), "reasons": reasons}
 
 
+def score_spam(subject: str, content: str, sender: str = "") -> Dict[str, float | List[str]]:
+    legacy = _legacy_score(subject, content, sender)
+    cascade = _cascade_score(subject, content, sender)
+    reasons = list(legacy["reasons"])  # type: ignore
+    reasons += [r for r in cascade["reasons"] if r not in reasons]  # type: ignore
+    return {"score": max(float(legacy["score"]), float(cascade["score"])), "reasons": reasons}  # type: ignore
+
+
 class SpamFilterOrchestrator:
     THRESHOLD = 0.6
 
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from smart_mail_agent.core.batching import MicroBatcher
+
+
+class _ManyClf:
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+
+    def classify_many(self, pairs, batch_size=32):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [{"predicted_label": s.upper(), "confidence": 0.9} for s, _ in pairs]
+
+
+def test_concurrent_calls_are_batched_and_routed_back():
+    clf = _ManyClf(delay=0.02)
+    with MicroBatcher(clf, max_batch_size=8, max_wait_ms=50) as mb:
+        out = {}
+
+        def call(i):
+            out[i] = mb.classify(f"s{i}", "body")["predicted_label"]
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        assert out == {i: f"S{i}" for i in range(16)}
+        st = mb.stats()
+        assert st["items"] == 16 and max(clf.batches) <= 8
+        assert st["batches"] < 16  # 同時到達的請求確實被合併
+
+
+def test_max_wait_bounds_latency_for_lone_request():
+    clf = _ManyClf()
+    with MicroBatcher(clf, max_batch_size=64, max_wait_ms=20) as mb:
+        t0 = time.perf_counter()
+        assert mb.submit("a", "b").result(2)["predicted_label"] == "A"
+        assert time.perf_counter() - t0 < 1.0
+        assert clf.batches == [1]
+
+
+def test_errors_propagate_and_single_classify_fallback():
+    class _Boom:
+        def classify_many(self, pairs, batch_size=32):
+            raise RuntimeError("model down")
+
+    with MicroBatcher(_Boom(), max_wait_ms=0) as mb:
+        with pytest.raises(RuntimeError, match="model down"):
+            mb.classify("a", "b", timeout=2)
+
+    class _Single:
+        def classify(self, subject, body):
+            return {"predicted_label": subject}
+
+    mb = MicroBatcher(_Single(), max_wait_ms=0)
+    assert mb.classify_many([("x", ""), ("y", "")]) == [{"predicted_label": "x"}, {"predicted_label": "y"}]
+    mb.close()
+    with pytest.raises(RuntimeError):
+        mb.submit("z", "")
+    with pytest.raises(ValueError):
+        MicroBatcher()
+
+
+def test_submit_racing_close_never_leaves_a_pending_future():
+    for _ in range(20):
+        mb = MicroBatcher(_ManyClf(), max_batch_size=4, max_wait_ms=0)
+        futures, errors = [], []
+
+        def spam():
+            for i in range(50):
+                try:
+                    futures.append(mb.submit(f"s{i}", "b"))
+                except RuntimeError:
+                    errors.append(i)
+
+        t = threading.Thread(target=spam)
+        t.start()
+        mb.close()
+        t.join()
+        for f in futures:
+            # 入列成功的工作一定會有結果或例外（exception() 逾時會丟 TimeoutError）
+            f.exception(timeout=2)
+            assert f.done()
+
+
+def test_short_result_list_fails_unmatched_jobs():
+    class _Short:
+        def classify_many(self, pairs, batch_size=32):
+            return [{"predicted_label": "x"}] * (len(pairs) - 1)
+
+    with MicroBatcher(_Short(), max_batch_size=2, max_wait_ms=50) as mb:
+        a, b = mb.submit("a", "1"), mb.submit("b", "2")
+        assert a.result(timeout=2)["predicted_label"] == "x"
+        with pytest.raises(RuntimeError):
+            b.result(timeout=2)
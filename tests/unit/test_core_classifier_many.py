@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from smart_mail_agent.core.classifier import RULE_CONFIDENCE, IntentClassifier
+
+
+class _BatchPipe:
+    """假 pipeline：可吃 list，記錄每批的輸入。"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, truncation=True, batch_size=None):
+        batch = texts if isinstance(texts, list) else [texts]
+        self.batches.append(batch)
+        out = [{"label": "請求技術支援", "score": 0.3 if "hello" in t else 0.9} for t in batch]
+        return out if isinstance(texts, list) else out[:1]
+
+
+def test_classify_many_matches_classify_and_keeps_order():
+    pipe = _BatchPipe()
+    clf = IntentClassifier("dummy", pipeline_override=pipe)
+    pairs = [
+        ("系統錯誤", "登入後一直出現 500 錯誤，麻煩協助排查，附上截圖與時間點。" * 3),
+        ("詢價", "想詢問企業方案價格"),
+        ("hello", "test"),
+        ("客訴", "服務太爛了，處理太慢"),
+    ]
+    got = clf.classify_many(pairs, batch_size=2)
+    assert [g["predicted_label"] for g in got] == [clf.classify(s, c)["predicted_label"] for s, c in pairs]
+    assert [g["subject"] for g in got] == [s for s, _ in pairs]
+    assert [g["predicted_label"] for g in got] == ["請求技術支援", "業務接洽或報價", "其他", "投訴與抱怨"]
+    # 報價 / 客訴由規則先行回答，只有另外兩封送進模型（依長度排序成一批）
+    assert [g["path"] for g in got] == ["model", "rules", "model", "rules"]
+    first = pipe.batches[0]
+    assert len(first) == 2 and len(first[0]) <= len(first[1])
+
+
+def test_rules_first_skips_model_and_counts():
+    pipe = _BatchPipe()
+    clf = IntentClassifier("dummy", pipeline_override=pipe)
+    quote = clf.classify("詢價", "想詢問企業方案價格")
+    assert quote["predicted_label"] == "業務接洽或報價" and quote["path"] == "rules"
+    assert clf.classify("客訴", "服務太爛了")["path"] == "rules"
+    assert pipe.batches == []  # 模型完全沒被呼叫
+    assert clf.classify("系統錯誤", "登入出現 500")["path"] == "model"
+    st = clf.stats()
+    assert st["rules"] == 2 and st["model"] == 1 and st["total"] == 3 and st["skip_rate"] == round(2 / 3, 4)
+
+    # 關閉規則先行：模型照跑，但標籤仍被同一條規則覆寫
+    slow = IntentClassifier("dummy", pipeline_override=pipe, rules_first=False)
+    res = slow.classify("詢價", "想詢問企業方案價格")
+    assert res["predicted_label"] == quote["predicted_label"] and res["path"] == "model"
+    assert len(pipe.batches) == 2
+    assert quote["confidence"] == RULE_CONFIDENCE and res["confidence"] != RULE_CONFIDENCE
+
+
+def test_rules_first_env_switch(monkeypatch):
+    monkeypatch.setenv("SMA_INTENT_RULES_FIRST", "0")
+    pipe = _BatchPipe()
+    res = IntentClassifier("dummy", pipeline_override=pipe).classify("詢價", "想詢問企業方案價格")
+    assert res["path"] == "model" and len(pipe.batches) == 1
+
+
+def test_classify_many_falls_back_per_item_for_single_text_override():
+    calls = []
+
+    def single(text, truncation=True):
+        if not isinstance(text, str):
+            raise TypeError("single text only")
+        calls.append(text)
+        if "boom" in text:
+            raise RuntimeError("model down")
+        return [{"label": "其他", "score": 0.8}]
+
+    clf = IntentClassifier("dummy", pipeline_override=single)
+    got = clf.classify_many([("a", "ok"), ("b", "boom"), ("c", "fine")])
+    assert [g["predicted_label"] for g in got] == ["其他", "unknown", "其他"]
+    assert len(calls) == 3
+
+
+def test_truncate_token_ids_keeps_head_middle_tail():
+    from smart_mail_agent.core.classifier import truncate_token_ids
+
+    ids = list(range(1000))
+    out = truncate_token_ids(ids, 100)
+    assert len(out) == 100
+    assert out[:40] == list(range(40)) and out[-30:] == list(range(970, 1000))
+    assert out[40:70] == list(range(485, 515))
+    assert truncate_token_ids(ids[:50], 100) == ids[:50]
+
+
+class _CharTok:
+    """假 tokenizer：一字一 token，前後加 CLS(101)/SEP(102)。"""
+
+    model_max_length = 64
+    pad_token_id = 0
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False, **_):
+        self.calls += 1
+        assert not add_special_tokens and not truncation
+        return {"input_ids": [[ord(ch) for ch in t] for t in texts]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [101] + list(ids) + [102]
+
+
+def test_classify_feeds_token_budgeted_ids_once():
+    seen = []
+    tok = _CharTok()
+
+    class _Runner:
+        tokenizer = tok
+
+        def __call__(self, text, truncation=True):  # 不應被呼叫
+            raise AssertionError("pipeline re-tokenized")
+
+        def predict_ids(self, batch):
+            seen.extend(batch)
+            return [("其他", 0.9) for _ in batch]
+
+    clf = IntentClassifier("dummy", pipeline_override=_Runner())
+    body = "頭" * 500 + "中" * 500 + "尾" * 500
+    assert clf.classify("主旨", body)["predicted_label"] == "其他"
+    ids = seen[0]
+    assert len(ids) == 64 and ids[0] == 101 and ids[-1] == 102
+    assert ord("中") in ids and ids[-2] == ord("尾") and tok.calls == 1
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import socket
+import threading
+
+import pytest
+
+from smart_mail_agent.core import daemon
+from smart_mail_agent.core.model_registry import registry
+
+
+class _Clf:
+    def classify(self, subject, body):
+        return {"predicted_label": "報價", "confidence": 0.9}
+
+
+@pytest.fixture()
+def running(tmp_path, monkeypatch):
+    path = str(tmp_path / "d.sock")
+    monkeypatch.setenv(daemon.ENV_SOCKET, path)
+    monkeypatch.delenv("SMA_INTENT_MODEL_PATH", raising=False)
+    monkeypatch.setattr("smart_mail_agent.utils.inference_classifier.IntentClassifier", _Clf)
+    registry.unload()
+    server = daemon.InferenceDaemon(path)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    try:
+        yield path
+    finally:
+        server.shutdown()
+        server.server_close()
+        registry.unload()
+
+
+def test_frame_roundtrip():
+    a, b = socket.socketpair()
+    with a, b:
+        daemon.send_frame(a, {"op": "ping", "text": "中文"})
+        assert daemon.recv_frame(b) == {"op": "ping", "text": "中文"}
+        a.shutdown(socket.SHUT_WR)
+        assert daemon.recv_frame(b) is None
+
+
+def test_client_roundtrip_and_errors(running):
+    with daemon.DaemonClient(running) as c:
+        assert c.request("ping")["pid"] > 0
+        # 同一條連線連續請求，模型只載入一次
+        assert c.request("classify", subject="報價", content="請提供報價")["predicted_label"] == "報價"
+        many = c.request("classify_many", pairs=[["a", "b"], ["c", "d"]])
+        assert [r["predicted_label"] for r in many] == ["報價", "報價"]
+        assert c.request("status")["models"]["intent"]["state"] == "ready"
+        assert c.request("spam", subject="會議", content="明天十點開會", sender="a@b.example")["label"]
+        with pytest.raises(daemon.DaemonError):
+            c.request("nope")
+        # 指定的模型與 daemon 常駐的不同：拒答，由呼叫端自行載入
+        with pytest.raises(daemon.DaemonError):
+            c.request("classify", subject="x", content="y", model="/some/other/model")
+    with pytest.raises(RuntimeError):
+        daemon.InferenceDaemon(running)  # 同一路徑已有 daemon
+
+
+def test_try_request_falls_back(running, tmp_path, monkeypatch):
+    assert daemon.try_request("classify", subject="s", content="c")["predicted_label"] == "報價"
+    assert daemon.try_request("classify", subject="s", content="c", model="/other") is None
+    assert daemon.try_request("ping", path=str(tmp_path / "missing.sock")) is None
+    monkeypatch.setenv(daemon.ENV_DISABLE, "0")
+    assert daemon.try_request("ping") is None
+
+
+def test_action_handler_uses_daemon(running, monkeypatch):
+    from smart_mail_agent.routing import action_handler
+
+    def _no_local():
+        raise AssertionError("daemon 在跑時不應在行程內載入分類器")
+
+    monkeypatch.setattr(action_handler, "get_intent_classifier", _no_local)
+    assert action_handler.handle({"subject": "hi", "body": "hello"})["action"]
+    assert registry.is_ready("intent")  # 由 daemon 端載入的分類器回答
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from smart_mail_agent.core.classifier import IntentClassifier  # noqa: E402
+from smart_mail_agent.core.onnx_backend import OnnxIntentModel  # noqa: E402
+
+
+class _Input:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Session:
+    """假 ORT session：logits 依第一個 token 決定類別，並記錄每批的形狀。"""
+
+    def __init__(self):
+        self.shapes = []
+
+    def get_inputs(self):
+        return [_Input("input_ids"), _Input("attention_mask")]
+
+    def run(self, _outputs, feeds):
+        ids, mask = feeds["input_ids"], feeds["attention_mask"]
+        assert set(feeds) == {"input_ids", "attention_mask"}
+        self.shapes.append(ids.shape)
+        logits = np.zeros((ids.shape[0], 2), dtype=np.float32)
+        logits[np.arange(ids.shape[0]), ids[:, 0] % 2] = 3.0
+        assert (mask.sum(axis=1) > 0).all()
+        return [logits]
+
+
+class _Tok:
+    pad_token_id = 0
+    model_max_length = 512
+
+    def __call__(self, texts, truncation=True, max_length=512, **_):
+        return {"input_ids": [[len(t) % 7 + 1] + [5] * (len(t) - 1) for t in texts]}
+
+
+def test_onnx_runner_pads_per_batch_and_maps_labels():
+    sess = _Session()
+    m = OnnxIntentModel(session=sess, tokenizer=_Tok(), id2label={0: "其他", 1: "請求技術支援"})
+    assert [r["label"] for r in m(["ab", "abc"])] == ["請求技術支援", "其他"]
+    assert sess.shapes[-1] == (2, 3)
+    assert m("abc")[0]["score"] == pytest.approx(np.exp(3) / (np.exp(3) + 1), rel=1e-5)
+
+
+def test_classifier_uses_id_runner_for_batches():
+    sess = _Session()
+    runner = OnnxIntentModel(session=sess, tokenizer=_Tok(), id2label={0: "其他", 1: "請求技術支援"})
+    clf = IntentClassifier("dummy", pipeline_override=runner)
+    pairs = [("系統", "x" * 40), ("a", "b"), ("登入", "y" * 10), ("c", "dd")]
+    got = clf.classify_many(pairs, batch_size=2)
+    assert [g["predicted_label"] for g in got] == [clf.classify(s, c)["predicted_label"] for s, c in pairs]
+    # 依長度排序後分兩批：短的一批 padding 寬度遠小於長的一批
+    widths = [w for _, w in sess.shapes[:2]]
+    assert widths[0] < widths[1]
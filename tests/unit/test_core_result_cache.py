@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from smart_mail_agent.core.classifier import IntentClassifier
+from smart_mail_agent.core.result_cache import ResultCache, artifact_version, cache_key
+
+
+class _Pipe:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts, truncation=True, batch_size=None):
+        batch = texts if isinstance(texts, list) else [texts]
+        self.calls += len(batch)
+        out = [{"label": "請求技術支援", "score": 0.9} for _ in batch]
+        return out if isinstance(texts, list) else out[:1]
+
+
+def _clf(cache, pipe, version="v1"):
+    return IntentClassifier("models/intent", pipeline_override=pipe, cache=cache, model_version=version)
+
+
+def test_two_tier_cache_survives_restart_and_normalizes(tmp_path):
+    db = tmp_path / "cache.db"
+    pipe = _Pipe()
+    clf = _clf(ResultCache(db, maxsize=8), pipe)
+    first = clf.classify("系統錯誤", "登入出現 500")
+    assert first["path"] == "model" and pipe.calls == 1
+    # 空白差異視為同一封信：走行程內 LRU
+    again = clf.classify(" 系統錯誤", "登入出現   500 ")
+    assert again["path"] == "cache" and again["predicted_label"] == first["predicted_label"]
+    assert pipe.calls == 1
+
+    # 新行程（新的快取物件）：由 SQLite 命中
+    clf2 = _clf(ResultCache(db, maxsize=8), pipe)
+    got = clf2.classify_many([("系統錯誤", "登入出現 500"), ("帳號", "無法重設密碼喔"), ("帳號", "無法重設密碼喔")])
+    assert got[0]["path"] == "cache" and pipe.calls == 1  # 後兩封被規則先行攔下
+    got = clf2.classify_many([("印表機", "卡紙"), ("印表機", "卡紙")])
+    assert pipe.calls == 2  # 同批重複只推論一次
+    st = clf2.stats()
+    assert st["cache"]["hits_disk"] == 1 and st["cache"]["hit_rate"] > 0 and st["skip_rate"] > 0
+
+
+def test_model_version_change_invalidates(tmp_path):
+    db = tmp_path / "cache.db"
+    pipe = _Pipe()
+    _clf(ResultCache(db), pipe, "v1").classify("系統錯誤", "登入出現 500")
+    cache = ResultCache(db)
+    clf = _clf(cache, pipe, "v2")
+    assert clf.classify("系統錯誤", "登入出現 500")["path"] == "model" and pipe.calls == 2
+    rows = cache._db().execute("SELECT version FROM intent_cache").fetchall()
+    assert rows == [("v2",)]  # 舊版本的資料列已刪除
+    assert _clf(False, pipe).classify("系統錯誤", "登入出現 500")["path"] == "model"
+
+
+def test_artifact_version_tracks_files(tmp_path):
+    assert artifact_version(tmp_path / "missing") is None
+    (tmp_path / "config.json").write_text("{}")
+    v1 = artifact_version(tmp_path)
+    (tmp_path / "model.safetensors").write_bytes(b"x" * 10)
+    v2 = artifact_version(tmp_path)
+    assert v1 != v2 and v2 == artifact_version(tmp_path) and v2 != artifact_version(tmp_path, "onnx")
+    assert cache_key("v", "a", "b  c") == cache_key("v", " a", "b c") != cache_key("w", "a", "b c")
+
+
+class _LowPipe(_Pipe):
+    def __call__(self, texts, truncation=True, batch_size=None):
+        out = super().__call__(texts, truncation, batch_size)
+        return [dict(r, score=0.3) for r in out]
+
+
+def test_cache_stores_raw_prediction_and_reapplies_fallback():
+    cache, pipe = ResultCache(None), _LowPipe()
+    strict = IntentClassifier("m", pipeline_override=pipe, cache=cache, model_version="v1", low_conf_threshold=0.5)
+    assert strict.classify("hello", "just a test")["predicted_label"] == "其他"
+    # 同一模型版本、不同門檻：快取命中，但 fallback 依本身設定重算
+    loose = IntentClassifier("m", pipeline_override=pipe, cache=cache, model_version="v1", low_conf_threshold=0.1)
+    got = loose.classify_many([("hello", "just a test")])[0]
+    assert got["path"] == "cache" and got["predicted_label"] == "請求技術支援" and pipe.calls == 1
+
+
+def test_artifact_version_sees_same_size_config_edit(tmp_path):
+    cfg = tmp_path / "config.json"
+    cfg.write_text('{"id2label": {"0": "a"}}')
+    v1 = artifact_version(tmp_path)
+    cfg.write_text('{"id2label": {"0": "b"}}')
+    assert artifact_version(tmp_path) != v1
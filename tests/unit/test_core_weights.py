@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+import struct
+
+import pytest
+
+from smart_mail_agent.core import weights
+
+
+def _write_safetensors(path, tensors):
+    """tensors: {name: (dtype, shape, raw bytes)}，依 safetensors 格式寫檔。"""
+    header, blobs, off = {"__metadata__": {"format": "pt"}}, b"", 0
+    for name, (dtype, shape, raw) in tensors.items():
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [off, off + len(raw)]}
+        blobs += raw
+        off += len(raw)
+    h = json.dumps(header).encode()
+    h += b" " * (-len(h) % 8)
+    path.write_bytes(struct.pack("<Q", len(h)) + h + blobs)
+
+
+def test_read_header_and_detection(tmp_path):
+    f = tmp_path / weights.SAFETENSORS_FILE
+    _write_safetensors(f, {"w": ("F32", [2], struct.pack("<2f", 1.0, 2.0))})
+    header, base = weights.read_header(f)
+    assert header == {"w": {"dtype": "F32", "shape": [2], "data_offsets": [0, 8]}}
+    assert base % 8 == 0 and f.stat().st_size == base + 8
+    assert weights.has_safetensors(tmp_path) and not weights.has_safetensors(tmp_path / "nope")
+
+
+def test_mmap_state_dict_is_zero_copy_view(tmp_path):
+    torch = pytest.importorskip("torch")
+    f = tmp_path / weights.SAFETENSORS_FILE
+    _write_safetensors(
+        f,
+        {
+            "a": ("F32", [2, 2], struct.pack("<4f", 1, 2, 3, 4)),
+            "b": ("I64", [3], struct.pack("<3q", 7, 8, 9)),
+        },
+    )
+    state, mm = weights.mmap_state_dict(f)
+    assert torch.equal(state["a"], torch.tensor([[1.0, 2.0], [3.0, 4.0]]))
+    assert state["b"].tolist() == [7, 8, 9]
+    state["a"][0, 0] = 42.0  # MAP_PRIVATE：寫入不會改到檔案
+    _, base = weights.read_header(f)
+    assert struct.unpack_from("<f", f.read_bytes(), base)[0] == 1.0
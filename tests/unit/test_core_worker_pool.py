@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+
+from smart_mail_agent.core.worker_pool import ClassifierPool, plan_threads, process_memory
+
+
+class _Clf:
+    def classify_many(self, pairs, batch_size=32):
+        return [{"predicted_label": s, "pid": os.getpid()} for s, _ in pairs]
+
+
+def test_plan_threads_respects_core_budget():
+    assert plan_threads(8) == (8, 1)
+    assert plan_threads(8, threads_per_worker=2) == (4, 2)
+    assert plan_threads(8, workers=3) == (3, 2)
+    # 明確指定但超出預算：調降到 workers × threads <= cores
+    assert plan_threads(1, workers=4) == (1, 1)
+    assert plan_threads(8, workers=4, threads_per_worker=4) == (4, 2)
+    for cores in range(1, 9):
+        for w in (None, 1, 3, 16):
+            for t in (None, 1, 3, 16):
+                got_w, got_t = plan_threads(cores, w, t)
+                assert got_w * got_t <= cores
+
+
+def test_pool_keeps_order_and_reports_memory():
+    pairs = [(f"s{i}", "body") for i in range(50)]
+    with ClassifierPool(_Clf(), workers=2, threads_per_worker=1, cores=2) as pool:
+        got = pool.classify_many(pairs, chunksize=7)
+        assert [g["predicted_label"] for g in got] == [s for s, _ in pairs]
+        assert {g["pid"] for g in got} <= {int(p) for p in pool.report()["per_worker"]}
+        assert os.getpid() not in {g["pid"] for g in got}  # 在子行程執行
+        rep = pool.report()
+        assert rep["workers"] == 2 and rep["threads_per_worker"] == 1
+        assert rep["throughput"]["items"] == 50 and rep["per_worker"]
+    assert "rss_mb" in process_memory()
+
+
+def test_single_worker_runs_in_process():
+    pool = ClassifierPool(_Clf(), workers=1)
+    got = pool.classify_many([("a", "b")])
+    assert got[0]["pid"] == os.getpid()
+    pool.close()
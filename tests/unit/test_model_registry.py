@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from smart_mail_agent.core.model_registry import STATE_FAILED, ModelRegistry, registry
+
+
+def test_loads_once_warms_up_and_shares_instance():
+    built, warmed = [], []
+    reg = ModelRegistry()
+    reg.register("m", lambda: built.append(1) or object(), warmup=lambda inst: warmed.append(inst))
+    assert not reg.is_ready("m") and not reg.is_ready()
+
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(reg.get("m"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1 and len(set(map(id, got))) == 1
+    assert warmed == [got[0]] and reg.is_ready("m") and reg.is_ready()
+    assert reg.status()["m"]["state"] == "ready"
+
+
+def test_failed_load_is_reported_and_retried():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("weights missing")
+        return "model"
+
+    reg = ModelRegistry()
+    reg.register("m", factory, warmup=lambda inst: 1 / 0)  # warmup 失敗不影響就緒
+    with pytest.raises(OSError):
+        reg.get("m")
+    assert reg.status()["m"]["state"] == STATE_FAILED and "weights missing" in reg.status()["m"]["error"]
+    assert reg.get("m") == "model" and reg.is_ready("m")
+    with pytest.raises(KeyError):
+        reg.get("nope")
+
+
+def test_action_handler_reuses_registry_classifier(monkeypatch):
+    from smart_mail_agent.routing import action_handler
+
+    built = []
+
+    class _Clf:
+        def __init__(self):
+            built.append(1)
+
+        def classify(self, subject, body):
+            return {"predicted_label": "其他"}
+
+    monkeypatch.delenv("SMA_INTENT_MODEL_PATH", raising=False)
+    monkeypatch.setattr("smart_mail_agent.utils.inference_classifier.IntentClassifier", _Clf)
+    registry.unload("intent")
+    try:
+        for _ in range(3):
+            assert action_handler.handle({"subject": "hi", "body": "hello"})["action"] == "reply_general"
+        assert len(built) == 1  # warmup 與三次 handle() 共用同一個實例
+    finally:
+        registry.unload("intent")
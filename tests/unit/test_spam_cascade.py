@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.cascade import (
+    AllowlistStage,
+    LLMStage,
+    ModelStage,
+    RulesStage,
+    SpamCascade,
+    score_spam,
+)
+from smart_mail_agent.spam.spam_filter_orchestrator import SpamFilterOrchestrator
+
+
+def _cascade(model=None, llm=None, **kw):
+    stages = [AllowlistStage(), RulesStage()]
+    if model:
+        stages.append(ModelStage(model, **kw))
+    if llm:
+        stages.append(LLMStage(llm))
+    return SpamCascade(stages)
+
+
+def test_plain_ham_exits_at_rules_without_paying_for_model():
+    calls = []
+    c = _cascade(model=lambda v: calls.append(v) or 0.5, llm=lambda v: calls.append(v) or True)
+    res = c.classify("會議通知", "明天下午三點開會", "boss@corp.test")
+    assert res.label == "legit" and res.stage == "rules" and calls == []
+    assert c.stats()["model"]["runs"] == 0
+
+
+def test_allowlist_and_confident_spam_exit_early():
+    c = _cascade(model=lambda v: 0.5)
+    assert c.classify("免費", "http://bit.ly/x", "a@trusted.example").stage == "allowlist"
+    res = c.classify("hi", "see http://bit.ly/x", "a@b.test")
+    assert res.is_spam and res.stage == "rules"
+    assert res.score == rules.label_email({"subject": "hi", "content": "see http://bit.ly/x"})["score"]
+
+
+def test_uncertain_mail_reaches_later_stages_sharing_one_view():
+    seen = []
+
+    def model(view):
+        seen.append(view)
+        return 0.5
+
+    def llm(view):
+        seen.append(view)
+        return "免費" in view.normalized
+
+    res = _cascade(model=model, llm=llm).classify("免費 贈品", "<p>hello <b>there</b></p>", "x@y.test")
+    assert res.stage == "llm" and res.is_spam
+    assert seen[0] is seen[1] and "<b>" not in seen[0].visible_text
+    assert [t.stage for t in res.trace] == ["allowlist", "rules", "model", "llm"]
+
+
+def test_model_over_budget_is_skipped():
+    res = _cascade(model=lambda v: time.sleep(0.3) or 0.99, budget_ms=20).classify("免費", "x", "a@b.test")
+    assert res.trace[-1].status == "timeout"
+    assert res.stage == "rules" and not res.is_spam
+
+
+def test_facades_keep_output_keys():
+    out = SpamFilterOrchestrator().is_legit("hi", "see http://bit.ly/x", "a@b.test", [])
+    assert out["is_spam"] is True and isinstance(out["reasons"], list)
+    sc = score_spam("會議", "議程如附件")
+    assert set(sc) == {"score", "reasons"} and sc["score"] == 0.0
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import re
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.chunked import TextSource, stream_finditer
+from smart_mail_agent.spam.keyword_automaton import KeywordAutomaton
+
+
+def test_stream_finditer_keeps_matches_across_chunk_edges():
+    rx = re.compile(r"https?://[a-z.]{1,40}")
+    text = "x" * 7 + " http://bit.ly " + "y" * 5 + " https://a.example.com z"
+    expected = [m.group(0) for m in rx.finditer(text)]
+    for size in (1, 3, 8, 64):
+        src = TextSource(["", text], chunk_chars=size)
+        assert list(stream_finditer(rx, src.chunks(), 64)) == expected
+
+
+def test_keyword_stream_matches_split_keyword():
+    ac = KeywordAutomaton(["免費", "bonus"], match_word_boundary=True)
+    st = ac.stream()
+    hits = [w for c in ("領取免", "費 bon", "us", "es") for w, _wt, _s in st.feed(c)]
+    hits += [w for w, _wt, _s in st.close()]
+    assert hits == ["免費"]  # "bonuses" 不在字界上
+
+
+def test_large_body_scanned_in_chunks_and_budget_marks_truncation():
+    body = ("lorem ipsum " * 20000) + "http://bit.ly/x"
+    full = rules.label_email({"sender": "a@b.test", "subject": "hi", "content": body}, use_cache=False)
+    assert any(r.startswith("url:") for r in full["reasons"])
+    assert "scan:truncated" not in full["reasons"]
+
+    raw = dict(rules._load_rules())
+    raw["scan"] = {"chunk_chars": 4096, "max_bytes": 8192, "max_ms": 0}
+    cr = rules._compile_rules(raw, generation=-1, path="", mtime=0.0)
+    feats, reasons = rules._collect_features("a@b.test", "hi", body, [], cr)
+    assert feats.truncated and "scan:truncated" in reasons
+    assert feats.url_count == 0
+
+
+def test_html_over_scanner_cap_is_marked_truncated_and_not_cached():
+    from smart_mail_agent.spam.html_scan import DEFAULT_MAX_INPUT_CHARS
+
+    rules.clear_verdict_cache()
+    body = "<p>" + "正常內容 " * (DEFAULT_MAX_INPUT_CHARS // 5 + 10) + "</p>" + "<a href='http://x.test'>x</a>" * 50
+    assert len(body) > DEFAULT_MAX_INPUT_CHARS
+    email = {"sender": "a@b.test", "subject": "月報", "content": body}
+    out = rules.label_email(email)
+    assert "scan:truncated" in out["reasons"] and out["reasons"].count("scan:truncated") == 1
+    # 只看到前段的 link_ratio 不寫入判定快取
+    assert rules.verdict_cache_info()["size"] == 0
+    rules.clear_verdict_cache()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.domain_list import (
+    DomainListEngine,
+    DomainTrie,
+    MappedDomainList,
+    compile_domain_list,
+    load_domain_list,
+    sender_domain,
+)
+
+
+def test_trie_matches_on_label_boundaries():
+    trie = DomainTrie(["bit.ly", "*.evil.test", "T.CO"])
+    assert trie.match("bit.ly") == "bit.ly"
+    assert trie.match("x.y.bit.ly") == "bit.ly"
+    assert trie.match("notbit.ly") is None
+    assert trie.match("microsoft.com") is None
+    assert "a.evil.test" in trie and "t.co" in trie
+    assert len(trie) == 3
+
+
+def test_compiled_file_is_mmapped_and_matches_suffixes(tmp_path: Path):
+    path = tmp_path / "block.sdl"
+    n = compile_domain_list([f"host{i}.spam.test" for i in range(5000)] + ["tinyurl.com"], path)
+    assert n == 5001
+    lst = load_domain_list(path)
+    assert isinstance(lst, MappedDomainList)
+    assert lst.match("a.b.host42.spam.test") == "host42.spam.test"
+    assert lst.match("sub.tinyurl.com") == "tinyurl.com"
+    assert lst.match("spam.test") is None
+    lst.close()
+
+
+def test_engine_allow_wins_and_sender_short_circuits_spam_stage():
+    eng = DomainListEngine.from_lists(allow=["corp.test"], block=["corp.test", "bad.test"])
+    assert eng.check("mail.corp.test") == "allow"
+    assert eng.check("x.bad.test") == "block"
+    assert sender_domain("Alice <alice@Mail.Corp.Test>") == "mail.corp.test"
+
+    res = rules.label_email({"sender": "ops@trusted.example", "subject": "FREE", "content": "http://bit.ly/x"})
+    assert res["label"] == "legit" and res["reasons"] == ["allow:sender"]
+    label, points, reasons = rules.label_email("x@other.test", "hi", "go bit.ly/abc now", [])
+    assert "url:bit.ly" in reasons and points > 0
+
+
+def test_default_allowlist_has_no_public_example_domain():
+    doms = rules.compiled_rules().domains
+    assert not doms.is_allowed("example.com") and not doms.is_allowed("mail.example.com")
+    assert "example.com" not in rules.DEFAULT_RULES["whitelist_domains"]
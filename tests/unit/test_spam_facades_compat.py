@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+
+import spam as src_spam
+from smart_mail_agent.spam.orchestrator import SpamFilterOrchestrator as Orchestrator
+from smart_mail_agent.spam.spam_filter_orchestrator import SpamFilterOrchestrator as FilterOrchestrator
+
+# 改接 cascade 之前（基準版本）三個相容包裝的判定；包裝只能更嚴，不能放行原本判為 spam 的信
+# (subject, content, sender, orchestrator.is_spam / score, spam_filter_orchestrator.is_spam, src/spam is_spam / score)
+BASE = [
+    ("恭喜中獎", "點此領取 免費 獎金", "x@unknown-domain.com", True, 0.75, True, False, 0.35),
+    ("FREE bonus", "claim your $100 now at bit.ly/abc", "promo@deals.test", True, 0.75, True, True, 0.95),
+    ("限時優惠", "全館折扣", "shop@store.test", False, 0.0, True, False, 0.0),
+    ("會議通知", "明天下午兩點開會，請準時出席。", "boss@company.test", False, 0.0, False, False, 0.0),
+    ("報價詢問", "請提供企業方案報價", "buyer@client.test", False, 0.0, False, False, 0.0),
+    ("hello", "just checking in", "x@unknown-domain.com", True, 0.6, False, False, 0.1),
+    ("群發 通知", "lottery winner viagra", "a@b.test", False, 0.0, True, False, 0.3),
+]
+
+
+@pytest.mark.parametrize("subject,content,sender,o1_spam,o1_score,o2_spam,o3_spam,o3_score", BASE)
+def test_facades_keep_base_verdicts(subject, content, sender, o1_spam, o1_score, o2_spam, o3_spam, o3_score):
+    r1 = Orchestrator().is_legit(subject, content, sender)
+    assert r1["is_spam"] is o1_spam and r1["score"] >= o1_score and r1["allow"] is not o1_spam
+
+    assert FilterOrchestrator().is_legit(subject, content, sender, [])["is_spam"] is o2_spam
+
+    r3 = src_spam.SpamFilterOrchestrator().is_legit(subject, content, sender)
+    assert r3["is_spam"] is o3_spam and r3["score"] >= o3_score - 1e-9
+    assert src_spam.run(subject, content, sender)["is_spam"] is o3_spam
+
+
+def test_facades_keep_legacy_reasons():
+    args = ("恭喜中獎", "點此領取 免費 獎金", "x@unknown-domain.com")
+    assert Orchestrator().is_spam(*args)["reasons"][:2] == ["zh_keywords", "suspicious_domain"]
+    r2 = FilterOrchestrator().is_legit(*args)
+    assert r2["reasons"][0] == "zh_keywords" and r2["label"] == "spam"
+    assert src_spam.score_spam(*args)["reasons"][:2] == ["zh_keywords", "suspicious_sender"]
+
+
+def test_cascade_only_makes_facades_stricter():
+    # 基準版本 src/spam 只給 0.25；cascade 的封鎖短網址規則讓它升到 spam
+    assert src_spam.run("Your invoice", "see tinyurl.com/xyz for details", "billing@vendor.test")["is_spam"] is True
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("恭喜中獎 點此領獎", True),
+        ("投資機會 財務自由 line加好友", True),
+        ("請看 http://promo.xxx.com/a", True),
+        ("會議通知 明天下午兩點開會", False),
+    ],
+)
+def test_rule_filter_keeps_base_verdicts(text, expected):
+    from smart_mail_agent.spam.rule_filter import RuleBasedSpamFilter
+
+    assert RuleBasedSpamFilter().is_spam(text) is expected
+
+
+def test_filter_orchestrator_keeps_base_weights():
+    from smart_mail_agent.spam.filter import SpamFilterOrchestrator as ScoreOrchestrator
+
+    orch = ScoreOrchestrator(explain=True)
+    score, res = orch.score("", "free bonus $1,000,000 http://example.com", "")
+    assert score == pytest.approx(1.0) and res["is_spam"] is True
+    assert res["reasons"][:3] == ["keyword", "shortlink/url", "money"]
+    score, res = orch.score("會議通知", "明天下午兩點開會", "boss@company.test")
+    assert score == 0.0 and res["is_spam"] is False
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.html_scan import scan_html
+
+
+def test_scan_html_tracks_nested_hidden_subtrees():
+    html = (
+        '<div style="display: none"><div>inner <a href="http://hidden.example">x</a></div>still hidden</div>'
+        '<p>Hello <a href="http://bit.ly/abc">click</a></p><br/><img hidden src="http://t.co/y">'
+    )
+    sc = scan_html(html)
+    assert sc.hidden_elements == 2
+    assert sc.hidden_chars == len("innerxstillhidden")
+    assert sc.visible_chars == len("Helloclick")
+    assert sc.anchor_chars == len("click")
+    assert sc.urls == ["http://bit.ly/abc"]
+    assert sc.text == "Hello click"
+
+
+def test_link_ratio_plain_text_and_html():
+    assert rules.link_ratio("") == 0.0
+    assert rules.link_ratio("just words, no links at all") == 0.0
+    many = " ".join(f"http://x{i}.example/p" for i in range(5))
+    assert rules.link_ratio(many) > 0.5
+    html = "<p>" + "word " * 50 + '</p><a href="#">more</a>'
+    assert 0.0 < rules.link_ratio(html) < 0.1
+
+
+def test_scan_html_bounds_retained_text():
+    sc = scan_html("<p>" + "a" * 100 + "</p>", max_text_chars=10)
+    assert sc.text == "a" * 10 and sc.text_truncated
+    assert sc.visible_chars == 100
+
+
+def test_scan_html_bounds_parser_input_on_unterminated_comment():
+    from smart_mail_agent.spam.html_scan import HtmlScanner
+
+    html = "<p>hi</p><!--" + "x" * 4_000_000
+    sc = scan_html(html, max_input_chars=100_000)
+    assert sc.input_truncated and sc.visible_chars < 100_000
+    assert not scan_html("<p>hi</p>").input_truncated
+
+    # 分段 feed：超過上限後的輸入不再進入 parser 緩衝區
+    p = HtmlScanner(keep_text=False, max_input_chars=100_000)
+    p.feed("<p>hi</p><!--")
+    for _ in range(64):
+        p.feed("x" * 65_536)
+    assert len(p.rawdata) <= 100_000
+    p.close()
+    assert p.result().input_truncated
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.keyword_automaton import KeywordAutomaton
+
+
+def test_automaton_overlapping_hits_and_weights():
+    ac = KeywordAutomaton({"he": 1, "she": 2, "hers": 3, "限時優惠": 5})
+    hits = dict(ac.find_all("USHERS 今天限時優惠"))
+    assert hits == {"she": 2.0, "he": 1.0, "hers": 3.0, "限時優惠": 5.0}
+    assert not ac.search("nothing at all")
+
+
+def test_automaton_ascii_word_boundary():
+    ac = KeywordAutomaton(["price", "報價"], match_word_boundary=True)
+    assert not ac.search("see pricelist")
+    assert ac.search("the price, please")
+    assert ac.search("請提供報價單")
+
+
+def test_contains_keywords_uses_config_and_adhoc_lists():
+    assert rules.contains_keywords("Get ＦＲＥＥ stuff")
+    assert not rules.contains_keywords("meeting notes")
+    assert rules.contains_keywords("pricelist", ["price"])
+    assert not rules.contains_keywords("pricelist", ["price"], match_word_boundary=True)
+    assert ("中獎", 3.0) in rules.keyword_hits("恭喜中獎")
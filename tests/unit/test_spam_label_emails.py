@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from smart_mail_agent.spam import rules
+
+
+def _emails(n: int):
+    for i in range(n):
+        yield {
+            "sender": f"u{i}@mail.test",
+            "subject": "免費 bonus" if i % 3 == 0 else f"meeting {i}",
+            "content": "click http://bit.ly/x" if i % 4 == 0 else "see agenda",
+            "attachments": ["run.exe"] if i % 5 == 0 else [],
+        }
+
+
+def test_label_emails_matches_single_calls_in_order():
+    expected = [rules.label_email(e) for e in _emails(23)]
+    res = rules.label_emails(_emails(23), chunksize=4, reasons=True)
+    assert len(res) == 23
+    assert res.labels == [r["label"] for r in expected]
+    assert list(res.scores) == [r["score"] for r in expected]
+    assert list(res.points) == [r["points"] for r in expected]
+    assert list(res.signals["attachment_executable"]) == [r["scores"]["attachment_executable"] for r in expected]
+    assert res.reasons == [r["reasons"] for r in expected]
+
+
+def test_label_emails_process_pool_keeps_order():
+    single = rules.label_emails(_emails(40), chunksize=8)
+    pooled = rules.label_emails(_emails(40), workers=2, chunksize=3)
+    assert pooled.labels == single.labels and list(pooled.scores) == list(single.scores)
+    assert pooled.reasons is None
+
+
+def test_fast_mode_agrees_with_full_evaluation():
+    for e in _emails(40):
+        full = rules.label_email(e, use_cache=False)
+        fast = rules.label_email(e, fast=True, use_cache=False)
+        assert fast["label"] == full["label"]
+        if fast["short_circuit"]:
+            assert fast["score"] >= 0.60
+        audit = rules.label_email(e, fast=True, explain=True, use_cache=False)
+        assert audit == full
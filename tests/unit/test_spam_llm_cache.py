@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from smart_mail_agent.spam.llm_cache import Coalescer, LLMVerdictCache, default_cache_path, llm_cache_key
+
+
+def _filter_cls():
+    from smart_mail_agent.spam.spam_llm_filter import SpamLLMFilter
+
+    return SpamLLMFilter
+
+
+class _SlowClient:
+    """OpenAI client 介面的最小實作：計算上游呼叫次數。"""
+
+    def __init__(self, delay: float = 0.05):
+        self.calls = 0
+        self.delay = delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kw):
+        self.calls += 1
+        time.sleep(self.delay)
+        msg = SimpleNamespace(content="SUSPICIOUS" if "中獎" in kw["messages"][-1]["content"] else "OK")
+        return SimpleNamespace(choices=[SimpleNamespace(message=msg)])
+
+
+def test_cache_key_normalizes_text_and_includes_model():
+    assert llm_cache_key("中獎 通知", "Click  HERE", "m") == llm_cache_key("中獎 通知", "click here\n", "m")
+    assert llm_cache_key("a", "b", "m1") != llm_cache_key("a", "b", "m2")
+    # 截斷預算 / 提示詞版本不同 → LLM 看到的內容不同，不共用判定
+    assert llm_cache_key("a", "b", "m", item_tokens=400) != llm_cache_key("a", "b", "m", item_tokens=100)
+    assert llm_cache_key("a", "b", "m", prompt_version="1") != llm_cache_key("a", "b", "m", prompt_version="2")
+
+
+def test_coalescer_runs_once_per_key_and_shares_errors():
+    co, calls, out = Coalescer(), [], []
+    gate = threading.Event()
+
+    def work():
+        calls.append(1)
+        gate.wait(1)
+        return 42
+
+    threads = [threading.Thread(target=lambda: out.append(co.run("k", work))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert out == [42] * 5 and len(calls) == 1 and co.coalesced == 4
+    with pytest.raises(RuntimeError):
+        co.run("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    assert co.run("k", lambda: 7) == 7
+
+
+def test_concurrent_identical_calls_coalesce_and_persist(tmp_path):
+    SpamLLMFilter = _filter_cls()
+    db = tmp_path / "llm.sqlite"
+    client = _SlowClient()
+    flt = SpamLLMFilter(client=client, cache=str(db))
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(flt.is_suspicious("恭喜中獎", "點此領取"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == [True] * 8 and client.calls == 1
+
+    # 新實例（模擬重啟）直接讀磁碟快取
+    again = SpamLLMFilter(client=client, cache=str(db))
+    assert again.is_suspicious("恭喜中獎", "點此領取") is True and client.calls == 1
+    assert SpamLLMFilter(client=client, cache=str(db), model="other").is_suspicious("恭喜中獎", "點此領取")
+    assert client.calls == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = LLMVerdictCache(":memory:", ttl=10)
+    cache.put("k", True, "m")
+    assert cache.get("k") is True
+    now = time.time()
+    monkeypatch.setattr("smart_mail_agent.spam.llm_cache.time.time", lambda: now + 11)
+    assert cache.get("k") is None and cache.purge_expired() == 1
+
+
+def test_against_local_openai_compatible_server(tmp_path):
+    SpamLLMFilter = _filter_cls()
+    pytest.importorskip("openai")
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            hits.append(body["model"])
+            payload = {
+                "id": "x",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "SUSPICIOUS"}}
+                ],
+            }
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        flt = SpamLLMFilter(base_url=f"http://127.0.0.1:{srv.server_port}/v1", cache=str(tmp_path / "c.sqlite"))
+        assert flt.is_suspicious("s", "c") and flt.is_suspicious("S", "c ")
+        assert len(hits) == 1
+    finally:
+        srv.shutdown()
+
+
+def test_default_path_is_anchored_in_data_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("SMA_LLM_CACHE_PATH", raising=False)
+    monkeypatch.setenv("SMA_DATA_DIR", str(tmp_path / "state"))
+    monkeypatch.chdir(tmp_path)
+    cache = LLMVerdictCache()
+    assert cache.path == default_cache_path() == str(tmp_path / "state" / "cache" / "spam_llm_cache.sqlite")
+    cache.close()
+    monkeypatch.delenv("SMA_DATA_DIR")
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "xdg"))
+    assert default_cache_path().startswith(str(tmp_path / "xdg" / "smart-mail-agent"))
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from smart_mail_agent.spam.feature_extractor import hash_batch, prepare_text  # noqa: E402
+from smart_mail_agent.spam.ml_spam_classifier import HashedNgramModel, load_model  # noqa: E402
+from smart_mail_agent.trainers.train_spam_ngram import train_spam_ngram  # noqa: E402
+
+_SPAM = ["恭喜中獎 立即領取", "FREE bonus click now", "限時優惠 免費贈品", "you are a winner claim prize", "帳號異常 請點此驗證"]
+_HAM = ["會議改到週三下午", "請提供報價單", "invoice attached for march", "meeting notes and agenda", "發票已寄出請查收"]
+
+
+def _dataset(n=400, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        spam = i % 2 == 0
+        base = rng.choice(_SPAM if spam else _HAM)
+        rows.append({"subject": base, "content": f"<p>{base} #{rng.randint(0, 9999)}</p>", "label": "spam" if spam else "ham"})
+    return rows
+
+
+def test_hash_batch_matches_per_text_hashing():
+    texts = [prepare_text("免費 FREE", "<b>hello</b> world"), "", "ab", prepare_text("中獎", "x" * 50)]
+    whole = hash_batch(texts, n_features=1 << 12)
+    for i, t in enumerate(texts):
+        one = hash_batch([t], n_features=1 << 12)
+        got = np.zeros(1 << 12)
+        np.add.at(got, whole.cols[whole.rows == i], whole.vals[whole.rows == i])
+        exp = np.zeros(1 << 12)
+        np.add.at(exp, one.cols, one.vals)
+        assert np.allclose(got, exp)
+
+
+def test_train_save_load_and_batch_predict(tmp_path):
+    data = tmp_path / "emails_train.json"
+    data.write_text(json.dumps(_dataset(), ensure_ascii=False), encoding="utf-8")
+    out = tmp_path / "spam.npz"
+    info = train_spam_ngram(str(data), output_path=str(out), epochs=4, n_features_log2=16)
+    assert info["n"] == 400 and info["train_acc"] >= 0.95
+    assert out.stat().st_size < 200_000
+
+    model = HashedNgramModel.load(out)
+    p = model.predict_proba_batch([("恭喜中獎", "立即領取獎金"), {"subject": "會議", "content": "週三下午"}, "invoice attached"])
+    assert p.shape == (3,) and p[0] > 0.5 > p[1] and p[2] < 0.5
+    assert model.predict_proba_one("恭喜中獎", "立即領取獎金") == pytest.approx(p[0])
+
+
+def test_load_model_picks_up_model_trained_after_a_miss(tmp_path, monkeypatch):
+    monkeypatch.setenv("SMA_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.delenv("SMA_SPAM_MODEL_PATH", raising=False)
+    assert load_model() is None  # 尚未訓練：不快取這次 miss
+
+    data = tmp_path / "emails_train.json"
+    data.write_text(json.dumps(_dataset(), ensure_ascii=False), encoding="utf-8")
+    info = train_spam_ngram(str(data), epochs=2, n_features_log2=12)
+    assert info["output"] == str(tmp_path / "data" / "models" / "spam_ngram.npz")
+
+    m = load_model()
+    assert m is not None and m.n_features == 1 << 12
+    assert load_model() is m  # 檔案未變：沿用快取
+
+    train_spam_ngram(str(data), epochs=2, n_features_log2=13)
+    assert load_model().n_features == 1 << 13  # 覆寫後 (mtime, size) 變了：重新載入
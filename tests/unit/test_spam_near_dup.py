@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.cascade import AllowlistStage, ModelStage, RulesStage, SpamCascade
+from smart_mail_agent.spam.near_dup import NearDupIndex, fingerprint
+
+_CAMPAIGN = (
+    "親愛的會員 {name} 您好，您的帳戶已被暫停使用，請於 24 小時內登入驗證身分，"
+    "否則帳戶將永久關閉。驗證連結：http://secure-check.example/verify?uid={uid} 。"
+    "此信件由系統自動發送，請勿直接回覆。客服專線 0800-000-{tail}"
+)
+
+
+def _variant(i: int) -> str:
+    return _CAMPAIGN.format(name=f"user{i}", uid=f"a9f{i:08d}x7c2e", tail=f"{i:03d}")
+
+
+def test_fingerprint_stable_across_personalized_tokens():
+    a, b = fingerprint("帳戶停用通知", _variant(1)), fingerprint("帳戶停用通知", _variant(2))
+    assert a is not None and b is not None
+    assert (a ^ b).bit_count() <= 3
+    other = fingerprint("季度報告", "附件為第三季營收報告與下季預算規劃，請各部門主管於週五前回覆意見。")
+    assert other is None or (a ^ other).bit_count() > 3
+    assert fingerprint("", "短信") is None
+
+
+def test_index_lookup_ttl_and_bound(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("smart_mail_agent.spam.near_dup.time.monotonic", lambda: clock[0])
+    idx = NearDupIndex(maxsize=2, ttl=60.0, max_distance=3)
+    idx.put(0b1011 << 40, {"label": "spam", "source": "llm"})
+    hit = idx.get((0b1011 << 40) ^ 0b111)  # 3 個位元不同
+    assert hit is not None and hit.distance == 3 and hit.verdict["source"] == "llm"
+    assert idx.get((0b1011 << 40) ^ 0b1111) is None
+
+    idx.put(1, {"label": "spam"})
+    idx.put(2 << 50, {"label": "spam"})
+    assert len(idx) == 2 and idx.get(0b1011 << 40) is None  # 最舊的被淘汰
+    clock[0] += 61.0
+    assert idx.get(1) is None
+
+
+def test_near_dup_is_off_by_default():
+    rules.clear_verdict_cache()
+    assert not rules._NEAR_DUP.enabled
+    assert not rules.record_near_duplicate("帳戶停用通知", _variant(1), label="spam", score=0.97, source="model")
+    assert "near_duplicate" not in rules.label_email({"subject": "帳戶停用通知", "content": _variant(2)})
+
+
+def test_label_email_reuses_verdict_from_later_stage(monkeypatch):
+    monkeypatch.setattr(rules, "_NEAR_DUP", NearDupIndex(maxsize=100, ttl=3600.0, max_distance=3))
+    rules.clear_verdict_cache()
+    calls = []
+
+    def model(view):
+        calls.append(view.subject)
+        return 0.97
+
+    casc = SpamCascade([AllowlistStage(), RulesStage(ham_below=0.0), ModelStage(model, budget_ms=0)])
+    first = casc.classify("帳戶停用通知", _variant(1), "noreply@secure-check.example")
+    assert first.stage == "model" and first.label == "spam"
+
+    # 同一波活動的下一封：規則層查到近似重複，直接結束，不再呼叫模型
+    second = casc.classify("帳戶停用通知", _variant(2), "noreply@secure-check.example")
+    assert second.stage == "rules" and second.label == "spam"
+    assert "neardup:model" in second.reasons and len(calls) == 1
+    # 不複製原信的 reasons（model:0.97 是第一封信的證據）
+    assert not any(r.startswith("model:") for r in second.reasons)
+
+    out = rules.label_email({"subject": "帳戶停用通知", "content": _variant(3)})
+    assert out["near_duplicate"]["source"] == "model" and out["reasons"] == ["neardup:model"]
+    audited = rules.label_email({"subject": "帳戶停用通知", "content": _variant(4)}, explain=True)
+    assert "neardup:model" not in audited["reasons"]
+    rules.clear_near_dup()
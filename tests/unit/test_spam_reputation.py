@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import time
+
+from smart_mail_agent.spam.cascade import (
+    AllowlistStage,
+    ReputationStage,
+    RulesStage,
+    SpamCascade,
+)
+from smart_mail_agent.spam.reputation import (
+    REP_BAD,
+    REP_BURST,
+    REP_TRUSTED,
+    ReputationStore,
+    sender_address,
+)
+
+T0 = 1_700_000_000.0
+
+
+def test_sender_address_parsing():
+    assert sender_address("Billing <Billing@Corp.Example>") == "billing@corp.example"
+    assert sender_address("no-address") == ""
+
+
+def test_trusted_after_enough_ham_and_decay_forgets():
+    st = ReputationStore(trusted_min_ham=4.5, half_life_s=100.0)
+    for i in range(5):
+        st.record("a@corp.example", False, now=T0 + i)
+    rep = st.lookup("a@corp.example", now=T0 + 5)
+    assert rep is not None and rep.verdict == REP_TRUSTED
+    # 十個半衰期後計數幾乎歸零，不再信任
+    assert st.lookup("a@corp.example", now=T0 + 1000).verdict is None
+
+
+def test_bad_sender_and_domain_fallback():
+    st = ReputationStore(bad_min_spam=2.5, trusted_domain_min_ham=1000)
+    for i in range(3):
+        st.record(f"u{i}@spam.example", True, now=T0 + i)
+    # 新地址沒有紀錄，改用網域信譽
+    rep = st.lookup("fresh@spam.example", now=T0 + 10)
+    assert rep is not None and rep.key == "d:spam.example" and rep.verdict == REP_BAD
+    # 共用信箱網域不累積網域信譽
+    for i in range(3):
+        st.record(f"u{i}@gmail.com", True, now=T0 + i)
+    assert st.lookup("fresh@gmail.com", now=T0 + 10) is None
+
+
+def test_burst_newcomer_escalates_cascade():
+    st = ReputationStore(burst_count=4.5)
+    for i in range(5):
+        st.record("promo@new.example", False, now=time.time())
+    assert st.lookup("promo@new.example").verdict == REP_BURST
+
+    casc = SpamCascade([AllowlistStage(), ReputationStage(st), RulesStage()])
+    res = casc.classify("會議紀錄", "附件為本週會議紀錄，請查收。", "promo@new.example")
+    assert res.label == "suspect"
+    assert "rep:burst" in res.reasons
+
+
+def test_trusted_fast_path_and_observe_records():
+    st = ReputationStore(trusted_min_ham=2.5)
+    casc = SpamCascade([AllowlistStage(), ReputationStage(st), RulesStage()])
+    for _ in range(3):
+        res = casc.classify("週報", "本週進度如附件。", "pm@corp.example")
+        assert res.stage == "rules"
+    res = casc.classify("週報", "本週進度如附件。", "pm@corp.example")
+    assert res.stage == "reputation" and res.label == "legit" and "rep:trusted" in res.reasons
+    # 信譽層自己的結論不回寫
+    assert st.lookup("pm@corp.example").ham < 3.01
+
+
+def test_sqlite_flush_and_reload(tmp_path):
+    db = tmp_path / "rep.sqlite"
+    st = ReputationStore(db, flush_interval_s=3600)
+    st.record("a@corp.example", True, now=T0)
+    st.record("a@corp.example", False, now=T0 + 1)
+    assert st.flush() == 2  # 地址 + 網域
+    st.close()
+
+    st2 = ReputationStore(db)
+    rep = st2.lookup("a@corp.example", now=T0 + 1)
+    assert rep is not None and abs(rep.spam - 1.0) < 1e-3 and abs(rep.ham - 1.0) < 1e-6
+    assert len(st2) == 2
+    st2.close()
+
+
+def test_burst_wins_over_trusted_for_new_sender():
+    st = ReputationStore(trusted_min_ham=3.0, burst_count=4.5)
+    now = time.time()
+    for _ in range(5):
+        st.record("bulk@new.example", False, now=now)
+    assert st.lookup("bulk@new.example", now=now).verdict == REP_BURST
+    # 過了 new_sender_s 之後才可能變成 trusted
+    later = now + st.new_sender_s + 10 * st.burst_half_life_s
+    st.record("bulk@new.example", False, now=later)
+    assert st.lookup("bulk@new.example", now=later).verdict != REP_BURST
+
+
+def test_trusted_sender_cannot_skip_hard_rules():
+    st = ReputationStore(trusted_min_ham=2.5)
+    for i in range(3):
+        st.record("pm@corp.example", False, now=time.time())
+    casc = SpamCascade([AllowlistStage(), ReputationStage(st), RulesStage()])
+    # 只有關鍵字之類的軟訊號時沿用信譽
+    res = casc.classify("免費贈品", "限時活動", "pm@corp.example")
+    assert res.label == "legit" and res.stage == "reputation"
+    res = casc.classify("週報", "進度請見 http://bit.ly/abc123", "pm@corp.example")
+    assert res.label == "spam" and res.stage == "rules"
+    assert "rep:trusted" in res.reasons and "url:bit.ly" in res.reasons
+    # 硬規則判 spam 的結果照常回寫，寄件者不再是 trusted
+    assert st.lookup("pm@corp.example").verdict != REP_TRUSTED
+
+
+def test_observe_skips_suspect_and_escalated_results():
+    st = ReputationStore(burst_count=4.5)
+    for _ in range(5):
+        st.record("promo@new.example", False, now=time.time())
+    ham_before = st.lookup("promo@new.example").ham
+    casc = SpamCascade([AllowlistStage(), ReputationStage(st), RulesStage()])
+    res = casc.classify("會議紀錄", "附件為本週會議紀錄，請查收。", "promo@new.example")
+    assert res.label == "suspect"
+    assert st.lookup("promo@new.example").ham < ham_before + 0.5
+
+    st2 = ReputationStore()
+    casc2 = SpamCascade([AllowlistStage(), ReputationStage(st2), RulesStage()])
+    res = casc2.classify("安裝檔", "請執行附件", "it@corp.example", ["setup.exe"])
+    assert res.label == "suspect"
+    assert len(st2) == 0
+
+
+def test_default_cascade_has_no_reputation_stage(monkeypatch):
+    from smart_mail_agent.spam import cascade
+
+    monkeypatch.delenv("SMA_SPAM_REPUTATION", raising=False)
+    cascade.set_default_cascade(None)
+    try:
+        assert "reputation" not in [s.name for s in cascade.default_cascade().stages]
+    finally:
+        cascade.set_default_cascade(None)
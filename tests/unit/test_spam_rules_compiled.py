@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+from pathlib import Path
+
+import pytest
+
+from smart_mail_agent.spam import rules
+
+
+def test_compiled_rules_snapshot_swaps_on_change(tmp_path: Path, monkeypatch):
+    conf = tmp_path / "spam_rules.yaml"
+    conf.write_text("suspicious_tlds: [zip]\n", encoding="utf-8")
+    monkeypatch.setattr(rules, "CONF_PATH", conf)
+
+    snap = rules.compiled_rules()
+    assert snap.path == str(conf)
+    assert snap.suspicious_tlds == frozenset({"zip"})
+    assert rules.compiled_rules() is snap  # 熱路徑不重建
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        snap.score_spam = 0.1  # type: ignore[misc]
+
+    conf.write_text("suspicious_tlds: [zip, mov]\n", encoding="utf-8")
+    st = conf.stat()
+    os.utime(conf, (st.st_atime, st.st_mtime + 5))
+    new = rules.reload_rules()
+    assert new is not snap and new.generation == snap.generation + 1
+    assert "mov" in new.suspicious_tlds
+    label, points, reasons = rules.label_email("a@b.test", "hi", "see http://files.mov/x", [])
+    assert "tld:mov" in reasons and points > 0
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from smart_mail_agent.spam import rules
+from smart_mail_agent.spam.verdict_cache import VerdictCache
+
+
+def test_label_email_reuses_verdict_until_rules_change():
+    rules.clear_verdict_cache()
+    mail = {"sender": "a@bulk.test", "subject": "限時優惠", "content": "see http://bit.ly/x", "attachments": ["a.pdf"]}
+    first = rules.label_email(mail)
+    first["reasons"].append("mutated-by-caller")
+    again = rules.label_email(dict(mail, subject="限時優惠".upper()))
+    assert "mutated-by-caller" not in again["reasons"]
+    info = rules.verdict_cache_info()
+    assert info["hits"] == 1 and info["misses"] == 1
+
+    rules.reload_rules(force=True)
+    rules.label_email(mail)
+    info = rules.verdict_cache_info()
+    assert info["misses"] == 2 and info["size"] == 1
+
+
+def test_verdict_cache_lru_and_ttl(monkeypatch):
+    cache = VerdictCache(maxsize=2, ttl=10.0)
+    cache.put("a", 1, 0)
+    cache.put("b", 2, 0)
+    assert cache.get("a", 0) == 1
+    cache.put("c", 3, 0)  # 淘汰最久未用的 b
+    assert cache.get("b", 0) is None and cache.info()["evictions"] == 1
+    assert cache.get("a", 1) is None  # 換代即清空
+
+    clock = [100.0]
+    monkeypatch.setattr("smart_mail_agent.spam.verdict_cache.time.monotonic", lambda: clock[0])
+    cache.put("x", "v", 1)
+    clock[0] += 11.0
+    assert cache.get("x", 1) is None
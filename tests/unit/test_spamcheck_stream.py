@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import io
+import json
+
+from smart_mail_agent.cli import sma_spamcheck
+from smart_mail_agent.spam import rules
+
+_MAILS = [
+    {"id": "a", "sender": "x@corp.example", "subject": "會議紀錄", "content": "附件為本週會議紀錄。"},
+    {"id": "b", "sender": "p@promo.test", "subject": "免費 中獎", "content": "點此連結 http://bit.ly/x"},
+    {"id": "c", "subject": "FREE bonus", "content": "get rich quick", "attachments": ["setup.exe"]},
+]
+
+
+def test_stream_keeps_input_order_and_reports_bad_lines(monkeypatch, capsys):
+    lines = [json.dumps(m, ensure_ascii=False) for m in _MAILS]
+    lines.insert(1, "{not json")
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines) + "\n\n"))
+    assert sma_spamcheck.main(["--stdin-ndjson", "--workers", "2", "--chunksize", "1"]) == 0
+    cap = capsys.readouterr()
+    out = [json.loads(x) for x in cap.out.splitlines()]
+    assert [r.get("id") for r in out] == ["a", None, "b", "c"]
+    assert out[1]["line"] == 2 and "error" in out[1]
+    assert out[2]["is_spam"] and out[0]["label"] == "legit"
+    summary = json.loads(cap.err.strip().splitlines()[-1])
+    assert summary["processed"] == 4 and summary["errors"] == 1 and summary["workers"] == 2
+
+
+def test_input_dir_reads_json_and_eml(tmp_path):
+    (tmp_path / "1.json").write_text(json.dumps(_MAILS[1], ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "2.eml").write_text(
+        "From: a@corp.example\nSubject: hello\nContent-Type: text/plain; charset=utf-8\n\nsee you tomorrow\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+    buf = io.StringIO()
+    summary = sma_spamcheck.run_stream(sma_spamcheck.iter_input_dir(tmp_path), buf, workers=1)
+    out = [json.loads(x) for x in buf.getvalue().splitlines()]
+    assert [r["file"] for r in out] == ["1.json", "2.eml"]
+    assert out[0]["is_spam"] and not out[1]["is_spam"]
+    assert summary["processed"] == 2 and summary["labels"]
+
+
+def test_iter_label_emails_matches_single_calls():
+    got = list(rules.iter_label_emails(iter(_MAILS), chunksize=2))
+    assert [g["label"] for g in got] == [rules.label_email(m)["label"] for m in _MAILS]